@@ -39,5 +39,27 @@ mkdir -p ${DIST_DIR}
 go build -o ${DIST_DIR}/exithandler cmd/exithandler/*
 chmod a+x ${DIST_DIR}/exithandler
 
+go build -o ${DIST_DIR}/logstamper cmd/logstamper/*
+chmod a+x ${DIST_DIR}/logstamper
+
+go build -o ${DIST_DIR}/userlogger cmd/userlogger/*
+chmod a+x ${DIST_DIR}/userlogger
+
+go build -o ${DIST_DIR}/precommandrunner cmd/precommandrunner/*
+chmod a+x ${DIST_DIR}/precommandrunner
+
+go build -o ${DIST_DIR}/supervisor cmd/supervisor/*
+chmod a+x ${DIST_DIR}/supervisor
+
+go build -o ${DIST_DIR}/cmdtrace cmd/cmdtrace/*
+chmod a+x ${DIST_DIR}/cmdtrace
+
+# sshbarrier runs in the job container, net must not link against musl
+CGO_ENABLED=0 go build -o ${DIST_DIR}/sshbarrier cmd/sshbarrier/*
+chmod a+x ${DIST_DIR}/sshbarrier
+
+CGO_ENABLED=0 go build -o ${DIST_DIR}/resourcesampler cmd/resourcesampler/*
+chmod a+x ${DIST_DIR}/resourcesampler
+
 echo Succeeded to build binary distribution into ${DIST_DIR}:
 cd ${DIST_DIR} && ls -lR .
\ No newline at end of file
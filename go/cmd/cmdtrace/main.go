@@ -0,0 +1,61 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package main
+
+import (
+	"flag"
+	"os"
+
+	"github.com/microsoft/openpai-runtime/pkg/cmdtrace"
+	"github.com/microsoft/openpai-runtime/pkg/logger"
+)
+
+var log *logger.Logger
+
+func init() {
+	log = logger.NewLogger()
+}
+
+// Print a summary table of the commands traced by runtime.d/command_trace.sh
+func main() {
+	phase := flag.String("phase", "", "only summarize commands of this phase, pre or post")
+	flag.Parse()
+
+	if flag.NArg() < 1 {
+		log.Error("usage: cmdtrace [options] <trace file>")
+		os.Exit(1)
+	}
+
+	entries, err := cmdtrace.ReadTrace(flag.Arg(0), *phase)
+	if err != nil {
+		if os.IsNotExist(err) {
+			return
+		}
+		log.Error("failed to read trace:", err)
+		os.Exit(1)
+	}
+	if err = cmdtrace.WriteSummary(os.Stdout, entries); err != nil {
+		log.Error("failed to write summary:", err)
+		os.Exit(1)
+	}
+}
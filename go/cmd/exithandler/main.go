@@ -29,6 +29,7 @@ import (
 
 	"github.com/microsoft/openpai-runtime/pkg/aggregator"
 	"github.com/microsoft/openpai-runtime/pkg/logger"
+	"github.com/microsoft/openpai-runtime/pkg/userlog"
 )
 
 var log *logger.Logger
@@ -39,6 +40,25 @@ func init() {
 	log = logger.NewLogger()
 }
 
+// syncLogs commits the logs to disk instead of syncing the whole node
+func syncLogs(paths ...string) {
+	for _, path := range paths {
+		stat, err := os.Stat(path)
+		if err != nil {
+			log.Warning("failed to sync log", path, err)
+			continue
+		}
+		if stat.IsDir() {
+			err = userlog.SyncDir(path)
+		} else {
+			err = userlog.SyncFile(path)
+		}
+		if err != nil {
+			log.Warning("failed to sync log", path, err)
+		}
+	}
+}
+
 // This function will extract error summary to the specific file and print the exit code
 func main() {
 	defer func() {
@@ -63,6 +83,8 @@ func main() {
 	aggFilePath := argsWithoutProg[3]
 	patternPath := argsWithoutProg[4]
 
+	syncLogs(userLog, runtimeErrorLog)
+
 	logFiles := aggregator.LogFiles{}
 	logFiles.UserLog = userLog
 	logFiles.RuntimeErrorLog = runtimeErrorLog
@@ -0,0 +1,74 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package main
+
+import (
+	"flag"
+	"os"
+	"os/signal"
+	"syscall"
+	"time"
+
+	"github.com/microsoft/openpai-runtime/pkg/logger"
+	"github.com/microsoft/openpai-runtime/pkg/stamper"
+)
+
+var log *logger.Logger
+
+func init() {
+	log = logger.NewLogger()
+}
+
+// Read lines from stdin, prefix them with timestamp and write to the runtime log file and stderr
+func main() {
+	tag := flag.String("tag", "openpai-runtime", "tag added after the timestamp")
+	flushInterval := flag.Duration("flush-interval", time.Second, "flush buffered lines after input is idle for this duration")
+	flag.Parse()
+
+	if flag.NArg() < 1 {
+		log.Error("usage: logstamper [options] <log file>")
+		os.Exit(1)
+	}
+
+	logFile, err := os.OpenFile(flag.Arg(0), os.O_WRONLY|os.O_APPEND|os.O_CREATE, 0644)
+	if err != nil {
+		log.Error("failed to open log file:", err)
+		os.Exit(1)
+	}
+	defer logFile.Close()
+
+	s := stamper.NewStamper(*tag, *flushInterval, logFile, os.Stderr)
+
+	signals := make(chan os.Signal, 1)
+	signal.Notify(signals, syscall.SIGTERM, syscall.SIGINT, syscall.SIGHUP)
+	go func() {
+		<-signals
+		s.Flush()
+		os.Exit(1)
+	}()
+
+	if err = s.Run(os.Stdin); err != nil {
+		log.Error("failed to process log:", err)
+		os.Exit(1)
+	}
+}
@@ -0,0 +1,61 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package main
+
+import (
+	"flag"
+	"os"
+
+	"github.com/microsoft/openpai-runtime/pkg/logger"
+	"github.com/microsoft/openpai-runtime/pkg/precommand"
+)
+
+var log *logger.Logger
+
+func init() {
+	log = logger.NewLogger()
+}
+
+// Run plugin pre scripts of the plan generated by initializer.py, independent scripts run concurrently
+func main() {
+	logDir := flag.String("log-dir", ".", "directory of the output log of every script")
+	flag.Parse()
+
+	if flag.NArg() < 1 {
+		log.Error("usage: precommandrunner [options] <plan file>")
+		os.Exit(1)
+	}
+
+	plan, err := precommand.LoadPlan(flag.Arg(0))
+	if err != nil {
+		log.Error("failed to load plan:", err)
+		os.Exit(1)
+	}
+	if err = os.MkdirAll(*logDir, 0755); err != nil {
+		log.Error("failed to create log dir:", err)
+		os.Exit(1)
+	}
+
+	_, exitCode := precommand.NewRunner(plan, *logDir, os.Stdout).Run()
+	os.Exit(exitCode)
+}
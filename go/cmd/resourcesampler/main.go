@@ -0,0 +1,91 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package main
+
+import (
+	"flag"
+	"net/http"
+	"os"
+	"os/signal"
+	"syscall"
+	"time"
+
+	"github.com/microsoft/openpai-runtime/pkg/logger"
+	"github.com/microsoft/openpai-runtime/pkg/sampler"
+)
+
+var log *logger.Logger
+
+func init() {
+	log = logger.NewLogger()
+}
+
+// Sample cpu, memory and io of the user process tree into a ring file until the user process exits
+func main() {
+	pid := flag.Int("pid", 0, "root pid of the process tree to sample")
+	interval := flag.Duration("interval", 5*time.Second, "interval between samples")
+	maxInterval := flag.Duration("max-interval", time.Minute, "longest interval used when the sampler exceeds its cpu budget")
+	maxOverhead := flag.Float64("max-overhead", 0.005, "fraction of one cpu the sampler may use")
+	capacity := flag.Int64("capacity", 17280, "number of samples kept in the ring file")
+	listen := flag.String("listen", "", "address to serve the latest sample in Prometheus text format, e.g. 127.0.0.1:9101")
+	flag.Parse()
+
+	if *pid <= 0 || flag.NArg() < 1 {
+		log.Error("usage: resourcesampler -pid <pid> [options] <ring file>")
+		os.Exit(1)
+	}
+
+	ring, err := sampler.NewRing(flag.Arg(0), *capacity)
+	if err != nil {
+		log.Error("failed to open ring file:", err)
+		os.Exit(1)
+	}
+	defer ring.Close()
+
+	s := sampler.NewSampler(*pid, ring, sampler.Options{
+		Interval:    *interval,
+		MaxInterval: *maxInterval,
+		MaxOverhead: *maxOverhead,
+	})
+
+	if *listen != "" {
+		go func() {
+			if err := http.ListenAndServe(*listen, s); err != nil {
+				log.Warning("failed to serve metrics:", err)
+			}
+		}()
+	}
+
+	stop := make(chan struct{})
+	signals := make(chan os.Signal, 1)
+	signal.Notify(signals, syscall.SIGTERM, syscall.SIGINT, syscall.SIGHUP)
+	go func() {
+		<-signals
+		close(stop)
+	}()
+
+	if err = s.Run(stop); err != nil {
+		log.Error("failed to sample resources:", err)
+		os.Exit(1)
+	}
+}
@@ -0,0 +1,97 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package main
+
+import (
+	"context"
+	"flag"
+	"math/rand"
+	"os"
+	"time"
+
+	"github.com/microsoft/openpai-runtime/pkg/logger"
+	"github.com/microsoft/openpai-runtime/pkg/sshbarrier"
+)
+
+// exitTimeout is the exit code of sshbarrier.sh when the barrier times out
+const exitTimeout = 10
+
+var log *logger.Logger
+
+func init() {
+	log = logger.NewLogger()
+	// instances must not share the backoff jitter
+	rand.Seed(time.Now().UnixNano() + int64(os.Getpid()))
+}
+
+// Wait until all other task instances of the job accept ssh connections.
+// In pairwise mode every instance connects to all others, in tree mode
+// instances only connect to their parent and children
+func main() {
+	timeout := flag.Int("timeout", 300, "minutes to wait for all instances")
+	mode := flag.String("mode", "pairwise", "barrier mode, pairwise or tree")
+	arity := flag.Int("arity", sshbarrier.DefaultOptions.TreeArity, "children of an instance in tree mode")
+	prewarm := flag.Bool("prewarm", false, "connect to all other instances after the barrier, "+
+		"so that ssh master connections are established if ControlPersist is set")
+	flag.Parse()
+
+	instances, self, err := sshbarrier.InstancesFromEnv(os.Getenv)
+	if err != nil {
+		log.Error("failed to get instances:", err)
+		os.Exit(1)
+	}
+	log.Info("Setting ssh barrier timeout to", *timeout, "minutes, waiting for", len(instances), "instances in", *mode, "mode")
+
+	ctx, cancel := context.WithTimeout(context.Background(), time.Duration(*timeout)*time.Minute)
+	defer cancel()
+	opts := sshbarrier.DefaultOptions
+	opts.TreeArity = *arity
+	b := sshbarrier.NewBarrier(opts, os.Stdout)
+	switch *mode {
+	case "pairwise":
+		var peers []sshbarrier.Peer
+		if peers, err = sshbarrier.PeersFromEnv(os.Getenv); err == nil {
+			err = b.Wait(ctx, peers)
+		}
+	case "tree":
+		if err = b.WaitTree(ctx, instances, self); err == nil && *prewarm {
+			// the pairwise barrier already connected to all instances
+			log.Info("Pre-warming ssh connections to all instances")
+			var peers []sshbarrier.Peer
+			if peers, err = sshbarrier.PeersFromEnv(os.Getenv); err == nil {
+				err = b.Wait(ctx, peers)
+			}
+		}
+	default:
+		log.Error("unknown ssh barrier mode", *mode)
+		os.Exit(1)
+	}
+	if err == sshbarrier.ErrTimeout {
+		log.Error(err)
+		os.Exit(exitTimeout)
+	}
+	if err != nil {
+		log.Error(err)
+		os.Exit(1)
+	}
+}
@@ -0,0 +1,75 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package main
+
+import (
+	"flag"
+	"os"
+	"os/signal"
+	"syscall"
+
+	"github.com/microsoft/openpai-runtime/pkg/logger"
+	"github.com/microsoft/openpai-runtime/pkg/precommand"
+)
+
+var log *logger.Logger
+
+func init() {
+	log = logger.NewLogger()
+}
+
+// Run background plugin commands alongside the user command, they are
+// stopped once the supervisor receives SIGTERM or SIGINT
+func main() {
+	logDir := flag.String("log-dir", ".", "directory of the output log of every command")
+	logMaxSize := flag.Int64("log-max-size", 64*1024*1024, "rotate the log of a command once it reaches this size in bytes")
+	logMaxFiles := flag.Int("log-max-files", 2, "number of rotated log files to keep for every command")
+	flag.Parse()
+
+	if flag.NArg() < 1 {
+		log.Error("usage: supervisor [options] <background commands file>")
+		os.Exit(1)
+	}
+
+	commands, err := precommand.LoadBackgroundCommands(flag.Arg(0))
+	if err != nil {
+		log.Error("failed to load background commands:", err)
+		os.Exit(1)
+	}
+	if err = os.MkdirAll(*logDir, 0755); err != nil {
+		log.Error("failed to create log dir:", err)
+		os.Exit(1)
+	}
+
+	signals := make(chan os.Signal, 1)
+	signal.Notify(signals, syscall.SIGTERM, syscall.SIGINT)
+	stop := make(chan struct{})
+	go func() {
+		<-signals
+		close(stop)
+	}()
+	s := precommand.NewSupervisor(commands, *logDir, os.Stdout)
+	s.LogOptions.MaxSize = *logMaxSize
+	s.LogOptions.MaxFiles = *logMaxFiles
+	s.Run(stop)
+}
@@ -0,0 +1,142 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package main
+
+import (
+	"flag"
+	"os"
+	"os/signal"
+	"sync"
+	"syscall"
+	"time"
+
+	"github.com/microsoft/openpai-runtime/pkg/logger"
+	"github.com/microsoft/openpai-runtime/pkg/userlog"
+)
+
+var log *logger.Logger
+
+func init() {
+	log = logger.NewLogger()
+}
+
+// openPipes opens the pipes concurrently, opening a FIFO for reading blocks until a writer opens it
+func openPipes(paths ...string) ([]*os.File, error) {
+	files := make([]*os.File, len(paths))
+	errs := make([]error, len(paths))
+	var wg sync.WaitGroup
+	for i, path := range paths {
+		wg.Add(1)
+		go func(i int, path string) {
+			defer wg.Done()
+			files[i], errs[i] = os.Open(path)
+		}(i, path)
+	}
+	wg.Wait()
+	for _, err := range errs {
+		if err != nil {
+			return nil, err
+		}
+	}
+	return files, nil
+}
+
+// Read user stdout and stderr from pipes, echo them to stdout and stderr and write
+// the user-stdout, user-stderr and user-all logs
+func main() {
+	stdoutPipe := flag.String("stdout", "", "pipe of user stdout")
+	stderrPipe := flag.String("stderr", "", "pipe of user stderr")
+	maxSize := flag.Int64("max-size", 256*1024*1024, "rotate log file once it reaches this size in bytes")
+	maxFiles := flag.Int("max-files", 2, "number of rotated log files to keep, 0 for no limit")
+	maxRetainedSize := flag.Int64("max-retained-size", 0, "total size in bytes of rotated log files to keep, 0 for no limit")
+	compress := flag.Bool("compress", false, "compress rotated log files in background")
+	flushInterval := flag.Duration("flush-interval", time.Second, "write partial lines to user-all after they are idle for this duration")
+	rateLimitBytes := flag.Int64("rate-limit-bytes", 0, "bytes per second of all user output, 0 for no limit")
+	rateLimitLines := flag.Int64("rate-limit-lines", 0, "lines per second of all user output, 0 for no limit")
+	rateLimitBurst := flag.Duration("rate-limit-burst", 10*time.Second, "how long output may exceed the rate limit after being idle")
+	rateLimitBlock := flag.Bool("rate-limit-block", false, "block the user process instead of dropping output over the rate limit")
+	markerInterval := flag.Duration("rate-limit-marker-interval", 10*time.Second, "interval of suppressed markers while output is dropped")
+	flag.Parse()
+
+	if *stdoutPipe == "" || *stderrPipe == "" || flag.NArg() < 3 {
+		log.Error("usage: userlogger -stdout <pipe> -stderr <pipe> [options] <stdout log dir> <stderr log dir> <all log dir>")
+		os.Exit(1)
+	}
+
+	var writers []*userlog.RotatingWriter
+	opts := userlog.Options{
+		MaxSize:         *maxSize,
+		MaxFiles:        *maxFiles,
+		MaxRetainedSize: *maxRetainedSize,
+		Compress:        *compress,
+	}
+	for _, dir := range flag.Args()[:3] {
+		w, err := userlog.NewRotatingWriter(dir, opts)
+		if err != nil {
+			log.Error("failed to open log dir", dir, err)
+			os.Exit(1)
+		}
+		writers = append(writers, w)
+	}
+
+	pipes, err := openPipes(*stdoutPipe, *stderrPipe)
+	if err != nil {
+		log.Error("failed to open user pipes:", err)
+		os.Exit(1)
+	}
+
+	m := userlog.NewMultiplexer(writers[2], *flushInterval)
+	if *rateLimitBytes > 0 || *rateLimitLines > 0 {
+		m.LimitRate(userlog.RateLimit{
+			BytesPerSecond: *rateLimitBytes,
+			LinesPerSecond: *rateLimitLines,
+			Burst:          *rateLimitBurst,
+			Block:          *rateLimitBlock,
+			MarkerInterval: *markerInterval,
+		})
+	}
+
+	// Keep reading until user process closes the pipes, the user process may
+	// still write after it receives a signal
+	signals := make(chan os.Signal, 1)
+	signal.Notify(signals, syscall.SIGTERM, syscall.SIGINT, syscall.SIGHUP)
+	go func() {
+		for range signals {
+			m.Flush()
+		}
+	}()
+
+	err = m.Run(
+		&userlog.Stream{Input: pipes[0], Echo: os.Stdout, Log: writers[0]},
+		&userlog.Stream{Input: pipes[1], Echo: os.Stderr, Log: writers[1]},
+	)
+	if err != nil {
+		log.Error("failed to write user log:", err)
+		os.Exit(1)
+	}
+	for _, w := range writers {
+		if err = w.Close(); err != nil {
+			log.Error("failed to close user log:", err)
+		}
+	}
+}
@@ -32,6 +32,7 @@ import (
 	"strings"
 
 	"github.com/microsoft/openpai-runtime/pkg/logger"
+	"github.com/microsoft/openpai-runtime/pkg/userlog"
 	"gopkg.in/yaml.v2"
 )
 
@@ -69,7 +70,8 @@ type RuntimeExitInfo struct {
 	ErrorLogs                *errorLogs `yaml:"errorLogs,omitempty"`
 }
 
-// LogFiles point the path for userLog and platLog
+// LogFiles point the path for userLog and platLog, userLog can also be
+// a log directory written by userlogger
 type LogFiles struct {
 	UserLog         string
 	RuntimeErrorLog string
@@ -134,11 +136,14 @@ func (a *ErrorAggregator) GenerateExitInfo(userExitCode int) (*RuntimeExitInfo,
 		return nil, nil
 	}
 
-	userFile, err := os.Open(a.logFiles.UserLog)
-	if err != nil {
+	userLog, releaseUserLog, err := a.getUserLogTail()
+	if releaseUserLog == nil {
 		return nil, err
 	}
-	defer userFile.Close()
+	defer releaseUserLog()
+	if err != nil {
+		a.logger.Error("some error occur when getting user log conent, may cause inaccurate result", err)
+	}
 
 	runtimeFile, err := os.Open(a.logFiles.RuntimeErrorLog)
 	if err != nil {
@@ -146,11 +151,6 @@ func (a *ErrorAggregator) GenerateExitInfo(userExitCode int) (*RuntimeExitInfo,
 	}
 	defer runtimeFile.Close()
 
-	userLog, err := a.getTailContentFromFile(userFile, a.maxSearchLogSize)
-	if err != nil {
-		a.logger.Error("some error occur when getting user log conent, may cause inaccurate result", err)
-	}
-
 	platformLog, err := a.getTailContentFromFile(runtimeFile, a.maxSearchLogSize)
 	if err != nil {
 		a.logger.Error("some error occur when getting runtime user log conent, may cause inaccurate result", err)
@@ -382,6 +382,26 @@ func (a *ErrorAggregator) matchSpecPatten(spec *runtimeErrorSpec, userExitCode i
 	return false, nil
 }
 
+// getUserLogTail returns the tail of user log and the function to release it,
+// release is nil if the user log could not be opened
+func (a *ErrorAggregator) getUserLogTail() ([]byte, func() error, error) {
+	stat, err := os.Stat(a.logFiles.UserLog)
+	if err != nil {
+		return nil, nil, err
+	}
+	if stat.IsDir() {
+		return userlog.MapTail(a.logFiles.UserLog, a.maxSearchLogSize)
+	}
+
+	userFile, err := os.Open(a.logFiles.UserLog)
+	if err != nil {
+		return nil, nil, err
+	}
+	defer userFile.Close()
+	content, err := a.getTailContentFromFile(userFile, a.maxSearchLogSize)
+	return content, func() error { return nil }, err
+}
+
 func (a *ErrorAggregator) getTailContentFromFile(f *os.File, maxTailSize int64) ([]byte, error) {
 	stat, err := f.Stat()
 	if err != nil {
@@ -0,0 +1,114 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package cmdtrace
+
+import (
+	"bufio"
+	"encoding/json"
+	"fmt"
+	"io"
+	"os"
+	"strings"
+	"text/tabwriter"
+	"time"
+)
+
+// maxCommandWidth is the width of the command column in the summary
+const maxCommandWidth = 60
+
+// Entry is one traced command, written as a json line by
+// runtime.d/command_trace.sh. Start and End are seconds since epoch
+type Entry struct {
+	Phase    string  `json:"phase"`
+	Plugin   string  `json:"plugin"`
+	Script   string  `json:"script"`
+	Index    int     `json:"index"`
+	Start    float64 `json:"start"`
+	End      float64 `json:"end"`
+	ExitCode int     `json:"exitCode"`
+	Command  string  `json:"command"`
+}
+
+// Duration of the command
+func (e *Entry) Duration() time.Duration {
+	return time.Duration((e.End - e.Start) * float64(time.Second))
+}
+
+// ReadTrace returns the entries of phase in a trace file, or all entries if
+// phase is empty. Malformed lines, e.g. partially written, are skipped
+func ReadTrace(path, phase string) ([]Entry, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+	var entries []Entry
+	scanner := bufio.NewScanner(f)
+	scanner.Buffer(make([]byte, 64*1024), 1024*1024)
+	for scanner.Scan() {
+		var e Entry
+		if err := json.Unmarshal(scanner.Bytes(), &e); err != nil {
+			continue
+		}
+		if phase == "" || e.Phase == phase {
+			entries = append(entries, e)
+		}
+	}
+	return entries, scanner.Err()
+}
+
+// WriteSummary writes a table of the entries in start order. The elapsed
+// time is from the first start to the last end, which is less than the sum
+// of durations when plugins run concurrently
+func WriteSummary(w io.Writer, entries []Entry) error {
+	if len(entries) == 0 {
+		return nil
+	}
+	first, last := entries[0].Start, entries[0].End
+	for _, e := range entries {
+		if e.Start < first {
+			first = e.Start
+		}
+		if e.End > last {
+			last = e.End
+		}
+	}
+	if _, err := fmt.Fprintf(w, "%v commands in %.1fs:\n", len(entries), last-first); err != nil {
+		return err
+	}
+	tw := tabwriter.NewWriter(w, 0, 0, 2, ' ', tabwriter.AlignRight)
+	fmt.Fprintln(tw, "START\tDURATION\tEXIT\t PLUGIN\t COMMAND\t")
+	for _, e := range entries {
+		fmt.Fprintf(tw, "+%.1fs\t%.1fs\t%v\t %v\t %v\t\n",
+			e.Start-first, e.Duration().Seconds(), e.ExitCode, e.Plugin, summarizeCommand(e.Command))
+	}
+	return tw.Flush()
+}
+
+func summarizeCommand(command string) string {
+	command = strings.Join(strings.Fields(command), " ")
+	if len(command) > maxCommandWidth {
+		command = command[:maxCommandWidth-3] + "..."
+	}
+	return command
+}
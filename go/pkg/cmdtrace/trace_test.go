@@ -0,0 +1,65 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package cmdtrace
+
+import (
+	"bytes"
+	"io/ioutil"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+
+	"github.com/stretchr/testify/assert"
+)
+
+func TestReadTraceAndSummary(t *testing.T) {
+	dir, err := ioutil.TempDir("", "cmdtrace")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+	path := filepath.Join(dir, "trace.jsonl")
+	content := `{"phase":"pre","plugin":"ssh","script":"plugin_pre0.sh","index":0,"start":100.0,"end":110.5,"exitCode":0,"command":"apt-get update"}
+{"phase":"pre","plugin":"teamwise_storage","script":"plugin_pre1.sh","index":3,"start":100.5,"end":101.0,"exitCode":32,"command":"mount -t cifs\n //server/share /mnt/data"}
+{"phase":"post","plugin":"cmd","script":"plugin_post2.sh","index":0,"start":200,"end":201,"exitCode":0,"command":"echo done"}
+{"phase":"pre","plugin":"cmd","scr`
+	assert.Nil(t, ioutil.WriteFile(path, []byte(content), 0644))
+
+	entries, err := ReadTrace(path, "pre")
+	assert.Nil(t, err)
+	assert.Equal(t, 2, len(entries))
+	assert.Equal(t, 32, entries[1].ExitCode)
+	assert.Equal(t, int64(10500), entries[0].Duration().Milliseconds())
+
+	var summary bytes.Buffer
+	assert.Nil(t, WriteSummary(&summary, entries))
+	lines := strings.Split(strings.TrimSpace(summary.String()), "\n")
+	assert.Equal(t, 4, len(lines))
+	assert.Equal(t, "2 commands in 10.5s:", lines[0])
+	assert.Contains(t, lines[2], "10.5s")
+	assert.Contains(t, lines[2], "apt-get update")
+	assert.Contains(t, lines[3], "mount -t cifs //server/share /mnt/data")
+
+	all, err := ReadTrace(path, "")
+	assert.Nil(t, err)
+	assert.Equal(t, 3, len(all))
+}
@@ -0,0 +1,87 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package precommand
+
+import (
+	"encoding/json"
+	"fmt"
+	"os"
+)
+
+// Script is one plugin pre script in the plan
+type Script struct {
+	// Name identifies the script in output and logs, e.g. ssh-0
+	Name string `json:"name"`
+	// Path of the script, which is run with /bin/bash
+	Path string `json:"path"`
+	// DependsOn are names of scripts which must succeed before this one starts
+	DependsOn []string `json:"dependsOn"`
+	// Retries of the script after it fails, with backoff
+	Retries int `json:"retries"`
+	// Timeout of every try in seconds, 0 means no timeout
+	Timeout int `json:"timeout"`
+}
+
+// Plan is the list of pre scripts generated by initializer.py, scripts are
+// in job config order and may only depend on earlier scripts
+type Plan struct {
+	Scripts []Script `json:"scripts"`
+}
+
+// LoadPlan reads and validates a plan file
+func LoadPlan(path string) (*Plan, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+	var plan Plan
+	if err = json.NewDecoder(f).Decode(&plan); err != nil {
+		return nil, err
+	}
+	if err = plan.Validate(); err != nil {
+		return nil, err
+	}
+	return &plan, nil
+}
+
+// Validate checks names are unique and dependencies refer to earlier
+// scripts, which also guarantees the plan has no cycle
+func (p *Plan) Validate() error {
+	seen := map[string]bool{}
+	for _, s := range p.Scripts {
+		if s.Name == "" || s.Path == "" {
+			return fmt.Errorf("script must have name and path: %+v", s)
+		}
+		if seen[s.Name] {
+			return fmt.Errorf("duplicated script name %v", s.Name)
+		}
+		for _, dep := range s.DependsOn {
+			if !seen[dep] {
+				return fmt.Errorf("script %v depends on %v which is not an earlier script", s.Name, dep)
+			}
+		}
+		seen[s.Name] = true
+	}
+	return nil
+}
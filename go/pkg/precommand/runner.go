@@ -0,0 +1,325 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package precommand
+
+import (
+	"bufio"
+	"errors"
+	"fmt"
+	"io"
+	"io/ioutil"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"strings"
+	"sync"
+	"syscall"
+	"time"
+)
+
+// followInterval is how often script logs are polled for new output
+const followInterval = 100 * time.Millisecond
+
+// exitTimeout is the exit code of a script killed by its timeout, same as
+// timeout(1)
+const exitTimeout = 124
+
+// the retry delay doubles from retryDelay up to maxRetryDelay, a script
+// which does not exit after SIGTERM by its timeout is killed after killDelay
+var (
+	retryDelay    = time.Second
+	maxRetryDelay = 30 * time.Second
+	killDelay     = 10 * time.Second
+)
+
+// Result of a finished script
+type Result struct {
+	Name     string
+	ExitCode int
+	Start    time.Time
+	Duration time.Duration
+	// Skipped scripts were not started because another script failed
+	Skipped bool
+}
+
+// Runner runs the scripts of a plan, every script starts once all its
+// dependencies succeeded. Like precommands.sh with errexit, no new script
+// is started after a script fails, running scripts are terminated and the
+// exit code of the first failed script is returned
+type Runner struct {
+	plan   *Plan
+	logDir string
+	output io.Writer
+
+	outputMu sync.Mutex
+}
+
+// NewRunner creates a runner, output of every script is written to
+// logDir/<name>.log and to output with a [name] prefix on every line
+func NewRunner(plan *Plan, logDir string, output io.Writer) *Runner {
+	return &Runner{plan: plan, logDir: logDir, output: output}
+}
+
+type finished struct {
+	index  int
+	result Result
+}
+
+// Run runs all scripts and returns their results in plan order and the
+// exit code of the first failed script, or 0
+func (r *Runner) Run() ([]Result, int) {
+	scripts := r.plan.Scripts
+	results := make([]Result, len(scripts))
+	index := map[string]int{}
+	pending := map[int]int{}
+	dependents := make([][]int, len(scripts))
+	for i, s := range scripts {
+		index[s.Name] = i
+		pending[i] = len(s.DependsOn)
+		for _, dep := range s.DependsOn {
+			dependents[index[dep]] = append(dependents[index[dep]], i)
+		}
+	}
+
+	done := make(chan finished, len(scripts))
+	running := map[int]*execution{}
+	outstanding := 0
+	exitCode := 0
+	start := func(i int) {
+		delete(pending, i)
+		outstanding++
+		e, err := r.start(scripts[i], done, i)
+		if err != nil {
+			r.printf("[%v] failed to start: %v\n", scripts[i].Name, err)
+			done <- finished{i, Result{Name: scripts[i].Name, ExitCode: 1, Start: time.Now()}}
+			return
+		}
+		running[i] = e
+	}
+	for i := range scripts {
+		if pending[i] == 0 {
+			start(i)
+		}
+	}
+	for outstanding > 0 {
+		f := <-done
+		outstanding--
+		delete(running, f.index)
+		results[f.index] = f.result
+		if f.result.ExitCode != 0 {
+			if exitCode == 0 {
+				exitCode = f.result.ExitCode
+				r.printf("[%v] failed with exit code %v, stop running pre scripts\n", f.result.Name, exitCode)
+				for _, e := range running {
+					e.terminate()
+				}
+			}
+			continue
+		}
+		if exitCode != 0 {
+			continue
+		}
+		for _, d := range dependents[f.index] {
+			pending[d]--
+			if pending[d] == 0 {
+				start(d)
+			}
+		}
+	}
+	for i := range pending {
+		results[i] = Result{Name: scripts[i].Name, Skipped: true}
+	}
+	return results, exitCode
+}
+
+// execution is the current try of a script
+type execution struct {
+	mu      sync.Mutex
+	cmd     *exec.Cmd
+	stopped bool
+}
+
+// terminate the current try, the script is not retried after
+func (e *execution) terminate() {
+	e.mu.Lock()
+	defer e.mu.Unlock()
+	e.stopped = true
+	if e.cmd != nil {
+		// scripts run in their own process group
+		syscall.Kill(-e.cmd.Process.Pid, syscall.SIGTERM)
+	}
+}
+
+func (e *execution) isStopped() bool {
+	e.mu.Lock()
+	defer e.mu.Unlock()
+	return e.stopped
+}
+
+func (r *Runner) start(s Script, done chan<- finished, i int) (*execution, error) {
+	// the log file is the script output instead of a pipe, background
+	// processes started by the script may outlive the runner
+	logPath := filepath.Join(r.logDir, s.Name+".log")
+	logFile, err := os.OpenFile(logPath, os.O_WRONLY|os.O_CREATE|os.O_TRUNC|os.O_APPEND, 0644)
+	if err != nil {
+		return nil, err
+	}
+	e := &execution{}
+	startTime := time.Now()
+	if err = r.startTry(s, e, logFile); err != nil {
+		logFile.Close()
+		return nil, err
+	}
+	r.printf("[%v] started\n", s.Name)
+
+	go func() {
+		defer logFile.Close()
+		exited := make(chan struct{})
+		copied := make(chan struct{})
+		go func() {
+			r.followOutput(s.Name, logPath, exited)
+			close(copied)
+		}()
+		exitCode := r.wait(s, e)
+		for try := 1; exitCode != 0 && try <= s.Retries && !e.isStopped(); try++ {
+			delay := maxRetryDelay
+			if d := retryDelay << uint(try-1); try < 31 && d > 0 && d < delay {
+				delay = d
+			}
+			r.printf("[%v] failed with exit code %v, retry %v of %v in %v\n", s.Name, exitCode, try, s.Retries, delay)
+			time.Sleep(delay)
+			if err := r.startTry(s, e, logFile); err != nil {
+				break
+			}
+			exitCode = r.wait(s, e)
+		}
+		duration := time.Since(startTime)
+		close(exited)
+		<-copied
+		r.printf("[%v] finished with exit code %v in %.1fs\n", s.Name, exitCode, duration.Seconds())
+		done <- finished{i, Result{Name: s.Name, ExitCode: exitCode, Start: startTime, Duration: duration}}
+	}()
+	return e, nil
+}
+
+// startTry starts the script unless it is terminated
+func (r *Runner) startTry(s Script, e *execution, logFile *os.File) error {
+	e.mu.Lock()
+	defer e.mu.Unlock()
+	if e.stopped {
+		return errors.New("terminated")
+	}
+	cmd := exec.Command("/bin/bash", s.Path)
+	cmd.Stdout = logFile
+	cmd.Stderr = logFile
+	cmd.SysProcAttr = &syscall.SysProcAttr{Setpgid: true}
+	if err := cmd.Start(); err != nil {
+		return err
+	}
+	e.cmd = cmd
+	return nil
+}
+
+// wait for the current try and return its exit code, the try is killed
+// after the timeout of the script
+func (r *Runner) wait(s Script, e *execution) int {
+	cmd := e.cmd
+	if s.Timeout <= 0 {
+		return exitCodeOf(cmd.Wait())
+	}
+	exited := make(chan int, 1)
+	go func() {
+		exited <- exitCodeOf(cmd.Wait())
+	}()
+	select {
+	case exitCode := <-exited:
+		return exitCode
+	case <-time.After(time.Duration(s.Timeout) * time.Second):
+	}
+	r.printf("[%v] timeout after %vs\n", s.Name, s.Timeout)
+	syscall.Kill(-cmd.Process.Pid, syscall.SIGTERM)
+	select {
+	case <-exited:
+	case <-time.After(killDelay):
+		syscall.Kill(-cmd.Process.Pid, syscall.SIGKILL)
+		<-exited
+	}
+	return exitTimeout
+}
+
+// followOutput writes new lines of a script log to the output with a [name]
+// prefix until the script exits
+func (r *Runner) followOutput(name, logPath string, exited <-chan struct{}) {
+	f, err := os.Open(logPath)
+	if err != nil {
+		return
+	}
+	defer f.Close()
+	reader := bufio.NewReader(f)
+	var partial string
+	for {
+		line, err := reader.ReadString('\n')
+		if err == nil {
+			r.printf("[%v] %v%v", name, partial, line)
+			partial = ""
+			continue
+		}
+		partial += line
+		if err != io.EOF {
+			return
+		}
+		select {
+		case <-exited:
+			// read what was written until the script exited
+			rest, _ := ioutil.ReadAll(reader)
+			for _, line := range strings.SplitAfter(partial+string(rest), "\n") {
+				if line != "" {
+					r.printf("[%v] %v", name, strings.TrimSuffix(line, "\n")+"\n")
+				}
+			}
+			return
+		case <-time.After(followInterval):
+		}
+	}
+}
+
+func (r *Runner) printf(format string, a ...interface{}) {
+	r.outputMu.Lock()
+	defer r.outputMu.Unlock()
+	fmt.Fprintf(r.output, format, a...)
+}
+
+func exitCodeOf(err error) int {
+	if err == nil {
+		return 0
+	}
+	if exitErr, ok := err.(*exec.ExitError); ok {
+		if status, ok := exitErr.Sys().(syscall.WaitStatus); ok {
+			if status.Signaled() {
+				return 128 + int(status.Signal())
+			}
+			return status.ExitStatus()
+		}
+	}
+	return 1
+}
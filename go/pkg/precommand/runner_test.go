@@ -0,0 +1,141 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package precommand
+
+import (
+	"bytes"
+	"fmt"
+	"io/ioutil"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+
+	"github.com/stretchr/testify/assert"
+)
+
+func newPlan(t *testing.T, dir string, scripts map[string]string, deps [][]string, order []string) *Plan {
+	plan := &Plan{}
+	for i, name := range order {
+		path := filepath.Join(dir, name+".sh")
+		assert.Nil(t, ioutil.WriteFile(path, []byte(scripts[name]), 0644))
+		plan.Scripts = append(plan.Scripts, Script{Name: name, Path: path, DependsOn: deps[i]})
+	}
+	assert.Nil(t, plan.Validate())
+	return plan
+}
+
+func TestRunnerConcurrentAndOrdered(t *testing.T) {
+	dir, err := ioutil.TempDir("", "precommand")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+	mark := filepath.Join(dir, "mark")
+
+	// a and b are independent and run concurrently, c runs after both
+	plan := newPlan(t, dir, map[string]string{
+		"a": fmt.Sprintf("sleep 0.5; echo a >> %v; echo done a", mark),
+		"b": fmt.Sprintf("sleep 0.5; echo b >> %v; echo -n done b", mark),
+		"c": fmt.Sprintf("echo c >> %v", mark),
+	}, [][]string{nil, nil, {"a", "b"}}, []string{"a", "b", "c"})
+
+	var output bytes.Buffer
+	start := time.Now()
+	results, exitCode := NewRunner(plan, dir, &output).Run()
+	assert.Equal(t, 0, exitCode)
+	assert.True(t, time.Since(start) < 900*time.Millisecond)
+	assert.Equal(t, 3, len(results))
+
+	content, err := ioutil.ReadFile(mark)
+	assert.Nil(t, err)
+	assert.True(t, strings.HasSuffix(string(content), "c\n"))
+	assert.Contains(t, output.String(), "[a] done a\n")
+	assert.Contains(t, output.String(), "[b] done b\n")
+	log, err := ioutil.ReadFile(filepath.Join(dir, "b.log"))
+	assert.Nil(t, err)
+	assert.Equal(t, "done b", string(log))
+}
+
+func TestRunnerFailure(t *testing.T) {
+	dir, err := ioutil.TempDir("", "precommand")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	// the failure of a terminates b and c is never started
+	plan := newPlan(t, dir, map[string]string{
+		"a": "set -o errexit\nfalse\necho unreachable",
+		"b": "sleep 10",
+		"c": "echo c",
+	}, [][]string{nil, nil, {"a"}}, []string{"a", "b", "c"})
+
+	var output bytes.Buffer
+	start := time.Now()
+	results, exitCode := NewRunner(plan, dir, &output).Run()
+	assert.Equal(t, 1, exitCode)
+	assert.True(t, time.Since(start) < 5*time.Second)
+	assert.Equal(t, 1, results[0].ExitCode)
+	assert.Equal(t, 128+15, results[1].ExitCode)
+	assert.True(t, results[2].Skipped)
+	assert.NotContains(t, output.String(), "unreachable")
+}
+
+func TestPlanValidate(t *testing.T) {
+	plan := &Plan{Scripts: []Script{
+		{Name: "a", Path: "a.sh", DependsOn: []string{"b"}},
+		{Name: "b", Path: "b.sh"},
+	}}
+	assert.NotNil(t, plan.Validate())
+	plan.Scripts[0].DependsOn = nil
+	assert.Nil(t, plan.Validate())
+	plan.Scripts[1].Name = "a"
+	assert.NotNil(t, plan.Validate())
+}
+
+func TestRunnerRetryAndTimeout(t *testing.T) {
+	dir, err := ioutil.TempDir("", "precommand")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+	retryDelay = 10 * time.Millisecond
+	count := filepath.Join(dir, "count")
+
+	// a succeeds in the third try, b times out in every try
+	plan := newPlan(t, dir, map[string]string{
+		"a": fmt.Sprintf("echo try >> %v; [[ $(wc -l < %v) -ge 3 ]]", count, count),
+		"b": "sleep 10",
+	}, [][]string{nil, nil}, []string{"a", "b"})
+	plan.Scripts[0].Retries = 3
+	plan.Scripts[1].Retries = 1
+	plan.Scripts[1].Timeout = 1
+
+	var output bytes.Buffer
+	start := time.Now()
+	results, exitCode := NewRunner(plan, dir, &output).Run()
+	assert.True(t, time.Since(start) < 5*time.Second)
+	assert.Equal(t, 0, results[0].ExitCode)
+	assert.Equal(t, exitTimeout, results[1].ExitCode)
+	assert.Equal(t, exitTimeout, exitCode)
+	content, err := ioutil.ReadFile(count)
+	assert.Nil(t, err)
+	assert.Equal(t, "try\ntry\ntry\n", string(content))
+	assert.Contains(t, output.String(), "[b] failed with exit code 124, retry 1 of 1")
+}
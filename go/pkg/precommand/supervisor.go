@@ -0,0 +1,233 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package precommand
+
+import (
+	"bufio"
+	"encoding/json"
+	"fmt"
+	"io"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"sync"
+	"syscall"
+	"time"
+
+	"github.com/microsoft/openpai-runtime/pkg/userlog"
+)
+
+// Restart policies of background commands
+const (
+	RestartNever     = "never"
+	RestartOnFailure = "on-failure"
+	RestartAlways    = "always"
+)
+
+// BackgroundCommand is a plugin command which runs alongside the user
+// command instead of blocking it
+type BackgroundCommand struct {
+	// Name identifies the command in output and logs, e.g. cmd-0-bg0
+	Name string `json:"name"`
+	// Command is run with /bin/bash -c
+	Command string `json:"command"`
+	// Restart is one of never, on-failure and always
+	Restart string `json:"restart"`
+	// MaxRestarts limits restarts, 0 means no limit
+	MaxRestarts int `json:"maxRestarts"`
+}
+
+// LoadBackgroundCommands reads background commands appended by plugins, one
+// json object per line
+func LoadBackgroundCommands(path string) ([]BackgroundCommand, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+	var commands []BackgroundCommand
+	seen := map[string]bool{}
+	scanner := bufio.NewScanner(f)
+	scanner.Buffer(make([]byte, 64*1024), 1024*1024)
+	for scanner.Scan() {
+		if len(scanner.Bytes()) == 0 {
+			continue
+		}
+		var c BackgroundCommand
+		if err = json.Unmarshal(scanner.Bytes(), &c); err != nil {
+			return nil, err
+		}
+		if c.Name == "" || c.Command == "" || seen[c.Name] {
+			return nil, fmt.Errorf("background command must have unique name and command: %+v", c)
+		}
+		switch c.Restart {
+		case "":
+			c.Restart = RestartNever
+		case RestartNever, RestartOnFailure, RestartAlways:
+		default:
+			return nil, fmt.Errorf("unknown restart policy %v of %v", c.Restart, c.Name)
+		}
+		seen[c.Name] = true
+		commands = append(commands, c)
+	}
+	return commands, scanner.Err()
+}
+
+// Supervisor runs background commands until they exit or it is stopped.
+// Every command runs in its own process group with its output appended to
+// the rotated log logDir/<name>/current, commands are restarted by their
+// policy with backoff
+type Supervisor struct {
+	commands []BackgroundCommand
+	logDir   string
+	output   io.Writer
+
+	// the restart delay doubles from RestartDelay up to MaxRestartDelay,
+	// stopped commands are killed after StopTimeout
+	RestartDelay    time.Duration
+	MaxRestartDelay time.Duration
+	StopTimeout     time.Duration
+	// LogOptions limits the size of the log of every command
+	LogOptions userlog.Options
+
+	outputMu sync.Mutex
+}
+
+// NewSupervisor creates a supervisor which writes start and exit of
+// commands to output
+func NewSupervisor(commands []BackgroundCommand, logDir string, output io.Writer) *Supervisor {
+	return &Supervisor{
+		commands:        commands,
+		logDir:          logDir,
+		output:          output,
+		RestartDelay:    time.Second,
+		MaxRestartDelay: time.Minute,
+		StopTimeout:     10 * time.Second,
+		LogOptions: userlog.Options{
+			MaxSize:  64 * 1024 * 1024,
+			MaxFiles: 2,
+		},
+	}
+}
+
+// Run returns once all commands exited without restart, or once stop is
+// closed and all running commands are terminated
+func (s *Supervisor) Run(stop <-chan struct{}) {
+	var wg sync.WaitGroup
+	for _, c := range s.commands {
+		wg.Add(1)
+		go func(c BackgroundCommand) {
+			defer wg.Done()
+			s.supervise(c, stop)
+		}(c)
+	}
+	wg.Wait()
+}
+
+func (s *Supervisor) supervise(c BackgroundCommand, stop <-chan struct{}) {
+	// restarts of a command append to the same log
+	logWriter, err := userlog.NewRotatingWriter(filepath.Join(s.logDir, c.Name), s.LogOptions)
+	if err != nil {
+		s.printf("[%v] failed to open log: %v\n", c.Name, err)
+		return
+	}
+	defer func() {
+		if err := logWriter.Close(); err != nil {
+			s.printf("[%v] failed to close log: %v\n", c.Name, err)
+		}
+	}()
+	for restarts := 0; ; restarts++ {
+		exitCode, stopped := s.runOnce(c, logWriter, stop)
+		if stopped {
+			return
+		}
+		s.printf("[%v] exited with code %v\n", c.Name, exitCode)
+		if !shouldRestart(c, exitCode, restarts) {
+			return
+		}
+		delay := s.MaxRestartDelay
+		if restarts < 31 {
+			if d := s.RestartDelay << uint(restarts); d > 0 && d < delay {
+				delay = d
+			}
+		}
+		select {
+		case <-stop:
+			return
+		case <-time.After(delay):
+		}
+		s.printf("[%v] restarting, restart %v\n", c.Name, restarts+1)
+	}
+}
+
+func shouldRestart(c BackgroundCommand, exitCode, restarts int) bool {
+	if c.MaxRestarts > 0 && restarts >= c.MaxRestarts {
+		return false
+	}
+	switch c.Restart {
+	case RestartAlways:
+		return true
+	case RestartOnFailure:
+		return exitCode != 0
+	}
+	return false
+}
+
+// runOnce runs the command until it exits or stop is closed. Stdout and
+// stderr share one pipe, so only one goroutine writes to logWriter
+func (s *Supervisor) runOnce(c BackgroundCommand, logWriter io.Writer, stop <-chan struct{}) (int, bool) {
+	cmd := exec.Command("/bin/bash", "-c", c.Command)
+	cmd.Stdout = logWriter
+	cmd.Stderr = logWriter
+	cmd.SysProcAttr = &syscall.SysProcAttr{Setpgid: true}
+	if err := cmd.Start(); err != nil {
+		s.printf("[%v] failed to start: %v\n", c.Name, err)
+		return 1, false
+	}
+	s.printf("[%v] started\n", c.Name)
+
+	exited := make(chan int, 1)
+	go func() {
+		exited <- exitCodeOf(cmd.Wait())
+	}()
+	select {
+	case exitCode := <-exited:
+		return exitCode, false
+	case <-stop:
+	}
+	syscall.Kill(-cmd.Process.Pid, syscall.SIGTERM)
+	select {
+	case <-exited:
+	case <-time.After(s.StopTimeout):
+		syscall.Kill(-cmd.Process.Pid, syscall.SIGKILL)
+		<-exited
+	}
+	s.printf("[%v] stopped\n", c.Name)
+	return 0, true
+}
+
+func (s *Supervisor) printf(format string, a ...interface{}) {
+	s.outputMu.Lock()
+	defer s.outputMu.Unlock()
+	fmt.Fprintf(s.output, format, a...)
+}
@@ -0,0 +1,125 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package precommand
+
+import (
+	"bytes"
+	"io/ioutil"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+
+	"github.com/microsoft/openpai-runtime/pkg/userlog"
+	"github.com/stretchr/testify/assert"
+)
+
+func TestLoadBackgroundCommands(t *testing.T) {
+	dir, err := ioutil.TempDir("", "supervisor")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+	path := filepath.Join(dir, "background.jsonl")
+
+	assert.Nil(t, ioutil.WriteFile(path, []byte(`{"name": "a", "command": "true"}
+{"name": "b", "command": "false", "restart": "on-failure", "maxRestarts": 2}
+`), 0644))
+	commands, err := LoadBackgroundCommands(path)
+	assert.Nil(t, err)
+	assert.Equal(t, []BackgroundCommand{
+		{Name: "a", Command: "true", Restart: RestartNever},
+		{Name: "b", Command: "false", Restart: RestartOnFailure, MaxRestarts: 2},
+	}, commands)
+
+	assert.Nil(t, ioutil.WriteFile(path, []byte(`{"name": "a", "command": "true", "restart": "sometimes"}`), 0644))
+	_, err = LoadBackgroundCommands(path)
+	assert.NotNil(t, err)
+}
+
+func TestSupervisorRestart(t *testing.T) {
+	dir, err := ioutil.TempDir("", "supervisor")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	var output bytes.Buffer
+	s := NewSupervisor([]BackgroundCommand{
+		{Name: "once", Command: "echo once", Restart: RestartNever},
+		{Name: "flaky", Command: "echo try; exit 3", Restart: RestartOnFailure, MaxRestarts: 2},
+	}, dir, &output)
+	s.RestartDelay = 10 * time.Millisecond
+	s.Run(make(chan struct{}))
+
+	log, err := ioutil.ReadFile(filepath.Join(dir, "flaky", userlog.CurrentFileName))
+	assert.Nil(t, err)
+	// the first run and two restarts
+	assert.Equal(t, "try\ntry\ntry\n", string(log))
+	log, err = ioutil.ReadFile(filepath.Join(dir, "once", userlog.CurrentFileName))
+	assert.Nil(t, err)
+	assert.Equal(t, "once\n", string(log))
+	assert.Contains(t, output.String(), "[flaky] exited with code 3\n")
+}
+
+func TestSupervisorStop(t *testing.T) {
+	dir, err := ioutil.TempDir("", "supervisor")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	var output bytes.Buffer
+	s := NewSupervisor([]BackgroundCommand{
+		// the child of the shell is stopped with its process group
+		{Name: "daemon", Command: "sleep 60 & wait", Restart: RestartAlways},
+	}, dir, &output)
+	stop := make(chan struct{})
+	go func() {
+		time.Sleep(200 * time.Millisecond)
+		close(stop)
+	}()
+	start := time.Now()
+	s.Run(stop)
+	assert.True(t, time.Since(start) < 5*time.Second)
+	assert.True(t, strings.HasSuffix(output.String(), "[daemon] stopped\n"))
+}
+
+func TestSupervisorLogSizeLimit(t *testing.T) {
+	dir, err := ioutil.TempDir("", "supervisor")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	var output bytes.Buffer
+	s := NewSupervisor([]BackgroundCommand{
+		{Name: "noisy", Command: "for i in $(seq 1000); do echo line $i; done; exit 1", Restart: RestartOnFailure, MaxRestarts: 2},
+	}, dir, &output)
+	s.RestartDelay = 10 * time.Millisecond
+	s.LogOptions = userlog.Options{MaxSize: 1024, MaxFiles: 2}
+	s.Run(make(chan struct{}))
+
+	// restarts append to the log, which keeps at most two rotated files
+	logDir := filepath.Join(dir, "noisy")
+	rotated, err := userlog.RotatedFiles(logDir)
+	assert.Nil(t, err)
+	assert.Equal(t, 2, len(rotated))
+	current, err := ioutil.ReadFile(filepath.Join(logDir, userlog.CurrentFileName))
+	assert.Nil(t, err)
+	assert.True(t, len(current) <= 1024)
+	assert.True(t, strings.HasSuffix(string(current), "line 1000\n"))
+}
@@ -0,0 +1,188 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package sampler
+
+import (
+	"bytes"
+	"io"
+	"os"
+	"path/filepath"
+	"strconv"
+)
+
+// USER_HZ, the unit of cpu times in /proc/<pid>/stat, is 100 on all
+// architectures the runtime is built for
+const nsPerClockTick = int64(1000000000 / 100)
+
+// procStat holds the fields read from /proc/<pid>/stat
+type procStat struct {
+	ppid int
+	// user and system cpu time of the process and its waited-for children
+	userNs   int64
+	systemNs int64
+	threads  int64
+}
+
+// procFS reads process and cgroup counters, one buffer is reused for all
+// reads so sampling does not allocate per process
+type procFS struct {
+	procRoot   string
+	cgroupRoot string
+	buf        []byte
+}
+
+func newProcFS(procRoot, cgroupRoot string) *procFS {
+	return &procFS{procRoot: procRoot, cgroupRoot: cgroupRoot, buf: make([]byte, 4096)}
+}
+
+// readFile reads a small file into the shared buffer, the returned slice is
+// only valid until the next read
+func (fs *procFS) readFile(path string) ([]byte, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+	n := 0
+	for {
+		if n == len(fs.buf) {
+			fs.buf = append(fs.buf, make([]byte, len(fs.buf))...)
+		}
+		m, err := f.Read(fs.buf[n:])
+		n += m
+		if err == io.EOF {
+			return fs.buf[:n], nil
+		}
+		if err != nil {
+			return nil, err
+		}
+	}
+}
+
+// pids lists all processes visible in procRoot
+func (fs *procFS) pids() ([]int, error) {
+	d, err := os.Open(fs.procRoot)
+	if err != nil {
+		return nil, err
+	}
+	defer d.Close()
+	names, err := d.Readdirnames(-1)
+	if err != nil {
+		return nil, err
+	}
+	pids := make([]int, 0, len(names))
+	for _, name := range names {
+		if pid, err := strconv.Atoi(name); err == nil {
+			pids = append(pids, pid)
+		}
+	}
+	return pids, nil
+}
+
+func (fs *procFS) stat(pid int) (procStat, error) {
+	var s procStat
+	content, err := fs.readFile(filepath.Join(fs.procRoot, strconv.Itoa(pid), "stat"))
+	if err != nil {
+		return s, err
+	}
+	// comm may contain spaces and parentheses, fields start after the last ')'
+	i := bytes.LastIndexByte(content, ')')
+	if i < 0 {
+		return s, errMalformed
+	}
+	fields := bytes.Fields(content[i+1:])
+	// fields[0] is state (field 3 in proc(5)), so field N is fields[N-3]
+	if len(fields) < 18 {
+		return s, errMalformed
+	}
+	s.ppid = int(parseInt(fields[1]))
+	s.userNs = (parseInt(fields[11]) + parseInt(fields[13])) * nsPerClockTick
+	s.systemNs = (parseInt(fields[12]) + parseInt(fields[14])) * nsPerClockTick
+	s.threads = parseInt(fields[17])
+	return s, nil
+}
+
+// rss returns VmRSS from /proc/<pid>/status in bytes
+func (fs *procFS) rss(pid int) (int64, error) {
+	content, err := fs.readFile(filepath.Join(fs.procRoot, strconv.Itoa(pid), "status"))
+	if err != nil {
+		return 0, err
+	}
+	return lookupField(content, "VmRSS:") * 1024, nil
+}
+
+// io returns read_bytes and write_bytes from /proc/<pid>/io, which is only
+// readable for processes of the same user
+func (fs *procFS) io(pid int) (int64, int64, error) {
+	content, err := fs.readFile(filepath.Join(fs.procRoot, strconv.Itoa(pid), "io"))
+	if err != nil {
+		return 0, 0, err
+	}
+	return lookupField(content, "read_bytes:"), lookupField(content, "write_bytes:"), nil
+}
+
+// cgroup returns cpu usage in nanoseconds and memory usage in bytes of the
+// container cgroup, both cgroup v2 and v1 layouts are supported
+func (fs *procFS) cgroup() (int64, int64) {
+	var cpuNs, memory int64
+	if _, err := os.Stat(filepath.Join(fs.cgroupRoot, "cgroup.controllers")); err == nil {
+		if content, err := fs.readFile(filepath.Join(fs.cgroupRoot, "cpu.stat")); err == nil {
+			cpuNs = lookupField(content, "usage_usec") * 1000
+		}
+		if content, err := fs.readFile(filepath.Join(fs.cgroupRoot, "memory.current")); err == nil {
+			memory = parseInt(bytes.TrimSpace(content))
+		}
+		return cpuNs, memory
+	}
+	if content, err := fs.readFile(filepath.Join(fs.cgroupRoot, "cpuacct", "cpuacct.usage")); err == nil {
+		cpuNs = parseInt(bytes.TrimSpace(content))
+	}
+	if content, err := fs.readFile(filepath.Join(fs.cgroupRoot, "memory", "memory.usage_in_bytes")); err == nil {
+		memory = parseInt(bytes.TrimSpace(content))
+	}
+	return cpuNs, memory
+}
+
+// lookupField returns the first number after key in a "key value" file
+func lookupField(content []byte, key string) int64 {
+	for len(content) > 0 {
+		line := content
+		if i := bytes.IndexByte(content, '\n'); i >= 0 {
+			line, content = content[:i], content[i+1:]
+		} else {
+			content = nil
+		}
+		if bytes.HasPrefix(line, []byte(key)) {
+			fields := bytes.Fields(line[len(key):])
+			if len(fields) > 0 {
+				return parseInt(fields[0])
+			}
+		}
+	}
+	return 0
+}
+
+func parseInt(b []byte) int64 {
+	v, _ := strconv.ParseInt(string(b), 10, 64)
+	return v
+}
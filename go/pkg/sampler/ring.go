@@ -0,0 +1,197 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package sampler
+
+import (
+	"encoding/binary"
+	"errors"
+	"io"
+	"os"
+	"time"
+)
+
+const (
+	ringMagic = "PAIRING1"
+	// magic, record size, capacity and number of records ever written
+	ringHeaderSize = 32
+	recordFields   = 12
+	// RecordSize is the size of a record in the ring file, every field is a
+	// little endian int64 in the order of the Record fields
+	RecordSize = recordFields * 8
+)
+
+var (
+	errMalformed = errors.New("malformed file")
+	errNotRing   = errors.New("not a ring file or record size mismatch")
+)
+
+// Record is one sample of the user process tree and the container cgroup
+type Record struct {
+	Time time.Time
+	// Processes and Threads in the user process tree
+	Processes int64
+	Threads   int64
+	// cpu time of the process tree, including waited-for exited children
+	CPUUserNs   int64
+	CPUSystemNs int64
+	RSSBytes    int64
+	ReadBytes   int64
+	WriteBytes  int64
+	// counters of the container cgroup
+	CgroupCPUNs       int64
+	CgroupMemoryBytes int64
+	// SamplerCPUNs is the cpu time used by the sampler itself and
+	// SampleDuration the wall time of taking this sample
+	SamplerCPUNs   int64
+	SampleDuration time.Duration
+}
+
+func (r *Record) encode(b []byte) {
+	for i, v := range [recordFields]int64{
+		r.Time.UnixNano(), r.Processes, r.Threads, r.CPUUserNs, r.CPUSystemNs,
+		r.RSSBytes, r.ReadBytes, r.WriteBytes, r.CgroupCPUNs, r.CgroupMemoryBytes,
+		r.SamplerCPUNs, int64(r.SampleDuration),
+	} {
+		binary.LittleEndian.PutUint64(b[i*8:], uint64(v))
+	}
+}
+
+func decodeRecord(b []byte) Record {
+	var v [recordFields]int64
+	for i := range v {
+		v[i] = int64(binary.LittleEndian.Uint64(b[i*8:]))
+	}
+	return Record{
+		Time: time.Unix(0, v[0]), Processes: v[1], Threads: v[2],
+		CPUUserNs: v[3], CPUSystemNs: v[4], RSSBytes: v[5], ReadBytes: v[6],
+		WriteBytes: v[7], CgroupCPUNs: v[8], CgroupMemoryBytes: v[9],
+		SamplerCPUNs: v[10], SampleDuration: time.Duration(v[11]),
+	}
+}
+
+// Ring is a file of fixed size records, the oldest record is overwritten
+// once capacity records are written. The file never grows beyond
+// ringHeaderSize + capacity*RecordSize bytes
+type Ring struct {
+	file     *os.File
+	capacity int64
+	count    int64
+	buf      [RecordSize]byte
+}
+
+// NewRing creates the ring file at path, an existing ring file with the
+// same record size is appended to
+func NewRing(path string, capacity int64) (*Ring, error) {
+	f, err := os.OpenFile(path, os.O_RDWR|os.O_CREATE, 0644)
+	if err != nil {
+		return nil, err
+	}
+	r := &Ring{file: f, capacity: capacity}
+	if recordSize, c, count, err := readRingHeader(f); err == nil && recordSize == RecordSize {
+		r.capacity, r.count = c, count
+		return r, nil
+	}
+	if err = f.Truncate(0); err != nil {
+		f.Close()
+		return nil, err
+	}
+	if err = r.writeHeader(); err != nil {
+		f.Close()
+		return nil, err
+	}
+	return r, nil
+}
+
+func readRingHeader(r io.ReaderAt) (recordSize, capacity, count int64, err error) {
+	var header [ringHeaderSize]byte
+	if _, err = r.ReadAt(header[:], 0); err != nil {
+		return
+	}
+	if string(header[:8]) != ringMagic {
+		err = errNotRing
+		return
+	}
+	recordSize = int64(binary.LittleEndian.Uint64(header[8:]))
+	capacity = int64(binary.LittleEndian.Uint64(header[16:]))
+	count = int64(binary.LittleEndian.Uint64(header[24:]))
+	if capacity <= 0 {
+		err = errNotRing
+	}
+	return
+}
+
+func (r *Ring) writeHeader() error {
+	var header [ringHeaderSize]byte
+	copy(header[:], ringMagic)
+	binary.LittleEndian.PutUint64(header[8:], RecordSize)
+	binary.LittleEndian.PutUint64(header[16:], uint64(r.capacity))
+	binary.LittleEndian.PutUint64(header[24:], uint64(r.count))
+	_, err := r.file.WriteAt(header[:], 0)
+	return err
+}
+
+// Append writes record to the next slot, the header is updated after the
+// record so readers never see a slot which is not written yet
+func (r *Ring) Append(record *Record) error {
+	record.encode(r.buf[:])
+	off := ringHeaderSize + (r.count%r.capacity)*RecordSize
+	if _, err := r.file.WriteAt(r.buf[:], off); err != nil {
+		return err
+	}
+	r.count++
+	return r.writeHeader()
+}
+
+// Close closes the ring file
+func (r *Ring) Close() error {
+	return r.file.Close()
+}
+
+// ReadRing returns the records in the ring file, oldest first
+func ReadRing(path string) ([]Record, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+	recordSize, capacity, count, err := readRingHeader(f)
+	if err != nil {
+		return nil, err
+	}
+	if recordSize != RecordSize {
+		return nil, errNotRing
+	}
+	first := int64(0)
+	if count > capacity {
+		first = count - capacity
+	}
+	records := make([]Record, 0, count-first)
+	buf := make([]byte, RecordSize)
+	for i := first; i < count; i++ {
+		if _, err = f.ReadAt(buf, ringHeaderSize+(i%capacity)*RecordSize); err != nil {
+			return nil, err
+		}
+		records = append(records, decodeRecord(buf))
+	}
+	return records, nil
+}
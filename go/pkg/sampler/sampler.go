@@ -0,0 +1,242 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package sampler
+
+import (
+	"errors"
+	"fmt"
+	"io"
+	"net/http"
+	"sync"
+	"syscall"
+	"time"
+)
+
+// ErrProcessExited is returned by Sample once the root process is gone
+var ErrProcessExited = errors.New("root process exited")
+
+// Options of Sampler
+type Options struct {
+	// ProcRoot and CgroupRoot are /proc and /sys/fs/cgroup unless set for tests
+	ProcRoot   string
+	CgroupRoot string
+	// Interval between samples
+	Interval time.Duration
+	// MaxOverhead is the fraction of one cpu the sampler may use, the
+	// interval is doubled up to MaxInterval while the sampler exceeds it
+	MaxOverhead float64
+	MaxInterval time.Duration
+}
+
+// Sampler periodically samples the process tree under a root process
+type Sampler struct {
+	root int
+	opts Options
+	fs   *procFS
+	ring *Ring
+
+	children map[int][]int
+	stats    map[int]procStat
+
+	mu   sync.Mutex
+	last Record
+}
+
+// NewSampler creates a sampler of the process tree under root, samples are
+// appended to ring if it is not nil
+func NewSampler(root int, ring *Ring, opts Options) *Sampler {
+	if opts.ProcRoot == "" {
+		opts.ProcRoot = "/proc"
+	}
+	if opts.CgroupRoot == "" {
+		opts.CgroupRoot = "/sys/fs/cgroup"
+	}
+	if opts.MaxInterval < opts.Interval {
+		opts.MaxInterval = opts.Interval
+	}
+	return &Sampler{
+		root:     root,
+		opts:     opts,
+		fs:       newProcFS(opts.ProcRoot, opts.CgroupRoot),
+		ring:     ring,
+		children: map[int][]int{},
+		stats:    map[int]procStat{},
+	}
+}
+
+// Sample reads the counters of the process tree and the cgroup once
+func (s *Sampler) Sample() (Record, error) {
+	start := time.Now()
+	record := Record{Time: start}
+
+	pids, err := s.fs.pids()
+	if err != nil {
+		return record, err
+	}
+	for pid := range s.children {
+		delete(s.children, pid)
+	}
+	for pid := range s.stats {
+		delete(s.stats, pid)
+	}
+	for _, pid := range pids {
+		// processes may exit while being listed
+		if stat, err := s.fs.stat(pid); err == nil {
+			s.stats[pid] = stat
+			s.children[stat.ppid] = append(s.children[stat.ppid], pid)
+		}
+	}
+	if _, ok := s.stats[s.root]; !ok {
+		return record, ErrProcessExited
+	}
+
+	queue := []int{s.root}
+	for len(queue) > 0 {
+		pid := queue[0]
+		queue = append(queue[1:], s.children[pid]...)
+		stat := s.stats[pid]
+		record.Processes++
+		record.Threads += stat.threads
+		record.CPUUserNs += stat.userNs
+		record.CPUSystemNs += stat.systemNs
+		if rss, err := s.fs.rss(pid); err == nil {
+			record.RSSBytes += rss
+		}
+		if read, write, err := s.fs.io(pid); err == nil {
+			record.ReadBytes += read
+			record.WriteBytes += write
+		}
+	}
+	record.CgroupCPUNs, record.CgroupMemoryBytes = s.fs.cgroup()
+
+	record.SamplerCPUNs = selfCPUNs()
+	record.SampleDuration = time.Since(start)
+
+	s.mu.Lock()
+	s.last = record
+	s.mu.Unlock()
+	if s.ring != nil {
+		if err = s.ring.Append(&record); err != nil {
+			return record, err
+		}
+	}
+	return record, nil
+}
+
+// Run samples until the root process exits or stop is closed
+func (s *Sampler) Run(stop <-chan struct{}) error {
+	interval := s.opts.Interval
+	lastCPU := selfCPUNs()
+	timer := time.NewTimer(0)
+	defer timer.Stop()
+	for {
+		select {
+		case <-stop:
+			return nil
+		case <-timer.C:
+		}
+		record, err := s.Sample()
+		if err == ErrProcessExited {
+			return nil
+		}
+		if err != nil {
+			return err
+		}
+		// cpu used since the last sample, including serving metrics
+		cost := record.SamplerCPUNs - lastCPU
+		lastCPU = record.SamplerCPUNs
+		interval = s.adjustInterval(interval, time.Duration(cost))
+		timer.Reset(interval)
+	}
+}
+
+// adjustInterval keeps the sampler cpu usage under MaxOverhead
+func (s *Sampler) adjustInterval(interval, cost time.Duration) time.Duration {
+	if s.opts.MaxOverhead <= 0 {
+		return interval
+	}
+	budget := time.Duration(float64(interval) * s.opts.MaxOverhead)
+	if cost > budget && interval < s.opts.MaxInterval {
+		interval *= 2
+		if interval > s.opts.MaxInterval {
+			interval = s.opts.MaxInterval
+		}
+	} else if cost < budget/4 && interval > s.opts.Interval {
+		interval /= 2
+		if interval < s.opts.Interval {
+			interval = s.opts.Interval
+		}
+	}
+	return interval
+}
+
+// Last returns the latest sample
+func (s *Sampler) Last() Record {
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	return s.last
+}
+
+// WriteMetrics writes the latest sample in Prometheus text format
+func (s *Sampler) WriteMetrics(w io.Writer) error {
+	r := s.Last()
+	if r.Time.IsZero() {
+		return nil
+	}
+	for _, m := range []struct {
+		name, kind, help string
+		value            float64
+	}{
+		{"openpai_task_processes", "gauge", "Number of processes in the user process tree.", float64(r.Processes)},
+		{"openpai_task_threads", "gauge", "Number of threads in the user process tree.", float64(r.Threads)},
+		{"openpai_task_cpu_user_seconds_total", "counter", "User cpu time of the user process tree.", float64(r.CPUUserNs) / 1e9},
+		{"openpai_task_cpu_system_seconds_total", "counter", "System cpu time of the user process tree.", float64(r.CPUSystemNs) / 1e9},
+		{"openpai_task_resident_memory_bytes", "gauge", "Resident memory of the user process tree.", float64(r.RSSBytes)},
+		{"openpai_task_read_bytes_total", "counter", "Bytes read from storage by the user process tree.", float64(r.ReadBytes)},
+		{"openpai_task_write_bytes_total", "counter", "Bytes written to storage by the user process tree.", float64(r.WriteBytes)},
+		{"openpai_task_cgroup_cpu_seconds_total", "counter", "Cpu time of the container cgroup.", float64(r.CgroupCPUNs) / 1e9},
+		{"openpai_task_cgroup_memory_bytes", "gauge", "Memory usage of the container cgroup.", float64(r.CgroupMemoryBytes)},
+		{"openpai_task_sampler_cpu_seconds_total", "counter", "Cpu time used by the resource sampler.", float64(r.SamplerCPUNs) / 1e9},
+		{"openpai_task_sampler_duration_seconds", "gauge", "Wall time of taking the latest sample.", r.SampleDuration.Seconds()},
+	} {
+		if _, err := fmt.Fprintf(w, "# HELP %s %s\n# TYPE %s %s\n%s %g\n",
+			m.name, m.help, m.name, m.kind, m.name, m.value); err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
+// ServeHTTP serves the latest sample in Prometheus text format
+func (s *Sampler) ServeHTTP(w http.ResponseWriter, _ *http.Request) {
+	w.Header().Set("Content-Type", "text/plain; version=0.0.4")
+	s.WriteMetrics(w)
+}
+
+func selfCPUNs() int64 {
+	var usage syscall.Rusage
+	if err := syscall.Getrusage(syscall.RUSAGE_SELF, &usage); err != nil {
+		return 0
+	}
+	return usage.Utime.Nano() + usage.Stime.Nano()
+}
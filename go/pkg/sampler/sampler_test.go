@@ -0,0 +1,171 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package sampler
+
+import (
+	"bytes"
+	"fmt"
+	"io/ioutil"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+
+	"github.com/stretchr/testify/assert"
+)
+
+func writeProc(t *testing.T, procRoot string, pid, ppid int, utime, rssKB, readBytes int64) {
+	dir := filepath.Join(procRoot, fmt.Sprint(pid))
+	assert.Nil(t, os.MkdirAll(dir, 0755))
+	stat := fmt.Sprintf("%d (a (b) c) S %d 1 1 0 -1 4194304 100 0 0 0 %d 5 0 0 20 0 2 0 100 1000 10\n", pid, ppid, utime)
+	status := fmt.Sprintf("Name:\ta\nVmPeak:\t 9999 kB\nVmRSS:\t %d kB\nThreads:\t2\n", rssKB)
+	io := fmt.Sprintf("rchar: 1\nwchar: 1\nread_bytes: %d\nwrite_bytes: 7\n", readBytes)
+	assert.Nil(t, ioutil.WriteFile(filepath.Join(dir, "stat"), []byte(stat), 0644))
+	assert.Nil(t, ioutil.WriteFile(filepath.Join(dir, "status"), []byte(status), 0644))
+	assert.Nil(t, ioutil.WriteFile(filepath.Join(dir, "io"), []byte(io), 0644))
+}
+
+func newFakeRoot(t *testing.T) (string, Options) {
+	dir, err := ioutil.TempDir("", "sampler")
+	assert.Nil(t, err)
+	opts := Options{
+		ProcRoot:   filepath.Join(dir, "proc"),
+		CgroupRoot: filepath.Join(dir, "cgroup"),
+		Interval:   time.Millisecond,
+	}
+	// 10 is the root, 11 and 12 its children, 13 a grandchild, 20 not in the tree
+	writeProc(t, opts.ProcRoot, 1, 0, 1000, 1000, 1000)
+	writeProc(t, opts.ProcRoot, 10, 1, 1, 100, 10)
+	writeProc(t, opts.ProcRoot, 11, 10, 2, 200, 20)
+	writeProc(t, opts.ProcRoot, 12, 10, 3, 300, 30)
+	writeProc(t, opts.ProcRoot, 13, 12, 4, 400, 40)
+	writeProc(t, opts.ProcRoot, 20, 1, 1000, 1000, 1000)
+	assert.Nil(t, os.MkdirAll(opts.CgroupRoot, 0755))
+	for name, content := range map[string]string{
+		"cgroup.controllers": "cpu memory\n",
+		"cpu.stat":           "usage_usec 1500\nuser_usec 1000\n",
+		"memory.current":     "4096\n",
+	} {
+		assert.Nil(t, ioutil.WriteFile(filepath.Join(opts.CgroupRoot, name), []byte(content), 0644))
+	}
+	return dir, opts
+}
+
+func TestSample(t *testing.T) {
+	dir, opts := newFakeRoot(t)
+	defer os.RemoveAll(dir)
+
+	ring, err := NewRing(filepath.Join(dir, "resource.ring"), 4)
+	assert.Nil(t, err)
+	defer ring.Close()
+
+	s := NewSampler(10, ring, opts)
+	record, err := s.Sample()
+	assert.Nil(t, err)
+	assert.Equal(t, int64(4), record.Processes)
+	assert.Equal(t, int64(8), record.Threads)
+	assert.Equal(t, int64(10)*nsPerClockTick, record.CPUUserNs)
+	assert.Equal(t, int64(20)*nsPerClockTick, record.CPUSystemNs)
+	assert.Equal(t, int64(1000*1024), record.RSSBytes)
+	assert.Equal(t, int64(100), record.ReadBytes)
+	assert.Equal(t, int64(28), record.WriteBytes)
+	assert.Equal(t, int64(1500000), record.CgroupCPUNs)
+	assert.Equal(t, int64(4096), record.CgroupMemoryBytes)
+
+	var metrics bytes.Buffer
+	assert.Nil(t, s.WriteMetrics(&metrics))
+	assert.True(t, strings.Contains(metrics.String(), "\nopenpai_task_processes 4\n"))
+	assert.True(t, strings.Contains(metrics.String(), "# TYPE openpai_task_read_bytes_total counter\n"))
+
+	assert.Nil(t, os.RemoveAll(filepath.Join(opts.ProcRoot, "10")))
+	_, err = s.Sample()
+	assert.Equal(t, ErrProcessExited, err)
+	// Run returns once the root process is gone
+	assert.Nil(t, s.Run(nil))
+}
+
+func TestCgroupV1(t *testing.T) {
+	dir, err := ioutil.TempDir("", "sampler")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	for name, content := range map[string]string{
+		"cpuacct/cpuacct.usage":        "123456\n",
+		"memory/memory.usage_in_bytes": "8192\n",
+	} {
+		path := filepath.Join(dir, name)
+		assert.Nil(t, os.MkdirAll(filepath.Dir(path), 0755))
+		assert.Nil(t, ioutil.WriteFile(path, []byte(content), 0644))
+	}
+	cpuNs, memory := newProcFS(dir, dir).cgroup()
+	assert.Equal(t, int64(123456), cpuNs)
+	assert.Equal(t, int64(8192), memory)
+}
+
+func TestAdjustInterval(t *testing.T) {
+	s := NewSampler(1, nil, Options{Interval: time.Second, MaxInterval: 8 * time.Second, MaxOverhead: 0.01})
+	// 10ms budget per second
+	interval := s.adjustInterval(time.Second, 20*time.Millisecond)
+	assert.Equal(t, 2*time.Second, interval)
+	interval = s.adjustInterval(8*time.Second, time.Second)
+	assert.Equal(t, 8*time.Second, interval)
+	interval = s.adjustInterval(8*time.Second, time.Millisecond)
+	assert.Equal(t, 4*time.Second, interval)
+	interval = s.adjustInterval(time.Second, 0)
+	assert.Equal(t, time.Second, interval)
+}
+
+func TestRing(t *testing.T) {
+	dir, err := ioutil.TempDir("", "sampler")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+	path := filepath.Join(dir, "resource.ring")
+
+	ring, err := NewRing(path, 3)
+	assert.Nil(t, err)
+	for i := int64(1); i <= 2; i++ {
+		assert.Nil(t, ring.Append(&Record{Time: time.Unix(i, 0), Processes: i}))
+	}
+	assert.Nil(t, ring.Close())
+
+	// reopening appends, older records are overwritten once the ring is full
+	ring, err = NewRing(path, 3)
+	assert.Nil(t, err)
+	for i := int64(3); i <= 5; i++ {
+		assert.Nil(t, ring.Append(&Record{Time: time.Unix(i, 0), Processes: i, SampleDuration: time.Millisecond}))
+	}
+	assert.Nil(t, ring.Close())
+
+	records, err := ReadRing(path)
+	assert.Nil(t, err)
+	assert.Equal(t, 3, len(records))
+	for i, r := range records {
+		assert.Equal(t, int64(i+3), r.Processes)
+		assert.Equal(t, time.Unix(int64(i+3), 0).UnixNano(), r.Time.UnixNano())
+		assert.Equal(t, time.Millisecond, r.SampleDuration)
+	}
+	info, err := os.Stat(path)
+	assert.Nil(t, err)
+	assert.Equal(t, int64(ringHeaderSize+3*RecordSize), info.Size())
+}
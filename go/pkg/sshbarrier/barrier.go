@@ -0,0 +1,237 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package sshbarrier
+
+import (
+	"context"
+	"errors"
+	"fmt"
+	"io"
+	"math/rand"
+	"net"
+	"os/exec"
+	"strings"
+	"sync"
+	"time"
+)
+
+// ErrTimeout is returned when some peers are still unreachable at the deadline
+var ErrTimeout = errors.New("ssh barrier timeout")
+
+// Options of Barrier
+type Options struct {
+	// ProbeTimeout of the tcp connect to the ssh port of a peer
+	ProbeTimeout time.Duration
+	// ProbeConcurrency and SSHConcurrency bound concurrent probes and ssh handshakes
+	ProbeConcurrency int
+	SSHConcurrency   int
+	// the retry interval of a peer doubles from InitialBackoff up to
+	// MaxBackoff, with up to half of it added or removed as jitter
+	InitialBackoff time.Duration
+	MaxBackoff     time.Duration
+	// TreeArity is the number of children of an instance in tree mode,
+	// MarkerDir keeps the markers signaled by its parent and children and
+	// is polled every PollInterval
+	TreeArity    int
+	MarkerDir    string
+	PollInterval time.Duration
+}
+
+// DefaultOptions used by the sshbarrier command
+var DefaultOptions = Options{
+	ProbeTimeout:     3 * time.Second,
+	ProbeConcurrency: 128,
+	SSHConcurrency:   16,
+	InitialBackoff:   time.Second,
+	MaxBackoff:       30 * time.Second,
+	TreeArity:        8,
+	MarkerDir:        "/tmp/pai-sshbarrier",
+	PollInterval:     time.Second,
+}
+
+// Barrier waits until every peer accepts ssh connections. A peer is first
+// probed with a tcp connect to its ssh port, the ssh handshake is only
+// done once the port accepts connections
+type Barrier struct {
+	opts Options
+	log  io.Writer
+
+	// Probe, Handshake and Signal can be replaced in tests
+	Probe     func(ctx context.Context, peer Peer) error
+	Handshake func(ctx context.Context, peer Peer) error
+	Signal    func(ctx context.Context, peer Peer, marker string) error
+}
+
+// NewBarrier creates a barrier which writes progress to log
+func NewBarrier(opts Options, log io.Writer) *Barrier {
+	b := &Barrier{opts: opts, log: log}
+	b.Probe = b.probe
+	b.Handshake = handshake
+	b.Signal = b.signal
+	return b
+}
+
+type peerState struct {
+	peer     Peer
+	attempts int
+	next     time.Time
+}
+
+// Wait returns nil once all peers passed the handshake, or ErrTimeout once
+// ctx is done with peers left
+func (b *Barrier) Wait(ctx context.Context, peers []Peer) error {
+	if err := b.reach(ctx, peers, b.Handshake, "ready"); err != nil {
+		return err
+	}
+	b.printf("All ssh connections are established\n")
+	return nil
+}
+
+// reach retries action on every peer with backoff until it succeeds, the
+// action is only tried once the ssh port of the peer accepts connections
+func (b *Barrier) reach(ctx context.Context, peers []Peer, action func(context.Context, Peer) error, state string) error {
+	pending := make([]*peerState, len(peers))
+	now := time.Now()
+	for i, p := range peers {
+		pending[i] = &peerState{peer: p, next: now}
+	}
+	probeSlots := make(chan struct{}, b.opts.ProbeConcurrency)
+	sshSlots := make(chan struct{}, b.opts.SSHConcurrency)
+
+	for len(pending) > 0 {
+		now = time.Now()
+		var due, waiting []*peerState
+		for _, s := range pending {
+			if !s.next.After(now) {
+				due = append(due, s)
+			} else {
+				waiting = append(waiting, s)
+			}
+		}
+
+		if len(due) > 0 {
+			failed := b.check(ctx, due, action, probeSlots, sshSlots)
+			for _, s := range failed {
+				s.attempts++
+				s.next = time.Now().Add(b.backoff(s.attempts))
+				waiting = append(waiting, s)
+			}
+			b.printf("%v of %v peers are %v\n", len(peers)-len(waiting), len(peers), state)
+		}
+		pending = waiting
+		if len(pending) == 0 {
+			break
+		}
+
+		next := pending[0].next
+		for _, s := range pending {
+			if s.next.Before(next) {
+				next = s.next
+			}
+		}
+		select {
+		case <-ctx.Done():
+			names := make([]string, len(pending))
+			for i, s := range pending {
+				names[i] = s.peer.Name
+			}
+			b.printf("SSH barrier timeout. Failed instances: %v\n", names)
+			return ErrTimeout
+		case <-time.After(time.Until(next)):
+		}
+	}
+	return nil
+}
+
+// check probes peers and runs action on them concurrently, and returns the
+// failed ones
+func (b *Barrier) check(ctx context.Context, states []*peerState, action func(context.Context, Peer) error,
+	probeSlots, sshSlots chan struct{}) []*peerState {
+	var mu sync.Mutex
+	var failed []*peerState
+	var wg sync.WaitGroup
+	for _, s := range states {
+		wg.Add(1)
+		go func(s *peerState) {
+			defer wg.Done()
+			probeSlots <- struct{}{}
+			err := b.Probe(ctx, s.peer)
+			<-probeSlots
+			if err == nil {
+				sshSlots <- struct{}{}
+				err = action(ctx, s.peer)
+				<-sshSlots
+			}
+			if err != nil {
+				mu.Lock()
+				failed = append(failed, s)
+				mu.Unlock()
+			}
+		}(s)
+	}
+	wg.Wait()
+	return failed
+}
+
+func (b *Barrier) backoff(attempts int) time.Duration {
+	d := b.opts.MaxBackoff
+	if attempts < 31 {
+		if exp := b.opts.InitialBackoff << uint(attempts-1); exp > 0 && exp < d {
+			d = exp
+		}
+	}
+	// jitter spreads retries of many instances polling the same peers
+	return d/2 + time.Duration(rand.Int63n(int64(d)+1))
+}
+
+func (b *Barrier) probe(ctx context.Context, peer Peer) error {
+	dialer := net.Dialer{Timeout: b.opts.ProbeTimeout}
+	conn, err := dialer.DialContext(ctx, "tcp", peer.Address)
+	if err != nil {
+		return err
+	}
+	return conn.Close()
+}
+
+func handshake(ctx context.Context, peer Peer) error {
+	return runSSH(ctx, peer, "exit 0")
+}
+
+// signal creates marker in the marker dir of peer
+func (b *Barrier) signal(ctx context.Context, peer Peer, marker string) error {
+	dir := shellQuote(b.opts.MarkerDir)
+	return runSSH(ctx, peer, fmt.Sprintf("mkdir -p %v && touch %v/%v", dir, dir, shellQuote(marker)))
+}
+
+func runSSH(ctx context.Context, peer Peer, command string) error {
+	return exec.CommandContext(ctx, "ssh", "-q", "-o", "BatchMode=yes", "-o", "StrictHostKeyChecking=no",
+		"-o", "ConnectTimeout=10", peer.Name, command).Run()
+}
+
+func shellQuote(s string) string {
+	return "'" + strings.Replace(s, "'", `'"'"'`, -1) + "'"
+}
+
+func (b *Barrier) printf(format string, a ...interface{}) {
+	fmt.Fprintf(b.log, format, a...)
+}
@@ -0,0 +1,119 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package sshbarrier
+
+import (
+	"context"
+	"errors"
+	"io/ioutil"
+	"net"
+	"sync"
+	"testing"
+	"time"
+
+	"github.com/stretchr/testify/assert"
+)
+
+var testOptions = Options{
+	ProbeTimeout:     100 * time.Millisecond,
+	ProbeConcurrency: 2,
+	SSHConcurrency:   1,
+	InitialBackoff:   10 * time.Millisecond,
+	MaxBackoff:       40 * time.Millisecond,
+}
+
+func TestPeersFromEnv(t *testing.T) {
+	env := map[string]string{
+		"FC_TASKROLE_NAME":        "worker",
+		"FC_TASK_INDEX":           "1",
+		"PAI_TASK_ROLE_INSTANCES": "master:0,worker:0,worker:1",
+		"PAI_HOST_IP_master_0":    "10.0.0.1",
+		"PAI_master_0_ssh_PORT":   "2222",
+		"PAI_HOST_IP_worker_0":    "10.0.0.2",
+		"PAI_worker_0_ssh_PORT":   "2223",
+	}
+	peers, err := PeersFromEnv(func(key string) string { return env[key] })
+	assert.Nil(t, err)
+	assert.Equal(t, []Peer{{"master-0", "10.0.0.1:2222"}, {"worker-0", "10.0.0.2:2223"}}, peers)
+}
+
+func TestBarrierWait(t *testing.T) {
+	peers := []Peer{{Name: "a"}, {Name: "b"}, {Name: "c"}}
+	var mu sync.Mutex
+	probes := map[string]int{}
+	handshakes := map[string]int{}
+
+	b := NewBarrier(testOptions, ioutil.Discard)
+	// a is ready at once, b after two probes, c accepts tcp at once but
+	// fails the first handshake
+	b.Probe = func(ctx context.Context, p Peer) error {
+		mu.Lock()
+		defer mu.Unlock()
+		probes[p.Name]++
+		if p.Name == "b" && probes[p.Name] < 3 {
+			return errors.New("connection refused")
+		}
+		return nil
+	}
+	b.Handshake = func(ctx context.Context, p Peer) error {
+		mu.Lock()
+		defer mu.Unlock()
+		handshakes[p.Name]++
+		if p.Name == "c" && handshakes[p.Name] < 2 {
+			return errors.New("permission denied")
+		}
+		return nil
+	}
+
+	assert.Nil(t, b.Wait(context.Background(), peers))
+	assert.Equal(t, map[string]int{"a": 1, "b": 3, "c": 2}, probes)
+	// no handshake before the port accepts connections
+	assert.Equal(t, map[string]int{"a": 1, "b": 1, "c": 2}, handshakes)
+}
+
+func TestBarrierTimeout(t *testing.T) {
+	b := NewBarrier(testOptions, ioutil.Discard)
+	b.Handshake = func(ctx context.Context, p Peer) error { return nil }
+
+	// nothing listens on the port of the closed listener
+	listener, err := net.Listen("tcp", "127.0.0.1:0")
+	assert.Nil(t, err)
+	closed := listener.Addr().String()
+	listener.Close()
+	listener, err = net.Listen("tcp", "127.0.0.1:0")
+	assert.Nil(t, err)
+	defer listener.Close()
+
+	ctx, cancel := context.WithTimeout(context.Background(), 300*time.Millisecond)
+	defer cancel()
+	err = b.Wait(ctx, []Peer{{"up", listener.Addr().String()}, {"down", closed}})
+	assert.Equal(t, ErrTimeout, err)
+}
+
+func TestBackoff(t *testing.T) {
+	b := NewBarrier(testOptions, ioutil.Discard)
+	for attempts, base := range map[int]time.Duration{1: 10, 2: 20, 3: 40, 4: 40, 100: 40} {
+		d := b.backoff(attempts)
+		assert.True(t, d >= base*time.Millisecond/2 && d <= base*time.Millisecond*3/2, "%v: %v", attempts, d)
+	}
+}
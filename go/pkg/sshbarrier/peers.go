@@ -0,0 +1,76 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package sshbarrier
+
+import (
+	"fmt"
+	"net"
+	"strings"
+)
+
+// Peer is another task instance of the job
+type Peer struct {
+	// Name is the ssh host alias <taskrole>-<index> in ssh_config
+	Name string
+	// Address is the host ip and ssh port of the instance
+	Address string
+}
+
+// PeersFromEnv returns all task instances in PAI_TASK_ROLE_INSTANCES except
+// the current one, in the same order
+func PeersFromEnv(getenv func(string) string) ([]Peer, error) {
+	instances, self, err := InstancesFromEnv(getenv)
+	if err != nil || self < 0 {
+		return instances, err
+	}
+	return append(instances[:self:self], instances[self+1:]...), nil
+}
+
+// InstancesFromEnv returns all task instances in PAI_TASK_ROLE_INSTANCES in
+// the same order, and the position of the current instance or -1 if it is
+// not listed
+func InstancesFromEnv(getenv func(string) string) ([]Peer, int, error) {
+	selfRole, selfIndex := getenv("FC_TASKROLE_NAME"), getenv("FC_TASK_INDEX")
+	var instances []Peer
+	self := -1
+	for _, instance := range strings.Split(getenv("PAI_TASK_ROLE_INSTANCES"), ",") {
+		if instance == "" {
+			continue
+		}
+		pair := strings.SplitN(instance, ":", 2)
+		if len(pair) != 2 {
+			return nil, -1, fmt.Errorf("invalid task role instance %v", instance)
+		}
+		role, index := pair[0], pair[1]
+		if role == selfRole && index == selfIndex {
+			self = len(instances)
+		}
+		instances = append(instances, Peer{
+			Name: role + "-" + index,
+			Address: net.JoinHostPort(
+				getenv(fmt.Sprintf("PAI_HOST_IP_%v_%v", role, index)),
+				getenv(fmt.Sprintf("PAI_%v_%v_ssh_PORT", role, index))),
+		})
+	}
+	return instances, self, nil
+}
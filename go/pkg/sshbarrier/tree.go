@@ -0,0 +1,115 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package sshbarrier
+
+import (
+	"context"
+	"errors"
+	"os"
+	"path/filepath"
+	"time"
+)
+
+const releaseMarker = "release"
+
+// TreeChildren returns the positions of the children of instance i in the
+// k-ary tree of n instances, the parent of i is (i-1)/k
+func TreeChildren(n, i, k int) []int {
+	var children []int
+	for c := k*i + 1; c <= k*i+k && c < n; c++ {
+		children = append(children, c)
+	}
+	return children
+}
+
+// WaitTree waits until all instances are ready, every instance only connects
+// to its parent and children in a k-ary tree built from the instance order.
+// Readiness fans in to the root, each instance signals its parent over ssh
+// once its whole subtree is ready. The root then releases its children,
+// which release their own children. Every instance of the job must run
+// WaitTree with the same instances
+func (b *Barrier) WaitTree(ctx context.Context, instances []Peer, self int) error {
+	if self < 0 || self >= len(instances) {
+		return errors.New("current instance is not in the ssh barrier tree")
+	}
+	if b.opts.TreeArity < 1 {
+		return errors.New("ssh barrier tree arity must be positive")
+	}
+	var children []Peer
+	var readyMarkers []string
+	for _, c := range TreeChildren(len(instances), self, b.opts.TreeArity) {
+		children = append(children, instances[c])
+		readyMarkers = append(readyMarkers, readyMarker(instances[c]))
+	}
+
+	b.printf("Waiting for %v children in ssh barrier tree\n", len(children))
+	if err := b.waitMarkers(ctx, readyMarkers); err != nil {
+		return err
+	}
+	if self != 0 {
+		parent := instances[(self-1)/b.opts.TreeArity]
+		signalReady := func(ctx context.Context, p Peer) error {
+			return b.Signal(ctx, p, readyMarker(instances[self]))
+		}
+		b.printf("Subtree is ready, signaling parent %v\n", parent.Name)
+		if err := b.reach(ctx, []Peer{parent}, signalReady, "signaled"); err != nil {
+			return err
+		}
+		if err := b.waitMarkers(ctx, []string{releaseMarker}); err != nil {
+			return err
+		}
+	}
+	release := func(ctx context.Context, p Peer) error {
+		return b.Signal(ctx, p, releaseMarker)
+	}
+	if err := b.reach(ctx, children, release, "released"); err != nil {
+		return err
+	}
+	b.printf("All instances are ready\n")
+	return nil
+}
+
+func readyMarker(p Peer) string {
+	return "ready-" + p.Name
+}
+
+// waitMarkers polls the marker dir until all markers exist
+func (b *Barrier) waitMarkers(ctx context.Context, markers []string) error {
+	for {
+		var missing []string
+		for _, m := range markers {
+			if _, err := os.Stat(filepath.Join(b.opts.MarkerDir, m)); err != nil {
+				missing = append(missing, m)
+			}
+		}
+		if len(missing) == 0 {
+			return nil
+		}
+		select {
+		case <-ctx.Done():
+			b.printf("SSH barrier timeout. Missing signals: %v\n", missing)
+			return ErrTimeout
+		case <-time.After(b.opts.PollInterval):
+		}
+	}
+}
@@ -0,0 +1,127 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package sshbarrier
+
+import (
+	"context"
+	"fmt"
+	"io/ioutil"
+	"os"
+	"path/filepath"
+	"sync"
+	"testing"
+	"time"
+
+	"github.com/stretchr/testify/assert"
+)
+
+func TestTreeChildren(t *testing.T) {
+	assert.Equal(t, []int{1, 2, 3}, TreeChildren(10, 0, 3))
+	assert.Equal(t, []int{7, 8, 9}, TreeChildren(10, 2, 3))
+	assert.Equal(t, []int{9}, TreeChildren(10, 1, 8))
+	assert.Nil(t, TreeChildren(10, 3, 3))
+}
+
+func TestInstancesFromEnv(t *testing.T) {
+	env := map[string]string{
+		"FC_TASKROLE_NAME":        "worker",
+		"FC_TASK_INDEX":           "0",
+		"PAI_TASK_ROLE_INSTANCES": "master:0,worker:0",
+	}
+	instances, self, err := InstancesFromEnv(func(key string) string { return env[key] })
+	assert.Nil(t, err)
+	assert.Equal(t, 1, self)
+	assert.Equal(t, []string{"master-0", "worker-0"}, []string{instances[0].Name, instances[1].Name})
+}
+
+func TestWaitTree(t *testing.T) {
+	root, err := ioutil.TempDir("", "sshbarrier")
+	assert.Nil(t, err)
+	defer os.RemoveAll(root)
+
+	const n, k = 20, 3
+	instances := make([]Peer, n)
+	for i := range instances {
+		instances[i] = Peer{Name: fmt.Sprintf("worker-%v", i)}
+	}
+	var mu sync.Mutex
+	signals := make([]int, n)
+	errs := make([]error, n)
+	var wg sync.WaitGroup
+	for i := 0; i < n; i++ {
+		opts := testOptions
+		opts.TreeArity = k
+		opts.MarkerDir = filepath.Join(root, instances[i].Name)
+		opts.PollInterval = 5 * time.Millisecond
+		b := NewBarrier(opts, ioutil.Discard)
+		b.Probe = func(ctx context.Context, p Peer) error { return nil }
+		self := i
+		b.Signal = func(ctx context.Context, p Peer, marker string) error {
+			mu.Lock()
+			signals[self]++
+			mu.Unlock()
+			dir := filepath.Join(root, p.Name)
+			if err := os.MkdirAll(dir, 0755); err != nil {
+				return err
+			}
+			return ioutil.WriteFile(filepath.Join(dir, marker), nil, 0644)
+		}
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			// instances start in reverse order
+			time.Sleep(time.Duration(n-self) * time.Millisecond)
+			ctx, cancel := context.WithTimeout(context.Background(), 5*time.Second)
+			defer cancel()
+			errs[self] = b.WaitTree(ctx, instances, self)
+		}()
+	}
+	wg.Wait()
+
+	for i := 0; i < n; i++ {
+		assert.Nil(t, errs[i])
+		// one signal to the parent and one release to each child
+		expected := len(TreeChildren(n, i, k))
+		if i != 0 {
+			expected++
+		}
+		assert.Equal(t, expected, signals[i], "instance %v", i)
+	}
+}
+
+func TestWaitTreeTimeout(t *testing.T) {
+	dir, err := ioutil.TempDir("", "sshbarrier")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	opts := testOptions
+	opts.TreeArity = 2
+	opts.MarkerDir = dir
+	opts.PollInterval = 5 * time.Millisecond
+	b := NewBarrier(opts, ioutil.Discard)
+	ctx, cancel := context.WithTimeout(context.Background(), 50*time.Millisecond)
+	defer cancel()
+	// the child never signals readiness
+	err = b.WaitTree(ctx, []Peer{{Name: "master-0"}, {Name: "worker-0"}}, 0)
+	assert.Equal(t, ErrTimeout, err)
+}
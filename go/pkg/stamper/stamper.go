@@ -0,0 +1,166 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package stamper
+
+import (
+	"bufio"
+	"io"
+	"sync"
+	"time"
+)
+
+const (
+	readBufferSize  = 64 * 1024
+	writeBufferSize = 64 * 1024
+	// Same layout as the output of `date`
+	timeLayout = "Mon Jan _2 15:04:05 MST 2006"
+)
+
+// Stamper prefixes every input line with a timestamp and a tag, and writes
+// the stamped lines to all outputs through buffered writers
+type Stamper struct {
+	tag           string
+	flushInterval time.Duration
+	outputs       []*bufio.Writer
+	now           func() time.Time
+
+	mu        sync.Mutex
+	dirty     bool
+	lastSec   int64
+	lastStamp []byte
+}
+
+// NewStamper create a stamper which writes to the given outputs
+func NewStamper(tag string, flushInterval time.Duration, outputs ...io.Writer) *Stamper {
+	s := &Stamper{
+		tag:           tag,
+		flushInterval: flushInterval,
+		now:           time.Now,
+		lastSec:       -1,
+	}
+	for _, o := range outputs {
+		s.outputs = append(s.outputs, bufio.NewWriterSize(o, writeBufferSize))
+	}
+	return s
+}
+
+// Run reads r until EOF, buffered output is flushed when input is idle
+// for flushInterval and before Run returns
+func (s *Stamper) Run(r io.Reader) error {
+	done := make(chan struct{})
+	defer close(done)
+	if s.flushInterval > 0 {
+		go s.flushOnIdle(done)
+	}
+
+	reader := bufio.NewReaderSize(r, readBufferSize)
+	lineStart := true
+	for {
+		chunk, err := reader.ReadSlice('\n')
+		if len(chunk) > 0 {
+			s.write(chunk, lineStart)
+			lineStart = chunk[len(chunk)-1] == '\n'
+		}
+		if err == bufio.ErrBufferFull {
+			continue
+		}
+		if err == io.EOF {
+			if !lineStart {
+				s.write([]byte{'\n'}, false)
+			}
+			return s.Flush()
+		}
+		if err != nil {
+			s.Flush()
+			return err
+		}
+	}
+}
+
+// Flush writes all buffered lines to the outputs
+func (s *Stamper) Flush() error {
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	return s.flushLocked()
+}
+
+func (s *Stamper) flushLocked() error {
+	var firstErr error
+	for _, w := range s.outputs {
+		if err := w.Flush(); err != nil && firstErr == nil {
+			firstErr = err
+		}
+	}
+	s.dirty = false
+	return firstErr
+}
+
+func (s *Stamper) flushOnIdle(done chan struct{}) {
+	ticker := time.NewTicker(s.flushInterval)
+	defer ticker.Stop()
+	for {
+		select {
+		case <-done:
+			return
+		case <-ticker.C:
+			s.mu.Lock()
+			if s.dirty {
+				s.flushLocked()
+			}
+			s.mu.Unlock()
+		}
+	}
+}
+
+// stamp returns the line prefix, the formatted time is reused within a second
+func (s *Stamper) stamp() []byte {
+	t := s.now()
+	if sec := t.Unix(); sec != s.lastSec {
+		s.lastSec = sec
+		s.lastStamp = append(s.lastStamp[:0], '[')
+		s.lastStamp = t.AppendFormat(s.lastStamp, timeLayout)
+		s.lastStamp = append(s.lastStamp, "] ["...)
+		s.lastStamp = append(s.lastStamp, s.tag...)
+		s.lastStamp = append(s.lastStamp, "] "...)
+	}
+	return s.lastStamp
+}
+
+func (s *Stamper) write(chunk []byte, lineStart bool) {
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	var prefix []byte
+	if lineStart {
+		prefix = s.stamp()
+	}
+	for _, w := range s.outputs {
+		// Keep lines in one write call where possible, several processes
+		// may append to the same log file
+		if w.Buffered() > 0 && len(prefix)+len(chunk) > w.Available() {
+			w.Flush()
+		}
+		w.Write(prefix)
+		w.Write(chunk)
+	}
+	s.dirty = true
+}
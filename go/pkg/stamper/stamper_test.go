@@ -0,0 +1,72 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package stamper
+
+import (
+	"bytes"
+	"io"
+	"strings"
+	"testing"
+	"time"
+
+	"github.com/stretchr/testify/assert"
+)
+
+func newTestStamper(outputs ...*bytes.Buffer) *Stamper {
+	var writers []io.Writer
+	for _, o := range outputs {
+		writers = append(writers, o)
+	}
+	s := NewStamper("openpai-runtime", 0, writers...)
+	s.now = func() time.Time {
+		return time.Date(2020, time.March, 5, 8, 4, 5, 0, time.UTC)
+	}
+	return s
+}
+
+func TestStampLines(t *testing.T) {
+	var logFile, stderr bytes.Buffer
+	s := newTestStamper(&logFile, &stderr)
+
+	err := s.Run(strings.NewReader("first line\nsecond line\nno newline"))
+	assert.Nil(t, err)
+
+	prefix := "[Thu Mar  5 08:04:05 UTC 2020] [openpai-runtime] "
+	expected := prefix + "first line\n" + prefix + "second line\n" + prefix + "no newline\n"
+	assert.Equal(t, expected, logFile.String())
+	assert.Equal(t, expected, stderr.String())
+}
+
+func TestStampLongLine(t *testing.T) {
+	var logFile bytes.Buffer
+	s := newTestStamper(&logFile)
+
+	longLine := strings.Repeat("x", readBufferSize*2+10)
+	err := s.Run(strings.NewReader(longLine + "\nnext\n"))
+	assert.Nil(t, err)
+
+	lines := strings.Split(strings.TrimSuffix(logFile.String(), "\n"), "\n")
+	assert.Equal(t, 2, len(lines))
+	assert.True(t, strings.HasSuffix(lines[0], "] "+longLine))
+	assert.True(t, strings.HasSuffix(lines[1], "] next"))
+}
@@ -0,0 +1,198 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"bytes"
+	"encoding/binary"
+	"io"
+	"os"
+	"strings"
+	"time"
+)
+
+const (
+	// IndexFileSuffix is appended to the segment name to get its index file
+	IndexFileSuffix = ".idx"
+	// every index entry is three little endian int64: unix time in nanoseconds,
+	// byte offset of a line start and number of lines before that offset
+	indexEntrySize = 24
+	// an entry is added once this many bytes or this much time passed since the last entry
+	indexByteInterval = 64 * 1024
+	indexTimeInterval = time.Second
+)
+
+// IndexEntry maps a point in the log to its byte offset and line number
+type IndexEntry struct {
+	Time   time.Time
+	Offset int64
+	Lines  int64
+}
+
+// segmentIndex maintains the sparse index of a segment while it is written
+type segmentIndex struct {
+	file      *os.File
+	lines     int64
+	lineStart bool
+	last      IndexEntry
+	hasLast   bool
+}
+
+// openSegmentIndex opens the index of segment for appending, the line count
+// is restored from the last entry when appending to an existing segment
+func openSegmentIndex(segment *os.File, path string, size int64) (*segmentIndex, error) {
+	f, err := os.OpenFile(path, os.O_RDWR|os.O_CREATE, 0644)
+	if err != nil {
+		return nil, err
+	}
+	idx := &segmentIndex{file: f, lineStart: true}
+	entries, err := readIndexEntries(f)
+	if err != nil {
+		f.Close()
+		return nil, err
+	}
+	// drop entries beyond the segment, e.g. index written but segment not
+	for len(entries) > 0 && entries[len(entries)-1].Offset > size {
+		entries = entries[:len(entries)-1]
+	}
+	if err = f.Truncate(int64(len(entries)) * indexEntrySize); err != nil {
+		f.Close()
+		return nil, err
+	}
+	if _, err = f.Seek(0, io.SeekEnd); err != nil {
+		f.Close()
+		return nil, err
+	}
+	from := int64(0)
+	if len(entries) > 0 {
+		idx.last = entries[len(entries)-1]
+		idx.hasLast = true
+		idx.lines = idx.last.Lines
+		from = idx.last.Offset
+	}
+	if size > from {
+		if err = idx.countExisting(segment, from, size); err != nil {
+			f.Close()
+			return nil, err
+		}
+	}
+	return idx, nil
+}
+
+func (idx *segmentIndex) countExisting(segment *os.File, from, size int64) error {
+	buf := make([]byte, readBufferSize)
+	for off := from; off < size; {
+		n, err := segment.ReadAt(buf, off)
+		if n > 0 {
+			idx.lines += int64(bytes.Count(buf[:n], []byte{'\n'}))
+			idx.lineStart = buf[n-1] == '\n'
+			off += int64(n)
+		}
+		if err == io.EOF {
+			return nil
+		}
+		if err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
+// update is called before p is written at offset off
+func (idx *segmentIndex) update(p []byte, off int64, now time.Time) error {
+	if len(p) == 0 {
+		return nil
+	}
+	if !idx.hasLast || off-idx.last.Offset >= indexByteInterval || now.Sub(idx.last.Time) >= indexTimeInterval {
+		entry := IndexEntry{Time: now, Offset: off, Lines: idx.lines}
+		ok := idx.lineStart
+		if !ok {
+			// index the first line start in p
+			if i := bytes.IndexByte(p, '\n'); i >= 0 && i+1 < len(p) {
+				entry.Offset += int64(i + 1)
+				entry.Lines++
+				ok = true
+			}
+		}
+		if ok {
+			if err := idx.append(entry); err != nil {
+				return err
+			}
+		}
+	}
+	idx.lines += int64(bytes.Count(p, []byte{'\n'}))
+	idx.lineStart = p[len(p)-1] == '\n'
+	return nil
+}
+
+func (idx *segmentIndex) append(entry IndexEntry) error {
+	var record [indexEntrySize]byte
+	binary.LittleEndian.PutUint64(record[0:], uint64(entry.Time.UnixNano()))
+	binary.LittleEndian.PutUint64(record[8:], uint64(entry.Offset))
+	binary.LittleEndian.PutUint64(record[16:], uint64(entry.Lines))
+	if _, err := idx.file.Write(record[:]); err != nil {
+		return err
+	}
+	idx.last = entry
+	idx.hasLast = true
+	return nil
+}
+
+func (idx *segmentIndex) close() error {
+	return idx.file.Close()
+}
+
+func readIndexEntries(r io.ReaderAt) ([]IndexEntry, error) {
+	var entries []IndexEntry
+	var record [indexEntrySize]byte
+	for off := int64(0); ; off += indexEntrySize {
+		if _, err := r.ReadAt(record[:], off); err != nil {
+			if err == io.EOF {
+				// a partially written record is ignored
+				return entries, nil
+			}
+			return nil, err
+		}
+		entries = append(entries, IndexEntry{
+			Time:   time.Unix(0, int64(binary.LittleEndian.Uint64(record[0:]))),
+			Offset: int64(binary.LittleEndian.Uint64(record[8:])),
+			Lines:  int64(binary.LittleEndian.Uint64(record[16:])),
+		})
+	}
+}
+
+// ReadIndex returns the index entries of a segment, the index of a
+// compressed segment refers to offsets in the decompressed content
+func ReadIndex(segment string) ([]IndexEntry, error) {
+	f, err := os.Open(IndexPath(segment))
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+	return readIndexEntries(f)
+}
+
+// IndexPath returns the index file of a segment
+func IndexPath(segment string) string {
+	return strings.TrimSuffix(segment, CompressedFileSuffix) + IndexFileSuffix
+}
@@ -0,0 +1,101 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"bytes"
+	"io/ioutil"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+
+	"github.com/stretchr/testify/assert"
+)
+
+func checkIndex(t *testing.T, segment string, content []byte) {
+	entries, err := ReadIndex(segment)
+	assert.Nil(t, err)
+	assert.True(t, len(entries) > 0)
+	for _, e := range entries {
+		assert.True(t, e.Offset == 0 || content[e.Offset-1] == '\n', e)
+		assert.Equal(t, int64(bytes.Count(content[:e.Offset], []byte{'\n'})), e.Lines)
+	}
+}
+
+func TestIndex(t *testing.T) {
+	dir, err := ioutil.TempDir("", "userlog")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	w, err := NewRotatingWriter(dir, Options{MaxSize: 1024 * 1024})
+	assert.Nil(t, err)
+	tick := time.Unix(1600000000, 0)
+	w.now = func() time.Time {
+		tick = tick.Add(time.Second)
+		return tick
+	}
+	w.Write([]byte("a partial"))
+	w.Write([]byte(" line\nsecond line\nthird"))
+	w.Write([]byte(" line\n"))
+	w.Write([]byte(strings.Repeat("x", 200*1024) + "\n"))
+	assert.Nil(t, w.Close())
+
+	current := filepath.Join(dir, CurrentFileName)
+	content, _ := ioutil.ReadFile(current)
+	checkIndex(t, current, content)
+
+	// line count is restored when appending to an existing segment
+	w, err = NewRotatingWriter(dir, Options{MaxSize: 1024 * 1024})
+	assert.Nil(t, err)
+	w.now = func() time.Time {
+		tick = tick.Add(time.Second)
+		return tick
+	}
+	w.Write([]byte("appended\n"))
+	assert.Nil(t, w.Close())
+	content, _ = ioutil.ReadFile(current)
+	checkIndex(t, current, content)
+	entries, _ := ReadIndex(current)
+	assert.Equal(t, int64(4), entries[len(entries)-1].Lines)
+}
+
+func TestIndexFollowsRotatedSegment(t *testing.T) {
+	dir, err := ioutil.TempDir("", "userlog")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	writeCompressedLog(t, dir, 100)
+
+	segments, err := Segments(dir)
+	assert.Nil(t, err)
+	for _, segment := range segments {
+		r, err := OpenSegment(segment)
+		assert.Nil(t, err)
+		content, err := ioutil.ReadAll(r)
+		r.Close()
+		assert.Nil(t, err)
+		checkIndex(t, segment, content)
+	}
+}
@@ -0,0 +1,309 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"bytes"
+	"fmt"
+	"io"
+	"sync"
+	"time"
+)
+
+const (
+	readBufferSize = 64 * 1024
+	// partial lines longer than this are written to the merged log without waiting for a newline
+	maxPendingSize = 64 * 1024
+)
+
+// Stream is one output stream of the user process
+type Stream struct {
+	// Input is the pipe the user process writes to
+	Input io.Reader
+	// Echo receives everything read from Input as is, e.g. container stdout
+	Echo io.Writer
+	// Log is the log of this stream only
+	Log io.Writer
+
+	pending      []byte
+	pendingSince time.Time
+
+	// rate limit state, output is only dropped and resumed at line starts
+	lineStart       bool
+	dropping        bool
+	suppressedBytes int64
+	suppressedLines int64
+	lastMarker      time.Time
+}
+
+// Multiplexer copies every stream to its echo writer and its own log, and
+// merges all streams into one log. Lines in the merged log are kept in the
+// order they were read and lines of different streams never interleave
+type Multiplexer struct {
+	all           io.Writer
+	flushInterval time.Duration
+	limiter       *rateLimiter
+
+	mu      sync.Mutex
+	streams []*Stream
+}
+
+// NewMultiplexer create a multiplexer which merges streams into all, partial
+// lines are written to all as lines once they are idle for flushInterval
+func NewMultiplexer(all io.Writer, flushInterval time.Duration) *Multiplexer {
+	return &Multiplexer{
+		all:           all,
+		flushInterval: flushInterval,
+	}
+}
+
+// LimitRate limits the output of all streams together, it must be called before Run
+func (m *Multiplexer) LimitRate(limit RateLimit) {
+	m.limiter = newRateLimiter(limit, time.Now)
+}
+
+// Run copies all streams concurrently until all of them reach EOF, and
+// returns the first error
+func (m *Multiplexer) Run(streams ...*Stream) error {
+	m.mu.Lock()
+	m.streams = streams
+	m.mu.Unlock()
+
+	done := make(chan struct{})
+	defer close(done)
+	if m.flushInterval > 0 {
+		go m.flushOnIdle(done)
+	}
+
+	errs := make(chan error, len(streams))
+	for _, s := range streams {
+		go func(s *Stream) {
+			errs <- m.copyStream(s)
+		}(s)
+	}
+	var firstErr error
+	for range streams {
+		if err := <-errs; err != nil && firstErr == nil {
+			firstErr = err
+		}
+	}
+	return firstErr
+}
+
+// Flush writes pending partial lines of all streams to the merged log
+func (m *Multiplexer) Flush() error {
+	m.mu.Lock()
+	defer m.mu.Unlock()
+	var firstErr error
+	for _, s := range m.streams {
+		if err := m.flushPendingLocked(s); err != nil && firstErr == nil {
+			firstErr = err
+		}
+	}
+	return firstErr
+}
+
+func (m *Multiplexer) copyStream(s *Stream) error {
+	s.lineStart = true
+	buf := make([]byte, readBufferSize)
+	for {
+		n, err := s.Input.Read(buf)
+		if n > 0 {
+			var werr error
+			if m.limiter == nil {
+				werr = m.emit(s, buf[:n])
+			} else {
+				werr = m.emitLimited(s, buf[:n])
+			}
+			if werr != nil {
+				return werr
+			}
+		}
+		if err == io.EOF {
+			if s.suppressedBytes > 0 {
+				if werr := m.emitMarker(s); werr != nil {
+					return werr
+				}
+			}
+			m.mu.Lock()
+			defer m.mu.Unlock()
+			return m.flushPendingLocked(s)
+		}
+		if err != nil {
+			return err
+		}
+	}
+}
+
+// emit writes chunk to the echo writer, the stream log and the merged log
+func (m *Multiplexer) emit(s *Stream, chunk []byte) error {
+	if s.Echo != nil {
+		// losing container output should not stop logging
+		s.Echo.Write(chunk)
+	}
+	if _, err := s.Log.Write(chunk); err != nil {
+		return err
+	}
+	return m.writeAll(s, chunk)
+}
+
+// emitLimited emits chunk if the rate limit allows it. Otherwise the current
+// line is finished and following lines are dropped until output is allowed
+// again, a marker with the amount of dropped output is written when output
+// resumes and every MarkerInterval while dropping
+func (m *Multiplexer) emitLimited(s *Stream, chunk []byte) error {
+	lines := bytes.Count(chunk, []byte{'\n'})
+	lineStart := s.lineStart
+	s.lineStart = chunk[len(chunk)-1] == '\n'
+
+	if m.limiter.limit.Block {
+		// not reading the pipe blocks the user process once the pipe is full
+		m.limiter.wait(len(chunk), lines)
+		return m.emit(s, chunk)
+	}
+
+	allowed := m.limiter.allow(len(chunk), lines)
+	if !s.dropping {
+		if allowed {
+			return m.emit(s, chunk)
+		}
+		if !lineStart {
+			i := bytes.IndexByte(chunk, '\n')
+			if i < 0 || i+1 == len(chunk) {
+				return m.emit(s, chunk)
+			}
+			if err := m.emit(s, chunk[:i+1]); err != nil {
+				return err
+			}
+			chunk = chunk[i+1:]
+		}
+		s.dropping = true
+		s.lastMarker = m.limiter.now()
+		m.suppress(s, chunk)
+		return nil
+	}
+
+	if allowed {
+		if !lineStart {
+			i := bytes.IndexByte(chunk, '\n')
+			if i < 0 {
+				m.suppress(s, chunk)
+				return nil
+			}
+			m.suppress(s, chunk[:i+1])
+			chunk = chunk[i+1:]
+		}
+		s.dropping = false
+		if err := m.emitMarker(s); err != nil {
+			return err
+		}
+		if len(chunk) == 0 {
+			return nil
+		}
+		return m.emit(s, chunk)
+	}
+
+	m.suppress(s, chunk)
+	if interval := m.limiter.limit.MarkerInterval; interval > 0 && m.limiter.now().Sub(s.lastMarker) >= interval {
+		return m.emitMarker(s)
+	}
+	return nil
+}
+
+func (m *Multiplexer) suppress(s *Stream, chunk []byte) {
+	s.suppressedBytes += int64(len(chunk))
+	s.suppressedLines += int64(bytes.Count(chunk, []byte{'\n'}))
+}
+
+func (m *Multiplexer) emitMarker(s *Stream) error {
+	marker := fmt.Sprintf("[openpai-runtime] %d bytes (%d lines) suppressed by log rate limit\n",
+		s.suppressedBytes, s.suppressedLines)
+	s.suppressedBytes, s.suppressedLines = 0, 0
+	s.lastMarker = m.limiter.now()
+	return m.emit(s, []byte(marker))
+}
+
+func (m *Multiplexer) writeAll(s *Stream, chunk []byte) error {
+	m.mu.Lock()
+	defer m.mu.Unlock()
+
+	i := bytes.LastIndexByte(chunk, '\n')
+	if i < 0 {
+		if len(s.pending) == 0 {
+			s.pendingSince = time.Now()
+		}
+		s.pending = append(s.pending, chunk...)
+		if len(s.pending) > maxPendingSize {
+			return m.flushPendingLocked(s)
+		}
+		return nil
+	}
+
+	if len(s.pending) > 0 {
+		s.pending = append(s.pending, chunk[:i+1]...)
+		if err := m.flushPendingLocked(s); err != nil {
+			return err
+		}
+	} else if _, err := m.all.Write(chunk[:i+1]); err != nil {
+		return err
+	}
+	if rest := chunk[i+1:]; len(rest) > 0 {
+		s.pending = append(s.pending, rest...)
+		s.pendingSince = time.Now()
+	}
+	return nil
+}
+
+// flushPendingLocked writes the pending output of s to the merged log, a
+// partial line is terminated so the next line of another stream starts on a
+// new line, its continuation is written as a line of its own
+func (m *Multiplexer) flushPendingLocked(s *Stream) error {
+	if len(s.pending) == 0 {
+		return nil
+	}
+	if s.pending[len(s.pending)-1] != '\n' {
+		s.pending = append(s.pending, '\n')
+	}
+	_, err := m.all.Write(s.pending)
+	s.pending = s.pending[:0]
+	return err
+}
+
+func (m *Multiplexer) flushOnIdle(done chan struct{}) {
+	ticker := time.NewTicker(m.flushInterval)
+	defer ticker.Stop()
+	for {
+		select {
+		case <-done:
+			return
+		case now := <-ticker.C:
+			m.mu.Lock()
+			for _, s := range m.streams {
+				if len(s.pending) > 0 && now.Sub(s.pendingSince) >= m.flushInterval {
+					m.flushPendingLocked(s)
+				}
+			}
+			m.mu.Unlock()
+		}
+	}
+}
@@ -0,0 +1,164 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"bytes"
+	"io"
+	"sort"
+	"strings"
+	"testing"
+	"time"
+
+	"github.com/stretchr/testify/assert"
+)
+
+// chunkReader returns one chunk per Read call
+type chunkReader struct {
+	chunks []string
+}
+
+func (r *chunkReader) Read(p []byte) (int, error) {
+	if len(r.chunks) == 0 {
+		return 0, io.EOF
+	}
+	n := copy(p, r.chunks[0])
+	r.chunks = r.chunks[1:]
+	return n, nil
+}
+
+func TestMultiplexer(t *testing.T) {
+	var all, stdoutLog, stderrLog, stdoutEcho bytes.Buffer
+	m := NewMultiplexer(&all, 0)
+
+	err := m.Run(
+		&Stream{Input: &chunkReader{[]string{"out1\nou", "t2\n", "tail"}}, Echo: &stdoutEcho, Log: &stdoutLog},
+		&Stream{Input: &chunkReader{[]string{"err1\n", "err2\n"}}, Log: &stderrLog},
+	)
+	assert.Nil(t, err)
+
+	assert.Equal(t, "out1\nout2\ntail", stdoutLog.String())
+	assert.Equal(t, "out1\nout2\ntail", stdoutEcho.String())
+	assert.Equal(t, "err1\nerr2\n", stderrLog.String())
+
+	// lines are never split in the merged log, the partial line at EOF is terminated
+	assert.True(t, strings.HasSuffix(all.String(), "\n"))
+	lines := strings.Split(strings.TrimSuffix(all.String(), "\n"), "\n")
+	sort.Strings(lines)
+	assert.Equal(t, []string{"err1", "err2", "out1", "out2", "tail"}, lines)
+}
+
+func TestMultiplexerFlushPartialLine(t *testing.T) {
+	var all bytes.Buffer
+	m := NewMultiplexer(&all, 0)
+	stdout := &Stream{Log: &bytes.Buffer{}}
+	stderr := &Stream{Log: &bytes.Buffer{}}
+	m.streams = []*Stream{stdout, stderr}
+
+	assert.Nil(t, m.emit(stdout, []byte("progress 50%")))
+	assert.Nil(t, m.Flush())
+	assert.Nil(t, m.emit(stderr, []byte("err1\n")))
+	assert.Nil(t, m.emit(stdout, []byte(", 100%\ndone\n")))
+	assert.Nil(t, m.Flush())
+
+	assert.Equal(t, "progress 50%\nerr1\n, 100%\ndone\n", all.String())
+	assert.Equal(t, "progress 50%, 100%\ndone\n", stdout.Log.(*bytes.Buffer).String())
+}
+
+// clockReader advances the clock before returning each chunk
+type clockReader struct {
+	chunks []string
+	steps  []time.Duration
+	now    *time.Time
+}
+
+func (r *clockReader) Read(p []byte) (int, error) {
+	if len(r.chunks) == 0 {
+		return 0, io.EOF
+	}
+	*r.now = r.now.Add(r.steps[0])
+	n := copy(p, r.chunks[0])
+	r.chunks, r.steps = r.chunks[1:], r.steps[1:]
+	return n, nil
+}
+
+func TestMultiplexerRateLimit(t *testing.T) {
+	var all, log bytes.Buffer
+	now := time.Unix(0, 0)
+	m := NewMultiplexer(&all, 0)
+	m.LimitRate(RateLimit{BytesPerSecond: 10, MarkerInterval: time.Hour})
+	m.limiter.now = func() time.Time { return now }
+	m.limiter.last = now
+
+	err := m.Run(&Stream{Input: &clockReader{
+		chunks: []string{"aaaaaaaaaa", "aa\nbbbb\n", "cccc\n", "dd", "dd\neeee\n", "ffff\n", "gggg\n"},
+		steps:  []time.Duration{0, 0, 0, 0, time.Second, 0, 0},
+		now:    &now,
+	}, Log: &log})
+	assert.Nil(t, err)
+
+	// a chunk is allowed while the bucket is not in debt, dropping and
+	// resuming happen at line starts
+	expected := "aaaaaaaaaaaa\nbbbb\n" +
+		"[openpai-runtime] 10 bytes (2 lines) suppressed by log rate limit\n" +
+		"eeee\n" +
+		"[openpai-runtime] 10 bytes (2 lines) suppressed by log rate limit\n"
+	assert.Equal(t, expected, log.String())
+	assert.Equal(t, expected, all.String())
+}
+
+func TestMultiplexerRateLimitMarkerInterval(t *testing.T) {
+	var log bytes.Buffer
+	now := time.Unix(0, 0)
+	m := NewMultiplexer(&bytes.Buffer{}, 0)
+	m.LimitRate(RateLimit{LinesPerSecond: 1, MarkerInterval: 10 * time.Second})
+	m.limiter.now = func() time.Time { return now }
+	m.limiter.last = now
+
+	err := m.Run(&Stream{Input: &clockReader{
+		chunks: []string{"a\nb\n", "c\n", "d\n", "e\n"},
+		steps:  []time.Duration{0, 0, 10 * time.Second / 1000, 10 * time.Second},
+		now:    &now,
+	}, Log: &log})
+	assert.Nil(t, err)
+	assert.Equal(t, "a\nb\n"+
+		"[openpai-runtime] 4 bytes (2 lines) suppressed by log rate limit\n"+
+		"e\n", log.String())
+}
+
+func TestMultiplexerBackpressure(t *testing.T) {
+	var log bytes.Buffer
+	m := NewMultiplexer(&bytes.Buffer{}, 0)
+	m.LimitRate(RateLimit{BytesPerSecond: 1000, Burst: time.Millisecond, Block: true})
+
+	start := time.Now()
+	chunks := make([]string, 10)
+	for i := range chunks {
+		chunks[i] = strings.Repeat("x", 9) + "\n"
+	}
+	err := m.Run(&Stream{Input: &chunkReader{chunks}, Log: &log})
+	assert.Nil(t, err)
+	// nothing is dropped, 100 bytes at 1000 bytes per second take about 0.1s
+	assert.Equal(t, strings.Join(chunks, ""), log.String())
+	assert.True(t, time.Since(start) >= 80*time.Millisecond)
+}
@@ -0,0 +1,139 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"sync"
+	"time"
+)
+
+// RateLimit limits the output of all streams of a Multiplexer together
+type RateLimit struct {
+	// BytesPerSecond and LinesPerSecond are the sustained rates, 0 for no limit
+	BytesPerSecond int64
+	LinesPerSecond int64
+	// Burst is how long output may exceed the rates after being idle,
+	// one second if not set
+	Burst time.Duration
+	// Block stops reading the user pipes while over the limit so the user
+	// process is blocked on write, instead of dropping output
+	Block bool
+	// MarkerInterval is how often a suppressed marker is written while
+	// output is being dropped
+	MarkerInterval time.Duration
+}
+
+// rateLimiter is a token bucket for bytes and one for lines. Output is
+// allowed while no bucket is in debt, and the whole chunk is then taken
+// even if this puts a bucket into debt, so chunks are never split
+type rateLimiter struct {
+	limit RateLimit
+	now   func() time.Time
+
+	mu    sync.Mutex
+	bytes float64
+	lines float64
+	last  time.Time
+}
+
+func newRateLimiter(limit RateLimit, now func() time.Time) *rateLimiter {
+	if limit.Burst <= 0 {
+		limit.Burst = time.Second
+	}
+	l := &rateLimiter{limit: limit, now: now, last: now()}
+	l.bytes, l.lines = l.capacity()
+	return l
+}
+
+func (l *rateLimiter) capacity() (float64, float64) {
+	burst := l.limit.Burst.Seconds()
+	return float64(l.limit.BytesPerSecond) * burst, float64(l.limit.LinesPerSecond) * burst
+}
+
+func (l *rateLimiter) refillLocked(now time.Time) {
+	elapsed := now.Sub(l.last).Seconds()
+	if elapsed <= 0 {
+		return
+	}
+	l.last = now
+	maxBytes, maxLines := l.capacity()
+	l.bytes += elapsed * float64(l.limit.BytesPerSecond)
+	if l.bytes > maxBytes {
+		l.bytes = maxBytes
+	}
+	l.lines += elapsed * float64(l.limit.LinesPerSecond)
+	if l.lines > maxLines {
+		l.lines = maxLines
+	}
+}
+
+// delayLocked returns how long until no bucket is in debt
+func (l *rateLimiter) delayLocked() time.Duration {
+	var delay float64
+	if l.limit.BytesPerSecond > 0 && l.bytes < 0 {
+		delay = -l.bytes / float64(l.limit.BytesPerSecond)
+	}
+	if l.limit.LinesPerSecond > 0 && l.lines < 0 {
+		if d := -l.lines / float64(l.limit.LinesPerSecond); d > delay {
+			delay = d
+		}
+	}
+	return time.Duration(delay * float64(time.Second))
+}
+
+func (l *rateLimiter) takeLocked(bytes, lines int) {
+	if l.limit.BytesPerSecond > 0 {
+		l.bytes -= float64(bytes)
+	}
+	if l.limit.LinesPerSecond > 0 {
+		l.lines -= float64(lines)
+	}
+}
+
+// allow takes the chunk from the buckets if no bucket is in debt
+func (l *rateLimiter) allow(bytes, lines int) bool {
+	l.mu.Lock()
+	defer l.mu.Unlock()
+	l.refillLocked(l.now())
+	if l.delayLocked() > 0 {
+		return false
+	}
+	l.takeLocked(bytes, lines)
+	return true
+}
+
+// wait blocks until no bucket is in debt and takes the chunk
+func (l *rateLimiter) wait(bytes, lines int) {
+	for {
+		l.mu.Lock()
+		l.refillLocked(l.now())
+		delay := l.delayLocked()
+		if delay <= 0 {
+			l.takeLocked(bytes, lines)
+			l.mu.Unlock()
+			return
+		}
+		l.mu.Unlock()
+		time.Sleep(delay)
+	}
+}
@@ -0,0 +1,355 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"bytes"
+	"compress/gzip"
+	"fmt"
+	"io"
+	"io/ioutil"
+	"os"
+	"path/filepath"
+	"sort"
+	"strings"
+	"sync"
+	"time"
+)
+
+const (
+	// CurrentFileName is the file which is being written
+	CurrentFileName = "current"
+	// RotatedFileSuffix marks a completely written rotated file, same as multilog
+	RotatedFileSuffix = ".s"
+	// CompressedFileSuffix is appended to the name of compressed rotated files
+	CompressedFileSuffix = ".gz"
+	tmpFileSuffix        = ".tmp"
+	// multilog tries to finish log files at a line boundary within this distance
+	lineBoundarySlack = 2000
+	// tai64 label of unix epoch, see https://cr.yp.to/libtai/tai64.html
+	tai64Epoch = uint64(1)<<62 + 10
+)
+
+// Options of RotatingWriter
+type Options struct {
+	// MaxSize is the size at which current is rotated
+	MaxSize int64
+	// MaxFiles is the number of rotated files to keep, 0 for no limit
+	MaxFiles int
+	// MaxRetainedSize is the total size of rotated files to keep, 0 for no limit
+	MaxRetainedSize int64
+	// Compress rotated files with gzip in background, the newest rotated file
+	// is left uncompressed so the tail of the log can be read cheaply
+	Compress bool
+}
+
+// RotatingWriter writes log to a directory with the same layout as
+// `multilog s<MaxSize> n<MaxFiles> <dir>`: the log is written to
+// dir/current, which is renamed to dir/@<tai64n>.s once it reaches MaxSize.
+// Old rotated files are removed to keep at most MaxFiles files and
+// MaxRetainedSize bytes. A sparse index is kept next to every segment, see
+// IndexEntry
+type RotatingWriter struct {
+	dir   string
+	opts  Options
+	file  *os.File
+	index *segmentIndex
+	size  int64
+	now   func() time.Time
+
+	// background compression and cleanup
+	work       chan struct{}
+	workerDone chan struct{}
+	errMu      sync.Mutex
+	workerErr  error
+}
+
+// NewRotatingWriter open dir/current for appending, dir is created if not exists
+func NewRotatingWriter(dir string, opts Options) (*RotatingWriter, error) {
+	if err := os.MkdirAll(dir, 0755); err != nil {
+		return nil, err
+	}
+	w := &RotatingWriter{
+		dir:  dir,
+		opts: opts,
+		now:  time.Now,
+	}
+	if err := w.open(); err != nil {
+		return nil, err
+	}
+	if opts.Compress {
+		w.startWorker()
+	}
+	return w, nil
+}
+
+func (w *RotatingWriter) open() error {
+	current := filepath.Join(w.dir, CurrentFileName)
+	f, err := os.OpenFile(current, os.O_RDWR|os.O_APPEND|os.O_CREATE, 0644)
+	if err != nil {
+		return err
+	}
+	stat, err := f.Stat()
+	if err != nil {
+		f.Close()
+		return err
+	}
+	index, err := openSegmentIndex(f, IndexPath(current), stat.Size())
+	if err != nil {
+		f.Close()
+		return err
+	}
+	w.file = f
+	w.index = index
+	w.size = stat.Size()
+	return nil
+}
+
+// Write writes p to current, current is rotated when it reaches MaxSize
+func (w *RotatingWriter) Write(p []byte) (int, error) {
+	written := 0
+	for len(p) > 0 {
+		room := w.opts.MaxSize - w.size
+		if room <= 0 {
+			if err := w.rotate(); err != nil {
+				return written, err
+			}
+			continue
+		}
+		n := len(p)
+		full := int64(n) >= room
+		if full {
+			n = int(room)
+			// prefer to end the file at a line boundary
+			if i := bytes.LastIndexByte(p[:n], '\n'); i >= 0 && n-i-1 < lineBoundarySlack {
+				n = i + 1
+			}
+		}
+		if err := w.index.update(p[:n], w.size, w.now()); err != nil {
+			return written, err
+		}
+		m, err := w.file.Write(p[:n])
+		written += m
+		w.size += int64(m)
+		if err != nil {
+			return written, err
+		}
+		if full {
+			if err := w.rotate(); err != nil {
+				return written, err
+			}
+		}
+		p = p[n:]
+	}
+	return written, nil
+}
+
+// Sync commits current to disk
+func (w *RotatingWriter) Sync() error {
+	return w.file.Sync()
+}
+
+// Close commits and closes current, and waits for the background compression to finish
+func (w *RotatingWriter) Close() error {
+	err := w.file.Sync()
+	if cerr := w.file.Close(); err == nil {
+		err = cerr
+	}
+	if ierr := w.index.close(); err == nil {
+		err = ierr
+	}
+	if w.work != nil {
+		close(w.work)
+		<-w.workerDone
+		w.work = nil
+		w.errMu.Lock()
+		if err == nil {
+			err = w.workerErr
+		}
+		w.errMu.Unlock()
+	}
+	return err
+}
+
+func (w *RotatingWriter) rotate() error {
+	if err := w.file.Sync(); err != nil {
+		return err
+	}
+	if err := w.file.Close(); err != nil {
+		return err
+	}
+	if err := w.index.close(); err != nil {
+		return err
+	}
+	current := filepath.Join(w.dir, CurrentFileName)
+	// multilog sets the executable bit on completely written files
+	if err := os.Chmod(current, 0744); err != nil {
+		return err
+	}
+	rotated := filepath.Join(w.dir, tai64nLabel(w.now())+RotatedFileSuffix)
+	if err := os.Rename(IndexPath(current), IndexPath(rotated)); err != nil {
+		return err
+	}
+	if err := os.Rename(current, rotated); err != nil {
+		return err
+	}
+	if w.work != nil {
+		w.notifyWorker()
+	} else if err := w.removeOldFiles(); err != nil {
+		return err
+	}
+	return w.open()
+}
+
+func (w *RotatingWriter) removeOldFiles() error {
+	rotated, err := RotatedFiles(w.dir)
+	if err != nil {
+		return err
+	}
+	sizes := make([]int64, len(rotated))
+	total := int64(0)
+	for i, f := range rotated {
+		if info, err := os.Stat(f); err == nil {
+			sizes[i] = info.Size()
+			total += sizes[i]
+		}
+	}
+	for i := range rotated {
+		overFiles := w.opts.MaxFiles > 0 && len(rotated)-i > w.opts.MaxFiles
+		overSize := w.opts.MaxRetainedSize > 0 && total > w.opts.MaxRetainedSize
+		if !overFiles && !overSize {
+			break
+		}
+		if err := os.Remove(rotated[i]); err != nil {
+			return err
+		}
+		os.Remove(IndexPath(rotated[i]))
+		total -= sizes[i]
+	}
+	return nil
+}
+
+func (w *RotatingWriter) startWorker() {
+	w.work = make(chan struct{}, 1)
+	w.workerDone = make(chan struct{})
+	// files left by an interrupted compression
+	if tmpFiles, err := filepath.Glob(filepath.Join(w.dir, "@*"+tmpFileSuffix)); err == nil {
+		for _, f := range tmpFiles {
+			os.Remove(f)
+		}
+	}
+	go func() {
+		defer close(w.workerDone)
+		for range w.work {
+			if err := w.compressAndClean(); err != nil {
+				w.errMu.Lock()
+				w.workerErr = err
+				w.errMu.Unlock()
+			}
+		}
+	}()
+	w.notifyWorker()
+}
+
+func (w *RotatingWriter) notifyWorker() {
+	select {
+	case w.work <- struct{}{}:
+	default:
+		// worker will rescan the directory anyway
+	}
+}
+
+func (w *RotatingWriter) compressAndClean() error {
+	rotated, err := RotatedFiles(w.dir)
+	if err != nil {
+		return err
+	}
+	for i, f := range rotated {
+		if i == len(rotated)-1 {
+			break
+		}
+		if strings.HasSuffix(f, RotatedFileSuffix) {
+			if err := compressFile(f); err != nil {
+				return err
+			}
+		}
+	}
+	return w.removeOldFiles()
+}
+
+func compressFile(path string) error {
+	in, err := os.Open(path)
+	if err != nil {
+		return err
+	}
+	defer in.Close()
+
+	target := path + CompressedFileSuffix
+	tmp := target + tmpFileSuffix
+	out, err := os.OpenFile(tmp, os.O_WRONLY|os.O_CREATE|os.O_TRUNC, 0744)
+	if err != nil {
+		return err
+	}
+	defer out.Close()
+
+	gz, err := gzip.NewWriterLevel(out, gzip.BestSpeed)
+	if err != nil {
+		return err
+	}
+	if _, err = io.Copy(gz, in); err != nil {
+		return err
+	}
+	if err = gz.Close(); err != nil {
+		return err
+	}
+	if err = out.Sync(); err != nil {
+		return err
+	}
+	if err = os.Rename(tmp, target); err != nil {
+		return err
+	}
+	return os.Remove(path)
+}
+
+// RotatedFiles returns the rotated files in dir, compressed or not, oldest first
+func RotatedFiles(dir string) ([]string, error) {
+	infos, err := ioutil.ReadDir(dir)
+	if err != nil {
+		return nil, err
+	}
+	var files []string
+	for _, info := range infos {
+		name := info.Name()
+		isSegment := strings.HasSuffix(name, RotatedFileSuffix) || strings.HasSuffix(name, RotatedFileSuffix+CompressedFileSuffix)
+		if info.Mode().IsRegular() && strings.HasPrefix(name, "@") && isSegment {
+			files = append(files, filepath.Join(dir, name))
+		}
+	}
+	// tai64n labels sort in time order
+	sort.Strings(files)
+	return files, nil
+}
+
+func tai64nLabel(t time.Time) string {
+	return fmt.Sprintf("@%016x%08x", tai64Epoch+uint64(t.Unix()), t.Nanosecond())
+}
@@ -0,0 +1,95 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"io/ioutil"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+
+	"github.com/stretchr/testify/assert"
+)
+
+func TestRotateAtLineBoundary(t *testing.T) {
+	dir, err := ioutil.TempDir("", "userlog")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	w, err := NewRotatingWriter(dir, Options{MaxSize: 10, MaxFiles: 2})
+	assert.Nil(t, err)
+	tick := time.Unix(1600000000, 0)
+	w.now = func() time.Time {
+		tick = tick.Add(time.Second)
+		return tick
+	}
+
+	_, err = w.Write([]byte("line1\nline2\n"))
+	assert.Nil(t, err)
+
+	rotated, err := RotatedFiles(dir)
+	assert.Nil(t, err)
+	assert.Equal(t, 1, len(rotated))
+	assert.True(t, strings.HasSuffix(rotated[0], RotatedFileSuffix))
+	content, _ := ioutil.ReadFile(rotated[0])
+	assert.Equal(t, "line1\n", string(content))
+	content, _ = ioutil.ReadFile(filepath.Join(dir, CurrentFileName))
+	assert.Equal(t, "line2\n", string(content))
+
+	// only MaxFiles rotated files are kept
+	for i := 0; i < 5; i++ {
+		_, err = w.Write([]byte("0123456789"))
+		assert.Nil(t, err)
+	}
+	assert.Nil(t, w.Close())
+	rotated, err = RotatedFiles(dir)
+	assert.Nil(t, err)
+	assert.Equal(t, 2, len(rotated))
+	content, _ = ioutil.ReadFile(rotated[1])
+	assert.Equal(t, 10, len(content))
+}
+
+func TestReopenAppendsToCurrent(t *testing.T) {
+	dir, err := ioutil.TempDir("", "userlog")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	w, err := NewRotatingWriter(dir, Options{MaxSize: 100, MaxFiles: 2})
+	assert.Nil(t, err)
+	w.Write([]byte("a\n"))
+	w.Close()
+
+	w, err = NewRotatingWriter(dir, Options{MaxSize: 100, MaxFiles: 2})
+	assert.Nil(t, err)
+	w.Write([]byte("b\n"))
+	w.Close()
+
+	content, _ := ioutil.ReadFile(filepath.Join(dir, CurrentFileName))
+	assert.Equal(t, "a\nb\n", string(content))
+}
+
+func TestTai64nLabel(t *testing.T) {
+	assert.Equal(t, "@400000005f5e100a00000007", tai64nLabel(time.Unix(1600000000, 7)))
+}
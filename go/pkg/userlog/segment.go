@@ -0,0 +1,156 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"compress/gzip"
+	"io"
+	"io/ioutil"
+	"os"
+	"path/filepath"
+	"strings"
+)
+
+// Segments returns all segments of the log in dir, oldest first, the last one is current
+func Segments(dir string) ([]string, error) {
+	segments, err := RotatedFiles(dir)
+	if err != nil {
+		return nil, err
+	}
+	current := filepath.Join(dir, CurrentFileName)
+	if _, err := os.Stat(current); err == nil {
+		segments = append(segments, current)
+	}
+	return segments, nil
+}
+
+type gzipReadCloser struct {
+	*gzip.Reader
+	file *os.File
+}
+
+func (r *gzipReadCloser) Close() error {
+	r.Reader.Close()
+	return r.file.Close()
+}
+
+// OpenSegment opens a log segment, compressed segments are decompressed transparently
+func OpenSegment(path string) (io.ReadCloser, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	if !strings.HasSuffix(path, CompressedFileSuffix) {
+		return f, nil
+	}
+	gz, err := gzip.NewReader(f)
+	if err != nil {
+		f.Close()
+		return nil, err
+	}
+	return &gzipReadCloser{gz, f}, nil
+}
+
+// ReadTail returns the last size bytes of the log in dir, read across current and rotated segments
+func ReadTail(dir string, size int64) ([]byte, error) {
+	segments, err := Segments(dir)
+	if err != nil {
+		return nil, err
+	}
+	var parts [][]byte
+	remain := size
+	for i := len(segments) - 1; i >= 0 && remain > 0; i-- {
+		content, err := readSegmentTail(segments[i], remain)
+		if err != nil {
+			return nil, err
+		}
+		parts = append(parts, content)
+		remain -= int64(len(content))
+	}
+	tail := make([]byte, 0, size-remain)
+	for i := len(parts) - 1; i >= 0; i-- {
+		tail = append(tail, parts[i]...)
+	}
+	return tail, nil
+}
+
+func readSegmentTail(path string, size int64) ([]byte, error) {
+	if !strings.HasSuffix(path, CompressedFileSuffix) {
+		f, err := os.Open(path)
+		if err != nil {
+			return nil, err
+		}
+		defer f.Close()
+		stat, err := f.Stat()
+		if err != nil {
+			return nil, err
+		}
+		off := stat.Size() - size
+		if off < 0 {
+			off = 0
+		}
+		content := make([]byte, stat.Size()-off)
+		n, err := f.ReadAt(content, off)
+		if err == io.EOF {
+			err = nil
+		}
+		return content[:n], err
+	}
+
+	r, err := OpenSegment(path)
+	if err != nil {
+		return nil, err
+	}
+	defer r.Close()
+	if size > readBufferSize {
+		// large tails are rare, read the whole segment
+		content, err := ioutil.ReadAll(r)
+		if err != nil {
+			return nil, err
+		}
+		if int64(len(content)) > size {
+			content = content[int64(len(content))-size:]
+		}
+		return content, nil
+	}
+	// keep only the last size bytes while decompressing
+	buf := make([]byte, 0, 2*size+readBufferSize)
+	chunk := make([]byte, readBufferSize)
+	for {
+		n, err := r.Read(chunk)
+		buf = append(buf, chunk[:n]...)
+		if int64(len(buf)) > 2*size {
+			buf = append(buf[:0], buf[int64(len(buf))-size:]...)
+		}
+		if err == io.EOF {
+			break
+		}
+		if err != nil {
+			return nil, err
+		}
+	}
+	if int64(len(buf)) > size {
+		buf = buf[int64(len(buf))-size:]
+	}
+	return buf, nil
+}
@@ -0,0 +1,109 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"fmt"
+	"io/ioutil"
+	"os"
+	"strings"
+	"testing"
+	"time"
+
+	"github.com/stretchr/testify/assert"
+)
+
+func writeCompressedLog(t *testing.T, dir string, lines int) string {
+	w, err := NewRotatingWriter(dir, Options{MaxSize: 100, MaxRetainedSize: 100000, Compress: true})
+	assert.Nil(t, err)
+	tick := time.Unix(1600000000, 0)
+	w.now = func() time.Time {
+		tick = tick.Add(time.Second)
+		return tick
+	}
+	var expected strings.Builder
+	for i := 0; i < lines; i++ {
+		line := fmt.Sprintf("line %d\n", i)
+		expected.WriteString(line)
+		_, err = w.Write([]byte(line))
+		assert.Nil(t, err)
+	}
+	assert.Nil(t, w.Close())
+	return expected.String()
+}
+
+func TestCompressRotatedFiles(t *testing.T) {
+	dir, err := ioutil.TempDir("", "userlog")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	writeCompressedLog(t, dir, 100)
+
+	rotated, err := RotatedFiles(dir)
+	assert.Nil(t, err)
+	assert.True(t, len(rotated) > 2)
+	for _, f := range rotated[:len(rotated)-1] {
+		assert.True(t, strings.HasSuffix(f, RotatedFileSuffix+CompressedFileSuffix), f)
+	}
+	// the newest rotated file is left uncompressed
+	assert.True(t, strings.HasSuffix(rotated[len(rotated)-1], RotatedFileSuffix))
+}
+
+func TestRetainedSize(t *testing.T) {
+	dir, err := ioutil.TempDir("", "userlog")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	w, err := NewRotatingWriter(dir, Options{MaxSize: 10, MaxRetainedSize: 35})
+	assert.Nil(t, err)
+	tick := time.Unix(1600000000, 0)
+	w.now = func() time.Time {
+		tick = tick.Add(time.Second)
+		return tick
+	}
+	for i := 0; i < 10; i++ {
+		w.Write([]byte("012345678\n"))
+	}
+	assert.Nil(t, w.Close())
+
+	rotated, err := RotatedFiles(dir)
+	assert.Nil(t, err)
+	assert.Equal(t, 3, len(rotated))
+}
+
+func TestReadTailAcrossSegments(t *testing.T) {
+	dir, err := ioutil.TempDir("", "userlog")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	expected := writeCompressedLog(t, dir, 100)
+
+	for _, size := range []int64{5, 50, 300, int64(len(expected)), 100000} {
+		tail, err := ReadTail(dir, size)
+		assert.Nil(t, err)
+		if size > int64(len(expected)) {
+			size = int64(len(expected))
+		}
+		assert.Equal(t, expected[int64(len(expected))-size:], string(tail))
+	}
+}
@@ -0,0 +1,95 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"os"
+	"path/filepath"
+	"syscall"
+)
+
+// MapTail returns the last size bytes of the log in dir. When the current
+// segment holds the whole window it is mapped into memory instead of being
+// copied, otherwise the window is read across segments with ReadTail.
+// release must be called once the content is no longer used.
+func MapTail(dir string, size int64) (content []byte, release func() error, err error) {
+	noop := func() error { return nil }
+	segments, err := Segments(dir)
+	if err != nil {
+		return nil, noop, err
+	}
+	if len(segments) == 0 {
+		return nil, noop, nil
+	}
+	current := segments[len(segments)-1]
+	stat, err := os.Stat(current)
+	if err != nil {
+		return nil, noop, err
+	}
+	if stat.Size() == 0 || (stat.Size() < size && len(segments) > 1) {
+		content, err = ReadTail(dir, size)
+		return content, noop, err
+	}
+
+	f, err := os.Open(current)
+	if err != nil {
+		return nil, noop, err
+	}
+	defer f.Close()
+
+	off := stat.Size() - size
+	if off < 0 {
+		off = 0
+	}
+	// mmap offset must be page aligned
+	pageSize := int64(os.Getpagesize())
+	alignedOff := off / pageSize * pageSize
+	mapped, err := syscall.Mmap(int(f.Fd()), alignedOff, int(stat.Size()-alignedOff), syscall.PROT_READ, syscall.MAP_SHARED)
+	if err != nil {
+		content, err = ReadTail(dir, size)
+		return content, noop, err
+	}
+	return mapped[off-alignedOff:], func() error { return syscall.Munmap(mapped) }, nil
+}
+
+// SyncDir commits the current segment and its index in dir to disk, rotated
+// segments are synced when they are rotated
+func SyncDir(dir string) error {
+	current := filepath.Join(dir, CurrentFileName)
+	for _, path := range []string{current, IndexPath(current)} {
+		if err := SyncFile(path); err != nil && !os.IsNotExist(err) {
+			return err
+		}
+	}
+	return SyncFile(dir)
+}
+
+// SyncFile commits the file or directory at path to disk
+func SyncFile(path string) error {
+	f, err := os.Open(path)
+	if err != nil {
+		return err
+	}
+	defer f.Close()
+	return f.Sync()
+}
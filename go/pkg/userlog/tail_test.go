@@ -0,0 +1,72 @@
+// MIT License
+//
+// Copyright (c) Microsoft Corporation. All rights reserved.
+//
+// Permission is hereby granted, free of charge, to any person obtaining a copy
+// of this software and associated documentation files (the "Software"), to deal
+// in the Software without restriction, including without limitation the rights
+// to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+// copies of the Software, and to permit persons to whom the Software is
+// furnished to do so, subject to the following conditions:
+//
+// The above copyright notice and this permission notice shall be included in all
+// copies or substantial portions of the Software.
+//
+// THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+// IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+// FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+// AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+// LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+// OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+// SOFTWARE
+
+package userlog
+
+import (
+	"io/ioutil"
+	"os"
+	"strings"
+	"testing"
+
+	"github.com/stretchr/testify/assert"
+)
+
+func TestMapTail(t *testing.T) {
+	dir, err := ioutil.TempDir("", "userlog")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	expected := writeCompressedLog(t, dir, 100)
+	assert.Nil(t, SyncDir(dir))
+
+	// window inside current is mapped, larger windows are read across segments
+	for _, size := range []int64{10, 30, 500, 100000} {
+		content, release, err := MapTail(dir, size)
+		assert.Nil(t, err)
+		if size > int64(len(expected)) {
+			size = int64(len(expected))
+		}
+		assert.Equal(t, expected[int64(len(expected))-size:], string(content))
+		assert.Nil(t, release())
+	}
+}
+
+func TestMapTailEmptyDir(t *testing.T) {
+	dir, err := ioutil.TempDir("", "userlog")
+	assert.Nil(t, err)
+	defer os.RemoveAll(dir)
+
+	content, release, err := MapTail(dir, 100)
+	assert.Nil(t, err)
+	assert.Equal(t, 0, len(content))
+	assert.Nil(t, release())
+
+	w, err := NewRotatingWriter(dir, Options{MaxSize: 1024})
+	assert.Nil(t, err)
+	w.Write([]byte(strings.Repeat("a", 100)))
+	w.Close()
+	content, release, err = MapTail(dir, 10)
+	assert.Nil(t, err)
+	assert.Equal(t, strings.Repeat("a", 10), string(content))
+	assert.Nil(t, release())
+}
@@ -0,0 +1,98 @@
+"""Expression engine for ``<% $root.path %>`` references.
+
+All runtime templating (plugin parameters, secrets in user commands and
+plugin script templates) goes through this module. Templates and reference
+paths are compiled once per process and reused.
+"""
+import functools
+import html
+import re
+
+_EXPRESSION_PATTERN = re.compile(r"<%\s*\$([\s\S]*?)\s*%>")
+_SEGMENT_PATTERN = re.compile(r"\[\s*(\d+)\s*\]|([^.\[\]\s]+)")
+
+
+@functools.lru_cache(maxsize=None)
+def parse_path(ref: str) -> tuple:
+    """Split a reference such as ``secrets.data[0].name`` into its keys.
+
+    Indexes written as ``[N]`` become ints, dotted segments stay strings.
+    """
+    return tuple(
+        int(index) if index else name
+        for index, name in _SEGMENT_PATTERN.findall(ref))
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_template(template: str) -> tuple:
+    """Compile a template into ``(literal, path)`` pairs.
+
+    The path of the last pair is None if the template ends with a literal.
+    """
+    parts = []
+    pos = 0
+    for matched in _EXPRESSION_PATTERN.finditer(template):
+        parts.append(
+            (template[pos:matched.start()], parse_path(matched.group(1))))
+        pos = matched.end()
+    if pos < len(template) or not parts:
+        parts.append((template[pos:], None))
+    return tuple(parts)
+
+
+def resolve_path(data, path):
+    cur_element = data
+    for key in path:
+        if isinstance(cur_element, (list, tuple)):
+            cur_element = cur_element[int(key)]
+        elif key in cur_element:
+            cur_element = cur_element[key]
+        else:
+            cur_element = cur_element[str(key)]
+    return cur_element
+
+
+class LazyContext:  #pylint: disable=too-few-public-methods
+    """Root objects for expressions, evaluated on first reference.
+
+    Each root is either a value or a callable returning the value.
+    """
+    def __init__(self, **roots):
+        self._roots = roots
+        self._values = {}
+
+    def __contains__(self, name):
+        return name in self._roots
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            root = self._roots[name]
+            self._values[name] = root() if callable(root) else root
+        return self._values[name]
+
+
+def render(template, context, missing=None, escape=False) -> str:
+    """Render all expressions in template against context.
+
+    Args:
+        template: string which may contain ``<% $root.path %>`` expressions.
+        context: mapping (or LazyContext) of root name to object.
+        missing: value used for unresolvable references, raise if None.
+        escape: html escape rendered values.
+    """
+    if "<%" not in template:
+        return template
+    rendered = []
+    for literal, path in compile_template(template):
+        rendered.append(literal)
+        if path is None:
+            continue
+        try:
+            value = resolve_path(context, path)
+        except (KeyError, IndexError, TypeError, ValueError):
+            if missing is None:
+                raise
+            value = missing
+        value = "" if value is None else str(value)
+        rendered.append(html.escape(value) if escape else value)
+    return "".join(rendered)
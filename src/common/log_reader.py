@@ -0,0 +1,142 @@
+"""Reader for logs written by userlogger.
+
+A log directory holds ``current`` and rotated ``@<tai64n>.s`` segments, older
+rotated segments may be gzip compressed (``@<tai64n>.s.gz``). Every segment has
+a sparse index ``<segment>.idx`` (without ``.gz``) of fixed size records, see
+go/pkg/userlog/index.go. The index lets the reader seek to a tail window or a
+time range instead of scanning the whole log.
+"""
+import collections
+import gzip
+import os
+import struct
+
+CURRENT_FILE_NAME = "current"
+ROTATED_FILE_SUFFIX = ".s"
+COMPRESSED_FILE_SUFFIX = ".gz"
+INDEX_FILE_SUFFIX = ".idx"
+
+# unix time in nanoseconds, byte offset of a line start, lines before offset
+_INDEX_ENTRY = struct.Struct("<qqq")
+
+IndexEntry = collections.namedtuple("IndexEntry", ["time", "offset", "lines"])
+
+
+def list_segments(log_dir) -> list:
+    """Return segment paths in log_dir, oldest first and current last."""
+    rotated = sorted(
+        name for name in os.listdir(log_dir) if name.startswith("@") and (
+            name.endswith(ROTATED_FILE_SUFFIX)
+            or name.endswith(ROTATED_FILE_SUFFIX + COMPRESSED_FILE_SUFFIX)))
+    segments = [os.path.join(log_dir, name) for name in rotated]
+    current = os.path.join(log_dir, CURRENT_FILE_NAME)
+    if os.path.isfile(current):
+        segments.append(current)
+    return segments
+
+
+def index_path(segment) -> str:
+    if segment.endswith(COMPRESSED_FILE_SUFFIX):
+        segment = segment[:-len(COMPRESSED_FILE_SUFFIX)]
+    return segment + INDEX_FILE_SUFFIX
+
+
+def read_index(segment) -> list:
+    """Return index entries of segment, time is in seconds since epoch.
+
+    Segments without index (e.g. written by multilog) have no entries.
+    """
+    try:
+        with open(index_path(segment), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    # a partially written record is ignored
+    end = len(data) - len(data) % _INDEX_ENTRY.size
+    return [
+        IndexEntry(ts / 1e9, offset, lines)
+        for ts, offset, lines in _INDEX_ENTRY.iter_unpack(data[:end])
+    ]
+
+
+def _open_segment(segment):
+    if segment.endswith(COMPRESSED_FILE_SUFFIX):
+        return gzip.open(segment, "rb")
+    return open(segment, "rb")
+
+
+def _read_segment(segment, start=0, end=None) -> bytes:
+    with _open_segment(segment) as f:
+        f.seek(start)
+        if end is None:
+            return f.read()
+        return f.read(max(end - start, 0))
+
+
+def _last_lines(data, lines) -> bytes:
+    if lines <= 0:
+        return b""
+    pos = len(data)
+    if data.endswith(b"\n"):
+        pos -= 1
+    for _ in range(lines):
+        pos = data.rfind(b"\n", 0, pos)
+        if pos < 0:
+            return data
+    return data[pos + 1:]
+
+
+class LogReader:
+    def __init__(self, log_dir):
+        self._log_dir = log_dir
+
+    def tail(self, lines) -> bytes:
+        """Return the last lines of the log, across rotated segments."""
+        chunks = []
+        remain = lines
+        for segment in reversed(list_segments(self._log_dir)):
+            entries = read_index(segment)
+            start = 0
+            if entries:
+                # lines after the last entry are counted from the segment
+                tail_data = _read_segment(segment, entries[-1].offset)
+                total = entries[-1].lines + tail_data.count(b"\n")
+                for entry in reversed(entries):
+                    if total - entry.lines >= remain:
+                        start = entry.offset
+                        break
+            data = _read_segment(segment, start)
+            chunks.append(data)
+            remain -= data.count(b"\n")
+            if remain <= 0:
+                break
+        return _last_lines(b"".join(reversed(chunks)), lines)
+
+    def read_time_range(self, start_time, end_time) -> bytes:
+        """Return lines written between start_time and end_time.
+
+        Times are seconds since epoch. The range is widened to the index
+        granularity, which is one second or 64KB of output.
+        """
+        segments = list_segments(self._log_dir)
+        indexes = [read_index(segment) for segment in segments]
+        chunks = []
+        for i, segment in enumerate(segments):
+            entries = indexes[i]
+            next_entries = indexes[i + 1] if i + 1 < len(segments) else []
+            if next_entries and next_entries[0].time <= start_time:
+                # the whole segment is before start_time
+                continue
+            if entries and entries[0].time > end_time:
+                break
+            start, end = 0, None
+            for entry in entries:
+                if entry.time <= start_time:
+                    start = entry.offset
+                elif entry.time > end_time:
+                    end = entry.offset
+                    break
+            chunks.append(_read_segment(segment, start, end))
+            if end is not None:
+                break
+        return b"".join(chunks)
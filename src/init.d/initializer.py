@@ -18,6 +18,7 @@
 
 import argparse
 import copy
+import json
 import logging
 import os
 import re
@@ -27,6 +28,7 @@ import sys
 import yaml
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.expression import LazyContext, render  #pylint: disable=wrong-import-position
 from common.utils import init_logger  #pylint: disable=wrong-import-position
 
 LOGGER = logging.getLogger(__name__)
@@ -34,6 +36,14 @@ LOGGER = logging.getLogger(__name__)
 EXIT_PLUGIN_INVALIDATE = 100
 RUNTIME_PLUGIN_PLACE_HOLDER = "com.microsoft.pai.runtimeplugin"
 
+# package cache variants, see package_cache/package_cache_info, and the tags
+# of images built on them
+PACKAGE_CACHE_OS_ENV = "PAI_PACKAGE_CACHE_OS"
+PACKAGE_CACHE_OS_PATTERNS = {
+    "ubuntu16.04": re.compile(r"16\.04|xenial"),
+    "ubuntu18.04": re.compile(r"18\.04|bionic"),
+}
+
 
 def run_script(script_path, plugin_config, plugin_scripts):
     failure_policy = plugin_config.get("failurePolicy", "fail")
@@ -115,8 +125,10 @@ def collect_plugin_configs(jobconfig, taskrole):
                 }
                 if 'failurePolicy' in prerequisite_config:
                     plugin_config['failurePolicy'] = prerequisite_config.pop('failurePolicy')
+                if 'dependsOn' in prerequisite_config:
+                    plugin_config['dependsOn'] = prerequisite_config.pop('dependsOn')
                 prerequisite_config.pop('type', None)
-                # the remaining keys (other than plugin, failurePolicy, and type) will be treated as parameters
+                # the remaining keys (other than plugin, failurePolicy, dependsOn and type) will be treated as parameters
                 plugin_config['parameters'] = copy.deepcopy(prerequisite_config)
                 plugin_configs.append(plugin_config)
 
@@ -131,7 +143,7 @@ def collect_plugin_configs(jobconfig, taskrole):
 
 
 def init_plugins(jobconfig, secrets, user_extension, application_token, commands, plugins_path, runtime_path,
-                 taskrole):
+                 taskrole, pre_scripts=None):
     """Init plugins from jobconfig.
 
     Args:
@@ -143,6 +155,8 @@ def init_plugins(jobconfig, secrets, user_extension, application_token, commands
         plugins_path: The base path for all plugins.
         runtime_path: The output path of plugin generated scripts.
         taskrole: the taskrole of this container.
+        pre_scripts: pre scripts with their plugin, stage and dependsOn are appended
+            to it, see build_precommand_plan.
     """
 
     plugin_configs = collect_plugin_configs(jobconfig, taskrole)
@@ -179,41 +193,103 @@ def init_plugins(jobconfig, secrets, user_extension, application_token, commands
 
         if os.path.isfile(plugin_scripts[0]):
             commands[0].append("/bin/bash {}".format(plugin_scripts[0]))
+            if pre_scripts is not None:
+                pre_scripts.append({
+                    "name": "{}-{}".format(plugin_name, plugin_index),
+                    "path": plugin_scripts[0],
+                    "plugin": plugin_name,
+                    "stage": plugin_desc.get("stage"),
+                    "dependsOn": plugin_config.get("dependsOn", []) +
+                                 plugin_desc.get("dependsOn", []),
+                })
 
         if os.path.isfile(plugin_scripts[1]):
             commands[1].insert(0, "/bin/bash {}".format(plugin_scripts[1]))
 
 
+def build_precommand_plan(pre_scripts):
+    """Build the plan run by precommandrunner from pre scripts in job config order.
+
+    A pre script depends on scripts of plugins in lower stages (the stage in
+    desc.yaml), earlier scripts of the same plugin and earlier scripts of the
+    plugins in its dependsOn. Plugins without stage split the scripts into
+    segments and run alone, after everything before and before everything
+    after them, which is the sequential order of precommands.sh.
+    """
+    plan = []
+    barrier = None
+    segment = []
+
+    def _flush_segment():
+        # a stable sort keeps job config order within a stage
+        scheduled = []
+        for script in sorted(segment, key=lambda s: s["stage"]):
+            depends_on = [barrier] if barrier else []
+            for earlier in scheduled:
+                if earlier["stage"] < script["stage"] or earlier[
+                        "plugin"] == script["plugin"] or earlier[
+                            "plugin"] in script["dependsOn"]:
+                    depends_on.append(earlier["name"])
+            scheduled.append(script)
+            plan.append({
+                "name": script["name"],
+                "path": script["path"],
+                "dependsOn": depends_on
+            })
+        segment.clear()
+
+    for script in pre_scripts:
+        if script["stage"] is not None:
+            segment.append(script)
+            continue
+        depends_on = [s["name"] for s in segment]
+        if barrier and not depends_on:
+            depends_on = [barrier]
+        _flush_segment()
+        plan.append({
+            "name": script["name"],
+            "path": script["path"],
+            "dependsOn": depends_on
+        })
+        barrier = script["name"]
+    _flush_segment()
+    return {"scripts": plan}
+
+
+def get_package_cache_os(jobconfig, taskrole):
+    """
+    Return the package cache os variant of the docker image of taskrole, None
+    if it can't be told from the image uri.
+    """
+    image_name = jobconfig["taskRoles"][taskrole].get("dockerImage")
+    for prerequisite in jobconfig.get("prerequisites", []):
+        if prerequisite.get("type") == "dockerimage" and prerequisite.get(
+                "name") == image_name:
+            matched = [
+                os_type
+                for os_type, pattern in PACKAGE_CACHE_OS_PATTERNS.items()
+                if pattern.search(prerequisite.get("uri", ""))
+            ]
+            return matched[0] if len(matched) == 1 else None
+    return None
+
 
 def replace_ref(param_str, jobconfig, secrets, taskrole):
-    jobconfig_copy = copy.deepcopy(jobconfig)
-    jobconfig_copy["secrets"] = secrets
-
-    def _find_ref(matched):
-        ref_str = re.sub(r'(\s*)%>', "",
-                         re.sub(r'<%(\s*)\$', "", matched.group(0)))
-        ref = ref_str.split(".")
-        if ref[0] in ["parameters", "secrets"]:
-            cur_element = jobconfig_copy[ref[0]]
-        elif ref[0] in ["script", "output", "data"]:
-            cur_element = next(
-                b for b in jobconfig_copy["prerequisites"]
-                if b["type"] == ref[0]
-                and b["name"] == jobconfig_copy["taskRoles"][taskrole][ref[0]])
-        for i in range(1, len(ref)):
-            list_indexes = re.findall(r'([\s\S]*?)\[(\s*)([0-9]+)(\s*)\]',
-                                      ref[i])
-            if not list_indexes:
-                cur_element = cur_element[ref[i]]
-            else:
-                for list_index in list_indexes:
-                    if list_index[0]:
-                        cur_element = cur_element[list_index[0]]
-                    cur_element = cur_element[int(list_index[2])]
-        return cur_element
-
-    replaced = re.sub(r'<%(\s*)\$([\s\S]*?)(\s*)%>', _find_ref, param_str)
-    return replaced
+    def _find_prerequisite(prerequisite_type):
+        prerequisite_name = jobconfig["taskRoles"][taskrole][prerequisite_type]
+        for prerequisite in jobconfig["prerequisites"]:
+            if prerequisite["type"] == prerequisite_type and prerequisite[
+                    "name"] == prerequisite_name:
+                return prerequisite
+        raise KeyError(prerequisite_name)
+
+    context = LazyContext(
+        parameters=lambda: jobconfig["parameters"],
+        secrets=secrets,
+        script=lambda: _find_prerequisite("script"),
+        output=lambda: _find_prerequisite("output"),
+        data=lambda: _find_prerequisite("data"))
+    return render(param_str, context)
 
 
 def main():
@@ -248,16 +324,32 @@ def main():
         with open(args.user_extension_secrets_file) as f:
             user_extension = yaml.safe_load(f.read())
 
+    # plugins only stage package cache variants of the job os
+    package_cache_os = get_package_cache_os(job_config, args.task_role)
+    if package_cache_os:
+        os.environ.setdefault(PACKAGE_CACHE_OS_ENV, package_cache_os)
+
     commands = [[], []]
+    pre_scripts = []
     init_plugins(job_config, secrets, user_extension, args.application_token, commands, args.plugins_path,
-                 args.runtime_path, args.task_role)
+                 args.runtime_path, args.task_role, pre_scripts)
 
     # pre-commands and post-commands already handled by rest-server.
     # Don't need to do this unless use commands in JobConfig for comments compatibility.
     # init_deployment(jobconfig, commands)
 
+    # independent plugin pre scripts are run concurrently by precommandrunner
+    plan_path = "{}/precommands.json".format(args.runtime_path)
+    with open(plan_path, "w") as f:
+        json.dump(build_precommand_plan(pre_scripts), f, indent=2)
+
     with open("{}/precommands.sh".format(args.runtime_path), "a+") as f:
-        f.write("\n".join(commands[0]))
+        if pre_scripts:
+            # BASH_ENV is only set for the pre scripts, package_lock.sh
+            # unsets it so it doesn't leak into processes they start
+            f.write("BASH_ENV={0}/package_lock.sh {0}/precommandrunner "
+                    "-log-dir ${{PRECOMMAND_LOG_DIR:-{0}/precommand-logs}} {1}\n".format(
+                        args.runtime_path, plan_path))
 
     with open("{}/postcommands.sh".format(args.runtime_path), "a+") as f:
         f.write("\n".join(commands[1]))
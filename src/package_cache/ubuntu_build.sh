@@ -26,8 +26,18 @@ else
 fi
 
 apt-get update
-ROOT_DIR=/package_cache
-mkdir -p $ROOT_DIR
+ROOT_DIR=${PACKAGE_CACHE_ROOT:-/package_cache}
+# debs are stored once by sha256, group directories only link to them
+STORE_DIR=$ROOT_DIR/store
+mkdir -p $ROOT_DIR $STORE_DIR
+# packages are gathered against the dpkg status of the clean image, so the
+# dependencies of groups which precommands or earlier steps install into the
+# build image, e.g. wget, are still cached for jobs
+DPKG_STATUS=${DPKG_STATUS:-/var/lib/dpkg/status}
+BUILD_TMP_DIR=`mktemp -d`
+CLEAN_DPKG_STATUS=$BUILD_TMP_DIR/dpkg_status
+cp $DPKG_STATUS $CLEAN_DPKG_STATUS
+CLEAN_APT_OPTIONS="-o Dir::State::status=$CLEAN_DPKG_STATUS"
 
 i=0
 package_dirs=()
@@ -39,18 +49,26 @@ do
     name=`echo $line | cut -d , -f 1`
     os=`echo $line | cut -d , -f 2`
     packages=`echo $line | cut -d , -f 3`
+    precommands=`echo $line | cut -d , -f 4-`
     if [ "$os" = "$os_type" ]; then
       echo "name: ${name} os: ${os} packages: ${packages}"
+      if [ -n "$precommands" ]; then
+        /bin/bash -c "$precommands"
+        if [ $? -ne 0 ]; then
+          echo 'There is an error during precommands.'
+          exit 1
+        fi
+      fi
       package_dir=$ROOT_DIR"/${name}-${os}"
       package_dirs[$i]=$package_dir
       let i++
       mkdir -p $package_dir
       cd $package_dir
       echo $packages > ./packages
-      apt-get -y install --print-uris ${packages} | cut -d " " -f 1-2 | grep http:// > /aptinfo && \
-      cat /aptinfo | cut -d\' -f 2 > ./urls && \
-      apt-get -y install ${packages} --dry-run &> /dry_run_log && \
-      cat /dry_run_log  | grep Conf | cut -d " " -f 2 > ./order
+      apt-get $CLEAN_APT_OPTIONS -y install --print-uris ${packages} | cut -d " " -f 1-2 | grep -E "https?://" > $BUILD_TMP_DIR/aptinfo && \
+      cat $BUILD_TMP_DIR/aptinfo | cut -d\' -f 2 > ./urls && \
+      apt-get $CLEAN_APT_OPTIONS -y install ${packages} --dry-run &> $BUILD_TMP_DIR/dry_run_log && \
+      cat $BUILD_TMP_DIR/dry_run_log  | grep Conf | cut -d " " -f 2 > ./order
       if [ $? -ne 0 ]; then
         echo 'There is an error during package collection.'
         exit 1
@@ -69,4 +87,15 @@ for package_dir in ${package_dirs[@]};do
     echo 'There is an error during package collection.'
     exit 1
   fi
-done
\ No newline at end of file
+  sha256sum *.deb > ./sha256sums
+  while read hash filename; do
+    if [ -f $STORE_DIR/$hash.deb ]; then
+      rm $filename
+    else
+      mv $filename $STORE_DIR/$hash.deb
+    fi
+    ln -s ../store/$hash.deb $filename
+  done < ./sha256sums
+done
+
+rm -rf $BUILD_TMP_DIR
@@ -18,7 +18,7 @@
 
 import logging
 import os
-from os import curdir
+import shutil
 import sys
 
 import backoff
@@ -27,11 +27,120 @@ from git import Repo, GitCommandError
 sys.path.append(
     os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
 from plugins.plugin_utils import plugin_init, PluginHelper  #pylint: disable=wrong-import-position
+from plugins.git.mirror_cache import MirrorCache  #pylint: disable=wrong-import-position
 
 LOGGER = logging.getLogger(__name__)
 
+DEFAULT_DEPTH = 1
+DEFAULT_LFS_CONCURRENCY = 8
+
+# node-local directory shared by pods on the node, mirror cache is disabled
+# if it is not mounted
+MIRROR_CACHE_DIR = os.environ.get("PAI_GIT_MIRROR_CACHE_DIR",
+                                  "/usr/local/pai-git-cache")
+MIRROR_CACHE_SIZE_GB = float(
+    os.environ.get("PAI_GIT_MIRROR_CACHE_SIZE_GB", "50"))
+
+
+def is_true(value) -> bool:
+    return str(value).lower() == "true"
+
+
+def get_clone_options(parameters) -> list:
+    """
+    convert plugin parameters to git clone options
+
+    Without options, the default is a shallow clone of a single branch since
+    jobs usually only need the working tree. If options are given, depth and
+    single_branch are only added when set explicitly
+    """
+    options = list(parameters.get("options", []))
+    legacy = "options" in parameters
+    depth = int(parameters.get("depth", 0 if legacy else DEFAULT_DEPTH))
+    if depth > 0:
+        options.append("--depth={}".format(depth))
+    if is_true(parameters.get("single_branch", not legacy)):
+        options.append("--single-branch")
+    if "branch" in parameters:
+        options.append("--branch={}".format(parameters["branch"]))
+    if "filter" in parameters:
+        options.append("--filter={}".format(parameters["filter"]))
+    if parameters.get("sparse_paths"):
+        options.append("--no-checkout")
+    return options
+
+
+def get_mirror_cache(parameters):
+    if not is_true(parameters.get("mirror_cache", True)):
+        return None
+    if not os.path.isdir(MIRROR_CACHE_DIR):
+        return None
+    return MirrorCache(MIRROR_CACHE_DIR, MIRROR_CACHE_SIZE_GB * 1024**3)
+
+
+def clone_from_mirror(cache, parameters, repo_local_path, env):
+    """
+    clone from the node-local mirror of the repo, the mirror is fetched
+    first so that only new objects are downloaded from the git server
+    """
+    uri = parameters["repo_uri"]
+    options = get_clone_options(parameters)
+    with cache.mirror(uri, env=env) as mirror:
+        # objects are hardlinked from a local path if possible, shallow and
+        # partial clones need the file:// transport
+        if any(option.startswith(("--depth", "--filter", "--shallow"))
+               for option in options):
+            mirror = "file://" + mirror
+        repo = Repo.clone_from(mirror,
+                               repo_local_path,
+                               env=env,
+                               multi_options=options)
+    repo.remotes.origin.set_url(uri)
+    return repo
+
+
+def clone(parameters, repo_local_path, cache=None):
+    # remove the partial clone of a failed try
+    shutil.rmtree(repo_local_path, ignore_errors=True)
+    lfs = is_true(parameters.get("lfs", False))
+    # lfs objects are fetched in parallel by git lfs pull instead of one by
+    # one during checkout
+    env = {"GIT_LFS_SKIP_SMUDGE": "1"} if lfs else None
+    repo = None
+    if cache:
+        try:
+            repo = clone_from_mirror(cache, parameters, repo_local_path, env)
+        except (GitCommandError, OSError) as e:
+            LOGGER.warning("Failed to clone from mirror cache, fallback: %s", e)
+            shutil.rmtree(repo_local_path, ignore_errors=True)
+    if repo is None:
+        repo = Repo.clone_from(parameters["repo_uri"],
+                               repo_local_path,
+                               env=env,
+                               multi_options=get_clone_options(parameters))
+
+    sparse_paths = [
+        str(path).strip("/") for path in parameters.get("sparse_paths", [])
+    ]
+    if sparse_paths:
+        repo.git.config("core.sparseCheckout", "true")
+        info_dir = os.path.join(repo.git_dir, "info")
+        os.makedirs(info_dir, exist_ok=True)
+        with open(os.path.join(info_dir, "sparse-checkout"), "w") as f:
+            f.write("".join("/{}\n".format(path) for path in sparse_paths))
+        repo.git.read_tree("-mu", "HEAD")
+
+    if lfs:
+        repo.git.config(
+            "lfs.concurrenttransfers",
+            str(parameters.get("lfs_concurrency", DEFAULT_LFS_CONCURRENCY)))
+        lfs_options = []
+        if sparse_paths:
+            lfs_options.append("--include={}".format(",".join(sparse_paths)))
+        repo.git.lfs("pull", *lfs_options)
+    return repo
+
 
-# backoff retry, max wait time set to 5 mins
 @backoff.on_exception(backoff.expo,
                       GitCommandError,
                       max_tries=10,
@@ -47,18 +156,14 @@ def main():
     if not parameters or "repo_uri" not in parameters:
         LOGGER.error("Can not find repo in runtime plugin")
         sys.exit(1)
-    if "options" in parameters:
-        Repo.clone_from(parameters["repo_uri"],
-                        repo_local_path,
-                        multi_options=parameters["options"])
-    else:
-        Repo.clone_from(parameters["repo_uri"], repo_local_path)
+    clone(parameters, repo_local_path, get_mirror_cache(parameters))
     if "clone_dir" in parameters:
         plugin_helper.inject_commands([
             "{}/check_clone_dir.sh {}".format(
-                cur_dir, parameters["clone_dir"]), "mkdir -p {}".format(
-                    parameters["clone_dir"]), "mv -f {}/* {}".format(
-                        repo_local_path, parameters["clone_dir"])
+                cur_dir, parameters["clone_dir"]),
+            "{}/move_clone_dir.sh {} {}".format(
+                cur_dir, os.path.abspath(repo_local_path),
+                parameters["clone_dir"])
         ], pre_script)
 
 
@@ -0,0 +1,247 @@
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Node-level cache of bare git mirrors shared by pods on the same node.
+
+Mirrors are keyed by repo uri without credentials, which are only passed to
+git on the command line and never stored in the mirror. Every use of a mirror
+is authorized against the git server with the credentials of the job. Each
+mirror has a lock file, the lock is held exclusively while the mirror is
+created or fetched, and shared while a clone reads it, so a mirror in use is
+never evicted. A mirror is only removed by eviction or if it is corrupt, a
+failed update of a job leaves it to the other jobs.
+"""
+import contextlib
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import time
+import urllib.parse
+
+from git import Repo
+from git.exc import GitCommandError, InvalidGitRepositoryError, NoSuchPathError
+
+LOGGER = logging.getLogger(__name__)
+
+MIRROR_SUFFIX = ".git"
+LOCK_SUFFIX = ".lock"
+# a mirror is created here and renamed once complete
+TMP_SUFFIX = ".tmp"
+EVICT_LOCK_FILE = "evict.lock"
+LAST_USED_FILE = "pai-last-used"
+LAST_FETCH_FILE = "pai-last-fetch"
+# pods of a job which start together share one fetch
+FETCH_INTERVAL_SECONDS = 60
+# only branches and tags, a mirror of all refs may include pull request refs
+# on some servers
+FETCH_REFSPECS = ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"]
+
+
+def strip_userinfo(uri) -> str:
+    """remove user and password of an url, other uris are kept"""
+    parts = urllib.parse.urlsplit(uri)
+    if not parts.scheme or "@" not in parts.netloc:
+        return uri
+    return urllib.parse.urlunsplit(
+        parts._replace(netloc=parts.netloc.rsplit("@", 1)[1]))
+
+
+def _touch(path):
+    with open(path, "a"):
+        os.utime(path)
+
+
+def _mtime(path) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def _disk_usage(path) -> int:
+    usage = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                usage += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return usage
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _is_same_file(f, path) -> bool:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    fstat = os.fstat(f.fileno())
+    return (stat.st_dev, stat.st_ino) == (fstat.st_dev, fstat.st_ino)
+
+
+@contextlib.contextmanager
+def _locked(lock_path, operation):
+    """Hold flock operation on lock_path. A lock file is removed together with
+    its mirror, a lock taken on a removed file is taken again on a new one."""
+    while True:
+        with open(lock_path, "a") as lock:
+            fcntl.flock(lock, operation)
+            if _is_same_file(lock, lock_path):
+                yield lock
+                return
+
+
+def _is_intact(repo) -> bool:
+    try:
+        repo.git.fsck("--connectivity-only", "--no-progress")
+    except GitCommandError:
+        return False
+    return True
+
+
+def _update_head(repo, uri, env):
+    """point HEAD of the mirror to the default branch of uri"""
+    for line in repo.git.ls_remote("--symref", uri, "HEAD",
+                                   env=env).splitlines():
+        if line.startswith("ref: "):
+            repo.git.symbolic_ref("HEAD", line[len("ref: "):].split()[0])
+            return
+
+
+class MirrorCache:
+    def __init__(self, root, max_bytes):
+        self._root = root
+        self._max_bytes = max_bytes
+
+    def _mirror_path(self, uri) -> str:
+        key = hashlib.sha256(
+            strip_userinfo(uri).encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self._root, key + MIRROR_SUFFIX)
+
+    @staticmethod
+    def _lock_path(path) -> str:
+        return path[:-len(MIRROR_SUFFIX)] + LOCK_SUFFIX
+
+    @contextlib.contextmanager
+    def mirror(self, uri, env=None):
+        """Update the mirror of uri and yield its path, then evict least
+        recently used mirrors beyond the disk budget."""
+        path = self._mirror_path(uri)
+        lock_path = self._lock_path(path)
+        with _locked(lock_path, fcntl.LOCK_EX) as lock:
+            try:
+                self._update(uri, path, env)
+            except Exception:
+                if not os.path.isdir(path):
+                    _unlink(lock_path)
+                raise
+            _touch(os.path.join(path, LAST_USED_FILE))
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            yield path
+        self.evict()
+
+    @staticmethod
+    def _update(uri, path, env):
+        if os.path.isdir(path):
+            try:
+                repo = Repo(path)
+            except (InvalidGitRepositoryError, NoSuchPathError):
+                LOGGER.warning("Removing corrupt mirror %s", path)
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                MirrorCache._fetch(repo, uri, path, env)
+                return
+        LOGGER.info("Creating mirror %s", path)
+        tmp_path = path + TMP_SUFFIX
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        try:
+            repo = Repo.init(tmp_path, bare=True)
+            repo.git.remote("add", "origin", strip_userinfo(uri))
+            repo.git.config("remote.origin.fetch", FETCH_REFSPECS[0])
+            # let shallow and partial clones from the mirror work
+            repo.git.config("uploadpack.allowFilter", "true")
+            repo.git.fetch(uri, *FETCH_REFSPECS, env=env)
+            _update_head(repo, uri, env)
+            _touch(os.path.join(tmp_path, LAST_FETCH_FILE))
+            os.rename(tmp_path, path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def _fetch(repo, uri, path, env):
+        # the mirror may have been fetched by another job, this also checks
+        # that this job can read the repo, failures are left to the job
+        _update_head(repo, uri, env)
+        last_fetch = os.path.join(path, LAST_FETCH_FILE)
+        if time.time() - _mtime(last_fetch) <= FETCH_INTERVAL_SECONDS:
+            return
+        LOGGER.info("Fetching mirror %s", path)
+        try:
+            repo.git.fetch("--prune", uri, *FETCH_REFSPECS, env=env)
+        except GitCommandError:
+            if not _is_intact(repo):
+                LOGGER.warning("Removing corrupt mirror %s", path)
+                shutil.rmtree(path, ignore_errors=True)
+            raise
+        _touch(last_fetch)
+
+    def evict(self):
+        with open(os.path.join(self._root, EVICT_LOCK_FILE), "a") as evict_lock:
+            fcntl.flock(evict_lock, fcntl.LOCK_EX)
+            mirrors = []
+            for name in os.listdir(self._root):
+                path = os.path.join(self._root, name)
+                if name.endswith(MIRROR_SUFFIX + TMP_SUFFIX):
+                    self._remove_leftover(path[:-len(TMP_SUFFIX)])
+                elif name.endswith(MIRROR_SUFFIX):
+                    mirrors.append((_mtime(os.path.join(path, LAST_USED_FILE)),
+                                    _disk_usage(path), path))
+            total = sum(usage for _, usage, _ in mirrors)
+            for _, usage, path in sorted(mirrors):
+                if total <= self._max_bytes:
+                    break
+                lock_path = self._lock_path(path)
+                try:
+                    with _locked(lock_path, fcntl.LOCK_EX | fcntl.LOCK_NB):
+                        LOGGER.info("Evicting mirror %s", path)
+                        shutil.rmtree(path, ignore_errors=True)
+                        _unlink(lock_path)
+                except BlockingIOError:
+                    continue
+                total -= usage
+
+    def _remove_leftover(self, path):
+        """remove the temporary mirror left by a pod which stopped while
+        creating path, it is in use if its lock is held"""
+        lock_path = self._lock_path(path)
+        try:
+            with _locked(lock_path, fcntl.LOCK_EX | fcntl.LOCK_NB):
+                LOGGER.info("Removing unfinished mirror %s", path + TMP_SUFFIX)
+                shutil.rmtree(path + TMP_SUFFIX, ignore_errors=True)
+                if not os.path.isdir(path):
+                    _unlink(lock_path)
+        except BlockingIOError:
+            pass
@@ -0,0 +1,40 @@
+#!/bin/bash
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Move the cloned repo to the destination checked by check_clone_dir.sh.
+# The repo is renamed unless the destination is a mount point, in which case
+# its content, including .git, is moved into it.
+# usage: move_clone_dir.sh <source> <destination>
+
+function main() {
+  local source=$1
+  local destination=$2
+  mkdir -p $(dirname $destination)
+  if [[ -d $destination ]]; then
+    rmdir $destination 2> /dev/null || true
+  fi
+  if [[ ! -e $destination ]]; then
+    mv $source $destination
+    return
+  fi
+  shopt -s dotglob
+  mv $source/* $destination
+  rmdir $source
+}
+
+main $@
@@ -18,7 +18,10 @@
 
 import logging
 import argparse
+import json
 import os
+import re
+import shlex
 import shutil
 import yaml
 
@@ -26,6 +29,31 @@ from common.utils import init_logger
 
 LOGGER = logging.getLogger(__name__)
 
+# the command trace is kept in the log folder, values of options and config
+# lines which look like credentials are not written to it
+_SECRET_PATTERN = re.compile(
+    r"((?:password|passwd|key|secret|token)\w*(?:=|\s+)|\s-p\s+)('[^']*'|\"[^\"]*\"|[^\s,\"']+)",
+    re.IGNORECASE)
+_MAX_TRACED_COMMAND_LENGTH = 256
+
+# enough of the shell grammar to find where a command spanning several lines
+# ends, see PluginHelper._group_commands
+_SHELL_OPERATORS = ("<<<", ";;&", "<<-", "&&", "||", ";;", ";&", "|&", "<<", ">>",
+                    "<&", ">&", "<>", ">|", "&", "|", ";", "(", ")", "<", ">")
+_SHELL_REDIRECTIONS = ("<<<", "<<-", "<<", ">>", "<&", ">&", "<>", ">|", "<", ">")
+_SHELL_CONTINUATIONS = ("&&", "||", "|", "|&")
+_SHELL_COMPOUND_ENDS = {
+    "if": "fi", "case": "esac", "for": "done", "select": "done",
+    "while": "done", "until": "done", "{": "}"
+}
+# reserved words followed by a command
+_SHELL_COMMAND_PREFIXES = ("if", "then", "elif", "else", "while", "until", "do", "{", "!", "time")
+
+# background commands of all plugins, run by the supervisor
+BACKGROUND_COMMANDS_FILE = "background_commands.jsonl"
+RESTART_NEVER = "never"
+RESTART_POLICIES = (RESTART_NEVER, "on-failure", "always")
+
 
 class PluginHelper:  #pylint: disable=too-few-public-methods
     def __init__(self, plugin_config: dict):
@@ -34,9 +62,20 @@ class PluginHelper:  #pylint: disable=too-few-public-methods
         self._failure_policy = plugin_config.get("failurePolicy", "fail")
 
     def inject_commands(self, commands, script):
+        """Append commands to a plugin script.
+
+        A command is either a string or a dict with a command key. Dicts with
+        background set to true (or blocking set to false) in a pre script run
+        alongside the user command under the supervisor instead of blocking
+        it, see go/pkg/precommand/supervisor.go.
+        """
+        commands, background_commands = self._split_background_commands(
+            commands, script)
+        if background_commands:
+            self._inject_background_commands(background_commands, script)
         new_commands = []
         if commands:
-            new_commands = [x + "\n" for x in commands]
+            new_commands = self._trace_commands(commands, script)
             if self._failure_policy.lower() == "ignore":
                 new_commands.insert(0, "set +o errexit\n")
                 new_commands.append("set -o errexit\n")
@@ -45,6 +84,202 @@ class PluginHelper:  #pylint: disable=too-few-public-methods
             with open(script, 'a+') as f:
                 f.writelines(new_commands)
 
+    def _split_background_commands(self, commands, script):
+        is_pre = os.path.basename(script).startswith("plugin_pre")
+        foreground, background = [], []
+        for command in commands or []:
+            if not isinstance(command, dict):
+                foreground.append(command)
+            elif command.get("background") is True or command.get(
+                    "blocking") is False:
+                if is_pre:
+                    background.append(command)
+                else:
+                    LOGGER.warning(
+                        "Background commands are only supported in pre commands, run in foreground: %s",
+                        command["command"])
+                    foreground.append(command["command"])
+            else:
+                foreground.append(command["command"])
+        return foreground, background
+
+    def _inject_background_commands(self, commands, script):
+        background_file = os.path.join(os.path.dirname(script),
+                                       BACKGROUND_COMMANDS_FILE)
+        existing = 0
+        if os.path.isfile(background_file):
+            with open(background_file) as f:
+                existing = sum(1 for line in f if line.strip())
+        matched = re.match(r"plugin_pre(\d+)\.sh$", os.path.basename(script))
+        prefix = "{}-{}".format(self._plugin_name,
+                                matched.group(1) if matched else "0")
+        entries = []
+        for index, command in enumerate(commands):
+            restart = command.get("restart", RESTART_NEVER)
+            if restart not in RESTART_POLICIES:
+                raise ValueError("Unknown restart policy {} of {}".format(
+                    restart, command["command"]))
+            entries.append({
+                "name": "{}-bg{}".format(prefix, existing + index),
+                "command": command["command"],
+                "restart": restart,
+                "maxRestarts": int(command.get("maxRestarts", 0)),
+            })
+        with open(background_file, "a") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+
+    def _trace_commands(self, commands, script):
+        """Wrap every command to record its start, end and exit code, see
+        runtime.d/command_trace.sh.
+
+        Commands are run in the script shell as before. Lines which only form
+        a command together, e.g. continued lines, heredocs or compound
+        commands, are traced as one command with the index of the first line.
+        """
+        script_name = os.path.basename(script)
+        phase = "post" if script_name.startswith("plugin_post") else "pre"
+        new_commands = [
+            "if [[ -f {0} ]]; then source {0}; else function pai_trace_begin() {{ :; }}; "
+            "function pai_trace_end() {{ :; }}; fi\n".format(COMMAND_TRACE_SCRIPT)
+        ]
+        for index, lines in self._group_commands(commands):
+            command = "\n".join(lines)
+            new_commands.append("pai_trace_begin {} {} {} {} {}\n".format(
+                phase, shlex.quote(self._plugin_name), shlex.quote(script_name),
+                index, shlex.quote(json.dumps(self._redact(command)))))
+            new_commands.append(command + "\n")
+            new_commands.append("pai_trace_end $?\n")
+        return new_commands
+
+    @staticmethod
+    def _group_commands(commands):
+        """Split commands into groups of contiguous lines which form complete
+        commands, returns a list of (first index, lines).
+
+        Continued lines, open quotes, trailing operators, heredoc bodies and
+        compound commands are kept in one group. Lines which do not parse are
+        grouped with all following lines.
+        """
+        groups = []
+        start = 0
+        logical_line = ""
+        # expected end words of open compound commands and subshells
+        open_ends = []
+        # pending heredoc delimiters and whether leading tabs are stripped
+        heredocs = []
+        # the last logical line ended with an operator, e.g. a pipe
+        continued = False
+        for index, line in enumerate(commands):
+            if heredocs:
+                delimiter, strip_tabs = heredocs[0]
+                if (line.lstrip("\t") if strip_tabs else line) == delimiter:
+                    heredocs.pop(0)
+            elif line.endswith("\\"):
+                logical_line += line[:-1]
+                continue
+            else:
+                logical_line += line
+                try:
+                    tokens = _split_shell_tokens(logical_line)
+                except ValueError:
+                    logical_line += "\n"
+                    continue
+                logical_line = ""
+                heredocs = _parse_shell_tokens(tokens, open_ends)
+                continued = bool(tokens) and tokens[-1] in _SHELL_CONTINUATIONS
+            if not open_ends and not heredocs and not continued:
+                groups.append((start, commands[start:index + 1]))
+                start = index + 1
+        if start < len(commands):
+            groups.append((start, commands[start:]))
+        return groups
+
+    @staticmethod
+    def _redact(command):
+        command = _SECRET_PATTERN.sub(r"\1***", command)
+        return command[:_MAX_TRACED_COMMAND_LENGTH]
+
+
+def _split_shell_tokens(line):
+    """Split a shell line into words and operators, quoted words keep their
+    quotes. Raises ValueError if a quote is not closed.
+    """
+    tokens = []
+    word = ""
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if char in " \t\n":
+            if word:
+                tokens.append(word)
+                word = ""
+            i += 1
+        elif char == "#" and not word:
+            break
+        elif char == "\\":
+            word += line[i:i + 2]
+            i += 2
+        elif char in "'\"`":
+            end = i + 1
+            while end < len(line) and line[end] != char:
+                end += 2 if line[end] == "\\" and char != "'" else 1
+            if end >= len(line):
+                raise ValueError("no closing quotation")
+            word += line[i:end + 1]
+            i = end + 1
+        elif char in "&|;()<>":
+            if word:
+                tokens.append(word)
+                word = ""
+            operator = next(op for op in _SHELL_OPERATORS if line.startswith(op, i))
+            tokens.append(operator)
+            i += len(operator)
+        else:
+            word += char
+            i += 1
+    if word:
+        tokens.append(word)
+    return tokens
+
+
+def _parse_shell_tokens(tokens, open_ends):
+    """Track compound commands of one logical line in open_ends, returns the
+    heredocs started by the line.
+    """
+    heredocs = []
+    command_start = True
+    function_name = False
+    redirection = None
+    for token in tokens:
+        if redirection:
+            if redirection in ("<<", "<<-"):
+                delimiter = re.sub(r"[\\'\"]", "", token)
+                heredocs.append((delimiter, redirection == "<<-"))
+            redirection = None
+        elif token in _SHELL_REDIRECTIONS:
+            redirection = token
+        elif token == "(":
+            open_ends.append(")")
+            command_start = True
+        elif token == ")":
+            # a case pattern if no subshell is open
+            if open_ends and open_ends[-1] == ")":
+                open_ends.pop()
+            command_start = True
+        elif token in _SHELL_OPERATORS:
+            command_start = True
+        elif function_name:
+            function_name = False
+            command_start = True
+        elif command_start:
+            if token in _SHELL_COMPOUND_ENDS:
+                open_ends.append(_SHELL_COMPOUND_ENDS[token])
+            elif open_ends and token == open_ends[-1]:
+                open_ends.pop()
+            function_name = token == "function"
+            command_start = token in _SHELL_COMMAND_PREFIXES
+    return heredocs
+
 
 def plugin_init():
     init_logger()
@@ -61,10 +296,54 @@ def plugin_init():
 
 
 PAI_WORK_DIR = "/usr/local/pai"
+COMMAND_TRACE_SCRIPT = os.path.join(PAI_WORK_DIR, "runtime.d", "command_trace.sh")
+
+
+PACKAGE_CACHE_SOURCE_DIR = "/opt/package_cache"
+# debs of all groups are stored once by sha256, see package_cache/ubuntu_build.sh
+PACKAGE_CACHE_STORE_NAME = "store"
+PACKAGE_CACHE_SUMS_NAME = "sha256sums"
+# os variant of the job image, e.g. ubuntu18.04, set by initializer if it is
+# known, otherwise variants of all os are staged
+PACKAGE_CACHE_OS_ENV = "PAI_PACKAGE_CACHE_OS"
+
+
+def _link_or_copy(source, target):
+    """hard link source to target, copy if they are on different devices"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+    return target
+
+
+def _stage_package_group(source_folder, target_folder, name):
+    """
+    Copy group folder name, debs of the group are links into the store of
+    the cache, each of them is copied once for all groups.
+    """
+    shutil.copytree(os.path.join(source_folder, name),
+                    os.path.join(target_folder, name),
+                    symlinks=True,
+                    copy_function=_link_or_copy)
+    sums_path = os.path.join(source_folder, name, PACKAGE_CACHE_SUMS_NAME)
+    if not os.path.exists(sums_path):
+        return
+    target_store = os.path.join(target_folder, PACKAGE_CACHE_STORE_NAME)
+    os.makedirs(target_store, exist_ok=True)
+    with open(sums_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            deb = "{}.deb".format(line.split()[0])
+            if not os.path.exists(os.path.join(target_store, deb)):
+                _link_or_copy(
+                    os.path.join(source_folder, PACKAGE_CACHE_STORE_NAME,
+                                 deb), os.path.join(target_store, deb))
 
 
 def try_to_install_by_cache(group_name: str, fallback_cmds: list):
-    source_folder = "/opt/package_cache"
+    source_folder = PACKAGE_CACHE_SOURCE_DIR
     target_folder = os.path.join(PAI_WORK_DIR, "package_cache")
     if not os.path.exists(source_folder):
         return "{};".format(";".join(fallback_cmds))
@@ -73,11 +352,15 @@ def try_to_install_by_cache(group_name: str, fallback_cmds: list):
         name for name in exists_group_names
         if name.startswith(group_name + '-')
     ]
+    target_os = os.environ.get(PACKAGE_CACHE_OS_ENV)
+    if target_os and "{}-{}".format(group_name,
+                                    target_os) in needed_group_names:
+        # install_group.sh only uses the variant of the job os
+        needed_group_names = ["{}-{}".format(group_name, target_os)]
     for name in needed_group_names:
-        name_source_folder = os.path.join(source_folder, name)
         name_target_folder = os.path.join(target_folder, name)
         if not os.path.exists(name_target_folder):  # avoid duplicate copy
-            shutil.copytree(name_source_folder, name_target_folder)
+            _stage_package_group(source_folder, target_folder, name)
     cached_cmd = "/bin/bash {}/runtime.d/install_group.sh ".format(
         PAI_WORK_DIR) + group_name
     return "{} || {{ {}; }}".format(cached_cmd, ";".join(fallback_cmds))
@@ -19,6 +19,7 @@
 import logging
 import os
 from pathlib import Path
+import re
 import sys
 
 sys.path.append(
@@ -27,6 +28,11 @@ from plugins.plugin_utils import plugin_init, PluginHelper, try_to_install_by_ca
 
 LOGGER = logging.getLogger(__name__)
 
+JOB_SSH_CONFIG_NAME = "job_ssh_config"
+DEFAULT_CONTROL_PERSIST = "30m"
+# runtime_env.sh is generated by framework_parser.py with lines of export KEY='VALUE'
+_EXPORT_PATTERN = re.compile(r"^export (\w+)='(.*)'$")
+
 
 def get_user_public_keys(user_extension):
     """
@@ -75,6 +81,65 @@ def prepare_job_ssh_key_pair(user_extension):
             privatekey.write(user_extension["jobSSH"]["key"].strip() + '\n')
 
 
+def load_runtime_env(runtime_env_path) -> dict:
+    runtime_env = {}
+    with open(runtime_env_path) as f:
+        for line in f:
+            matched = _EXPORT_PATTERN.match(line.rstrip("\n"))
+            if matched:
+                runtime_env[matched.group(1)] = matched.group(2)
+    return runtime_env
+
+
+def generate_job_ssh_config(runtime_env, control_persist=None) -> str:
+    """
+    generate ssh client config of all task role instances, which is included
+    in /etc/ssh/ssh_config by sshd.sh
+
+    Every instance gets a Host ${taskrole}-${index} entry with its address
+    and the job options, which must not apply to other hosts. If
+    control_persist is set, sessions to the same instance share one master
+    connection, which stays open for control_persist after the last session
+    exits
+    """
+    options = [
+        "  User root",
+        "  StrictHostKeyChecking no",
+        "  UserKnownHostsFile /dev/null",
+        "  IdentityFile /root/.ssh/id_rsa",
+    ]
+    if control_persist:
+        options += [
+            "  ControlMaster auto",
+            "  ControlPath /root/.ssh/cm-%C",
+            "  ControlPersist {}".format(control_persist),
+        ]
+    lines = []
+    for instance in runtime_env.get("PAI_TASK_ROLE_INSTANCES", "").split(","):
+        if not instance:
+            continue
+        taskrole, index = instance.split(":", 1)
+        lines += [
+            "Host {}-{}".format(taskrole, index),
+            "  HostName {}".format(
+                runtime_env.get("PAI_HOST_IP_{}_{}".format(taskrole, index), "")),
+            "  Port {}".format(
+                runtime_env.get("PAI_{}_{}_ssh_PORT".format(taskrole, index), "")),
+        ] + options
+    return "".join(line + "\n" for line in lines)
+
+
+def prepare_job_ssh_config(runtime_path, control_persist=None):
+    runtime_env_path = os.path.join(runtime_path, "runtime_env.sh")
+    if not os.path.isfile(runtime_env_path):
+        LOGGER.warning("%s not found, sshd.sh will generate ssh config", runtime_env_path)
+        return
+    with open(os.path.join(runtime_path, JOB_SSH_CONFIG_NAME), "w") as f:
+        f.write(
+            generate_job_ssh_config(load_runtime_env(runtime_env_path),
+                                    control_persist))
+
+
 def main():
     LOGGER.info("Preparing ssh runtime plugin commands")
     [plugin_config, pre_script, _] = plugin_init()
@@ -99,6 +164,16 @@ def main():
         jobssh = "false"
     cmd_params = [jobssh]
 
+    multiplexing = jobssh == "true" and str(parameters.get(
+        "jobsshMultiplexing", "false")).lower() == "true"
+    if jobssh == "true":
+        control_persist = None
+        if multiplexing:
+            control_persist = str(
+                parameters.get("jobsshControlPersist", DEFAULT_CONTROL_PERSIST))
+        prepare_job_ssh_config(os.path.dirname(os.path.abspath(pre_script)),
+                               control_persist)
+
     if "userssh" in parameters:
         # get user public keys from user extension secret
         public_keys = []
@@ -132,12 +207,16 @@ def main():
     # ssh barrier
     if jobssh == "true" and "sshbarrier" in parameters and str(
             parameters["sshbarrier"]).lower() == "true":
-        if "sshbarrierTimeout" in parameters:
-            barrier_params = str(parameters["sshbarrierTimeout"])
-        else:
-            barrier_params = ""
+        barrier_params = [
+            str(parameters.get("sshbarrierTimeout", "")),
+            str(parameters.get("sshbarrierMode", "pairwise")).lower(),
+            str(parameters.get("sshbarrierArity", "")),
+            str(multiplexing and str(parameters.get(
+                "sshbarrierPrewarm", "false")).lower() == "true").lower(),
+        ]
         command.append("{}/sshbarrier.sh {}\n".format(
-            os.path.dirname(os.path.abspath(__file__)), barrier_params))
+            os.path.dirname(os.path.abspath(__file__)),
+            " ".join("'{}'".format(param) for param in barrier_params)))
 
     plugin_helper.inject_commands(command, pre_script)
     LOGGER.info("Ssh runtime plugin perpared")
@@ -16,78 +16,30 @@
 # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-# no set -o nounset because use empty array to judge end
 set -o pipefail
 set -o errexit
 
-readonly RETRY_INTERVAL=10
-INSTANCES_TO_CHECK=()
-
-function check_ssh_connection()
-{
-  ssh -q -o BatchMode=yes -o StrictHostKeyChecking=no $1 "exit 0"
-  local _RCODE=$?
-  return $_RCODE
-}
-
-function get_check_instances() {
-  # Set ssh config for all task role instances
-  local taskRoleInstances=(${PAI_TASK_ROLE_INSTANCES//,/ })
-  for i in "${taskRoleInstances[@]}"; do
-    local instancePair=(${i//:/ })
-    local taskRole=${instancePair[0]}
-    local index=${instancePair[1]}
-
-    if [[ $taskRole = $FC_TASKROLE_NAME ]] && [[ $index = $FC_TASK_INDEX ]]; then
-      continue
-    fi
-
-    INSTANCES_TO_CHECK+=("${taskRole}-${index}")
-  done
-}
-
-function main() {
-  MAX_RETRY_COUNT=1800
-  if [[ $# -eq 1 ]]; then
-    MAX_RETRY_COUNT=$(( $1 * 60 / RETRY_INTERVAL ))
-  fi
-  echo "Setting ssh barrier MAX_RETRY_COUNT to ${MAX_RETRY_COUNT}, poll interval is ${RETRY_INTERVAL} seconds"
-
-  retryCount=0
-  get_check_instances
-
-  # set +o errexit because use exitcode to judge ssh connectivity
-  set +o errexit
-  while true
-  do
-    echo "Trying to SSH to instances: ${INSTANCES_TO_CHECK[*]}"
-
-    local instanceFailed=()
-    
-    for instance in "${INSTANCES_TO_CHECK[@]}"; do
-      echo "check ssh connection for ${instance}"
-      check_ssh_connection "$instance"
-      if [[ $? != 0 ]]; then
-        instanceFailed+=("$instance")
-      fi
-    done
-
-    [[ ${#instanceFailed[@]} = 0 ]] && break
-
-    if (( $retryCount >= $MAX_RETRY_COUNT )); then
-      echo "SSH barrier reaches max retry count. Failed instances: ${INSTANCES_TO_CHECK[*]} Exit..." >&2
-      exit 10
-    fi
-
-    INSTANCES_TO_CHECK=(${instanceFailed[*]}) 
-    ((retryCount++))
-
-    sleep $RETRY_INTERVAL
-  done
-  set -o errexit
-
-  echo "All ssh connections are established, continue..."
-}
-
-main $@
-
+# Wait until all instances accept ssh connections, see go/pkg/sshbarrier.
+# In pairwise mode, probe ssh ports of all other instances concurrently and
+# do the ssh handshake once a port is open. In tree mode, instances only
+# connect to their parent and children in a k-ary tree.
+# With prewarm, ssh connections to all other instances are opened after the
+# barrier, they are kept as master connections if ControlPersist is set.
+# usage: sshbarrier.sh [timeout in minutes] [pairwise|tree] [arity] [prewarm], exits 10 on timeout
+
+PAI_WORK_DIR=/usr/local/pai
+
+BARRIER_ARGS=()
+if [[ -n $1 ]]; then
+  BARRIER_ARGS+=(-timeout $1)
+fi
+if [[ -n $2 ]]; then
+  BARRIER_ARGS+=(-mode $2)
+fi
+if [[ -n $3 ]]; then
+  BARRIER_ARGS+=(-arity $3)
+fi
+if [[ $4 == "true" ]]; then
+  BARRIER_ARGS+=(-prewarm)
+fi
+exec ${PAI_WORK_DIR}/runtime.d/sshbarrier "${BARRIER_ARGS[@]}"
@@ -22,6 +22,7 @@ set -o pipefail
 
 PAI_WORK_DIR=/usr/local/pai
 SSH_DIR=/root/.ssh
+JOB_SSH_CONFIG=${PAI_WORK_DIR}/runtime.d/job_ssh_config
 
 function prepare_ssh()
 {
@@ -42,7 +43,7 @@ function prepare_ssh()
   echo "sshd:ALL" >> /etc/hosts.allow
 
   # Set user environment
-  env > ${SSH_DIR}/environment
+  env | grep -v "^BASH_ENV=" > ${SSH_DIR}/environment
 }
 
 function prepare_job_ssh()
@@ -60,7 +61,19 @@ function prepare_job_ssh()
     echo "no job ssh keys found" >&2
   fi
 
-  # Set ssh config for all task role instances
+  # Set ssh config for all task role instances, the config is generated by init.py
+  if [ -f ${JOB_SSH_CONFIG} ] ; then
+    # Include is supported since OpenSSH 7.3
+    echo "Include ${JOB_SSH_CONFIG}" > ${JOB_SSH_CONFIG}.include
+    if ssh -G -F ${JOB_SSH_CONFIG}.include localhost &> /dev/null ; then
+      cat ${JOB_SSH_CONFIG}.include >> /etc/ssh/ssh_config
+    else
+      cat ${JOB_SSH_CONFIG} >> /etc/ssh/ssh_config
+    fi
+    rm ${JOB_SSH_CONFIG}.include
+    return
+  fi
+
   taskRoleInstanceArray=(${PAI_TASK_ROLE_INSTANCES//,/ })
   for i in "${taskRoleInstanceArray[@]}"; do
     instancePair=(${i//:/ })
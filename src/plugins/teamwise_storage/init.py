@@ -49,7 +49,9 @@ def main():
         LOGGER.exception("Failed to generate storage commands")
         sys.exit(1)
     pre_script_commands = command_generator.generate_plugin_commands(
-        parameters)
+        parameters,
+        os.path.join(os.path.dirname(os.path.abspath(pre_script)),
+                     "storage_plan"))
 
     PluginHelper(plugin_config).inject_commands(pre_script_commands,
                                                 pre_script)
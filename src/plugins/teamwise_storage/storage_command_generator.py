@@ -19,6 +19,9 @@ import base64
 import json
 import logging
 import os
+import posixpath
+import tempfile
+import time
 
 from kubernetes import config as kube_config, client as kube_client
 
@@ -33,17 +36,87 @@ KUBE_APISERVER_ADDRESS = os.environ.get("KUBE_APISERVER_ADDRESS")
 
 KUBE_TOKEN_FILE = "/var/run/secrets/kubernetes.io/serviceaccount/token"
 
-STORAGE_PRE_COMMAND = ["umask 000"]
-
-
-def _covert_secret_to_server_config(secret) -> dict:
-    data = json.loads(base64.b64decode(secret).decode())
+STORAGE_NAMESPACE = "pai-storage"
+# optional node-local directory shared by pods to reuse secrets read by
+# other pods within the ttl, disabled if not set
+SECRET_CACHE_DIR = os.environ.get("PAI_STORAGE_SECRET_CACHE_DIR")
+SECRET_CACHE_TTL_SECONDS = int(
+    os.environ.get("PAI_STORAGE_SECRET_CACHE_TTL", "60"))
+
+# secrets read by this process, name -> (resourceVersion, data)
+_SECRET_CACHE = {}
+# decoded secret values, (name, resourceVersion) -> {key: value}
+_DECODED_SECRET_CACHE = {}
+
+# is_mounted <mount point> <fstype> <source> [options] checks the mount table
+# read once when the commands start, mounts which are already in place with
+# the expected source and options are skipped on restart or retry
+STORAGE_PRE_COMMAND = [
+    "umask 000",
+    "MOUNT_INFO=$(cat /proc/self/mountinfo)",
+    "function is_mounted() { awk -v mp=\"$1\" -v type=\"$2\" -v src=\"$3\" -v opts=\"$4\" "
+    "'{ for (i = 7; i <= NF && $i != \"-\"; i++); "
+    "if ($5 != mp || $(i + 1) != type || $(i + 2) != src) next; "
+    "all = \",\" $6 \",\" $(i + 3) \",\"; n = split(opts, want, \",\"); "
+    "for (j = 1; j <= n; j++) if (index(all, \",\" want[j] \",\") == 0) next; "
+    "found = 1 } END { exit found ? 0 : 1 }' <<< \"$MOUNT_INFO\"; }",
+]
+
+# every mount step is retried with backoff, a try is killed after its
+# timeout, the prepare step may install packages
+MOUNT_RETRIES = 2
+MOUNT_TIMEOUT_SECONDS = 120
+PREPARE_TIMEOUT_SECONDS = 900
+PRECOMMAND_RUNNER = "/usr/local/pai/runtime.d/precommandrunner"
+PACKAGE_LOCK_SCRIPT = "/usr/local/pai/runtime.d/package_lock.sh"
+
+
+def _covert_secret_to_server_config(data) -> dict:
     return {"spn": data["spn"], "type": data["type"], "data": data}
 
 
-def _generate_mount_commands(storage_configs, servers_configs) -> list:
-    mount_commands = []
-    mount_points = []
+def _read_node_cached_secret(name):
+    if not SECRET_CACHE_DIR:
+        return None
+    path = os.path.join(SECRET_CACHE_DIR, "{}.json".format(name))
+    try:
+        if time.time() - os.path.getmtime(path) > SECRET_CACHE_TTL_SECONDS:
+            return None
+        with open(path) as f:
+            cached = json.load(f)
+        return cached["resourceVersion"], cached["data"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_node_cached_secret(name, resource_version, data):
+    if not SECRET_CACHE_DIR:
+        return
+    try:
+        os.makedirs(SECRET_CACHE_DIR, mode=0o700, exist_ok=True)
+        # secrets are only readable by root, the file is replaced atomically
+        fd, tmp_path = tempfile.mkstemp(dir=SECRET_CACHE_DIR)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"resourceVersion": resource_version, "data": data}, f)
+        os.rename(tmp_path, os.path.join(SECRET_CACHE_DIR, "{}.json".format(name)))
+    except OSError:
+        LOGGER.warning("Failed to cache secret %s", name, exc_info=True)
+
+
+def _generate_mount_plan(storage_configs, servers_configs) -> list:
+    """
+    Generate mount steps of all servers. Steps of a server form a DAG, the
+    prepare step installs and sets up the client, the tmp mount step mounts
+    the root folder to make sub directories, then mount points are mounted
+    concurrently. Steps of different servers are independent, except that a
+    mount point is mounted after mount points which contain it.
+
+    Every step is a dict of name, commands, dependsOn, retries and timeout.
+    """
+    mount_steps = []
+    mount_points = set()
+    # mount point -> real mount step
+    real_mount_steps = {}
     storage_helper = StorageHelper(USER_NAME, JOB_NAME)
     server_mount_dict = StorageHelper.perpare_server_mount_dict(
         storage_configs)
@@ -73,29 +146,102 @@ def _generate_mount_commands(storage_configs, servers_configs) -> list:
         post_mount_commands = storage_helper.get_setup_command(
             server_config, tmp_folder, phrase="post_mount")
 
+        tmp_mount_commands = first_round_mount_commands + mkdir_commands + post_mount_commands
+        if server_config["type"] != "azureblob":
+            # sub directories exist if all mount points are mounted, the
+            # root folder of azureblob is kept mounted for the links
+            tmp_mount_commands = [
+                "if ! {{ {}; }}; then {}; fi".format(
+                    " && ".join(
+                        storage_helper.get_mount_check(
+                            server_config, mount_info["mountPoint"],
+                            mount_info["path"])
+                        for mount_info in mount_infos),
+                    "; ".join(tmp_mount_commands))
+            ]
+
+        prepare_step = _mount_step("{}-prepare".format(spn), premount_commands,
+                                   [], PREPARE_TIMEOUT_SECONDS)
+        tmp_mount_step = _mount_step("{}-tmp-mount".format(spn),
+                                     tmp_mount_commands,
+                                     [prepare_step["name"]],
+                                     MOUNT_TIMEOUT_SECONDS)
+        mount_steps += [prepare_step, tmp_mount_step]
+
         # 4. generate real mount command
-        second_round_mount_commands = list(
-            map(
-                lambda mount_info, config=server_config, pre_mounted_dir=
-                tmp_folder: storage_helper.get_setup_command(  # pylint: disable=bad-continuation
-                    config,
+        for index, mount_info in enumerate(mount_infos):
+            real_mount_step = _mount_step(
+                "{}-mount-{}".format(spn, index),
+                storage_helper.get_setup_command(
+                    server_config,
                     mount_info["mountPoint"],
                     phrase="real_mount",
                     relative_path=mount_info["path"],
-                    pre_mounted_dir=pre_mounted_dir),
-                mount_infos))
-
-        second_round_mount_commands = [
-            command for mount_command in second_round_mount_commands
-            for command in mount_command
+                    pre_mounted_dir=tmp_folder), [tmp_mount_step["name"]],
+                MOUNT_TIMEOUT_SECONDS)
+            mount_steps.append(real_mount_step)
+            real_mount_steps[posixpath.normpath(
+                mount_info["mountPoint"])] = real_mount_step
+
+    _order_nested_mount_steps(real_mount_steps)
+    return mount_steps
+
+
+def _order_nested_mount_steps(real_mount_steps):
+    """
+    A mount point which is inside another mount point is mounted after it,
+    on the same server or not, otherwise the outer mount could hide it. The
+    mount point is made again once the outer one is mounted.
+    """
+    for mount_point, step in real_mount_steps.items():
+        outer_steps = [
+            outer_step["name"]
+            for outer_point, outer_step in real_mount_steps.items()
+            if outer_point != mount_point and mount_point.startswith(
+                outer_point.rstrip("/") + "/")
         ]
-
-        # 5 assemble all commands
-        mount_commands.extend(premount_commands + first_round_mount_commands +
-                              mkdir_commands + post_mount_commands +
-                              second_round_mount_commands)
-
-    return mount_commands
+        if outer_steps:
+            step["dependsOn"] = step["dependsOn"] + outer_steps
+            step["commands"] = ["mkdir --parents {}".format(mount_point)
+                                ] + step["commands"]
+
+
+def _mount_step(name, commands, depends_on, timeout) -> dict:
+    return {
+        "name": name,
+        "commands": commands,
+        "dependsOn": depends_on,
+        "retries": MOUNT_RETRIES,
+        "timeout": timeout,
+    }
+
+
+def write_mount_plan(mount_steps, plan_dir) -> str:
+    """
+    Write every step to a script and the plan run by precommandrunner, see
+    go/pkg/precommand/plan.go. Returns the plan path.
+    """
+    os.makedirs(plan_dir, exist_ok=True)
+    scripts = []
+    for step in mount_steps:
+        path = os.path.join(plan_dir, "{}.sh".format(step["name"]))
+        # mount commands may contain credentials
+        with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600),
+                  "w") as f:
+            f.writelines(
+                "{}\n".format(command) for command in ["set -o errexit"] +
+                STORAGE_PRE_COMMAND + step["commands"])
+        scripts.append({
+            "name": step["name"],
+            "path": path,
+            "dependsOn": step["dependsOn"],
+            "retries": step["retries"],
+            "timeout": step["timeout"],
+        })
+    plan_path = os.path.join(plan_dir, "mount_plan.json")
+    with open(plan_path, "w") as f:
+        json.dump({"scripts": scripts}, f, indent=2)
+    return plan_path
 
 
 class StorageCommandGenerator:  #pylint: disable=too-few-public-methods
@@ -107,26 +253,44 @@ class StorageCommandGenerator:  #pylint: disable=too-few-public-methods
                 raise ValueError("KUBE_APISERVER_ADDRESS is none")
             config = kube_client.Configuration()
             config.host = os.environ.get("KUBE_APISERVER_ADDRESS")
-            self._api_client = kube_client.ApiClient(config)
+            api_client = kube_client.ApiClient(config)
         else:
             kube_config.load_incluster_config()
-            self._api_client = None
+            api_client = kube_client.ApiClient()
+        # one client for all requests, which shares its connection pool
+        self._core_api = kube_client.CoreV1Api(api_client)
+
+    def _read_secret(self, name) -> dict:
+        """
+        Read and decode a secret in the storage namespace, the secret is read
+        once per process, or once per ttl on the node if the node cache is set
+        """
+        if name not in _SECRET_CACHE:
+            cached = _read_node_cached_secret(name)
+            if cached is None:
+                secret = self._core_api.read_namespaced_secret(
+                    name, STORAGE_NAMESPACE)
+                cached = (secret.metadata.resource_version, secret.data or {})
+                _write_node_cached_secret(name, *cached)
+            _SECRET_CACHE[name] = cached
+        resource_version, data = _SECRET_CACHE[name]
+        key = (name, resource_version)
+        if key not in _DECODED_SECRET_CACHE:
+            _DECODED_SECRET_CACHE[key] = {
+                item: json.loads(base64.b64decode(value).decode())
+                for item, value in data.items()
+            }
+        return _DECODED_SECRET_CACHE[key]
 
     def _get_storage_configs(self, storage_config_names) -> list:
-        storage_config_secrets = kube_client.CoreV1Api(
-            self._api_client).read_namespaced_secret("storage-config",
-                                                     "pai-storage")
-        secrets_data = storage_config_secrets.data
-        secrets_value = []
+        secrets_data = self._read_secret("storage-config")
+        storage_configs = []
         for name in storage_config_names:
             if name in secrets_data:
-                secrets_value.append(secrets_data[name])
+                storage_configs.append(secrets_data[name])
             else:
                 LOGGER.warning(
                     "Could not find config name %s, maybe config bug", name)
-        storage_configs = list(
-            map(lambda secret: json.loads(base64.b64decode(secret).decode()),
-                secrets_value))
         return storage_configs
 
     def _get_user_default_storage_config_names(self, user_storage_config_names
@@ -136,7 +300,7 @@ class StorageCommandGenerator:  #pylint: disable=too-few-public-methods
             map(lambda config: config["name"],
                 filter(lambda config: config["default"], storage_configs)))
 
-    def _generate_commands(self, storage_config_names) -> list:
+    def _generate_mount_steps(self, storage_config_names) -> list:
         storage_configs = self._get_storage_configs(storage_config_names)
 
         server_names = {
@@ -145,17 +309,20 @@ class StorageCommandGenerator:  #pylint: disable=too-few-public-methods
             for mount_info in storage_config["mountInfos"]
         }
 
-        storage_server_secrets = kube_client.CoreV1Api(
-            self._api_client).read_namespaced_secret("storage-server",
-                                                     "pai-storage")
-        secrets_data = storage_server_secrets.data
-        secrets_value = [secrets_data[name] for name in server_names]
-        servers_configs = list(
-            map(_covert_secret_to_server_config, secrets_value))
+        secrets_data = self._read_secret("storage-server")
+        servers_configs = [
+            _covert_secret_to_server_config(secrets_data[name])
+            for name in server_names
+        ]
 
-        return _generate_mount_commands(storage_configs, servers_configs)
+        return _generate_mount_plan(storage_configs, servers_configs)
 
-    def generate_plugin_commands(self, parameters) -> list:
+    def generate_plugin_commands(self, parameters, plan_dir=None) -> list:
+        """
+        Generate commands to mount storages of the job. Without plan_dir,
+        mount commands are returned to run one by one. With plan_dir, mount
+        steps are written there and run concurrently by precommandrunner.
+        """
         try:
             user_storage_config = json.loads(STORAGE_CONFIGS)
         except json.JSONDecodeError:
@@ -185,5 +352,13 @@ class StorageCommandGenerator:  #pylint: disable=too-few-public-methods
                     USER_NAME, storage_config_names)
                 raise RuntimeError("Not has permission to access storage")
 
-        return STORAGE_PRE_COMMAND + self._generate_commands(
-            storage_config_names)
+        mount_steps = self._generate_mount_steps(storage_config_names)
+        if plan_dir:
+            plan_path = write_mount_plan(mount_steps, plan_dir)
+            return [
+                "BASH_ENV={} {} -log-dir ${{PRECOMMAND_LOG_DIR:-/tmp}}/storage {}"
+                .format(PACKAGE_LOCK_SCRIPT, PRECOMMAND_RUNNER, plan_path)
+            ]
+        return STORAGE_PRE_COMMAND + [
+            command for step in mount_steps for command in step["commands"]
+        ]
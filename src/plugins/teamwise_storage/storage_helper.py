@@ -25,6 +25,43 @@ sys.path.append(
     os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
 from plugins.plugin_utils import try_to_install_by_cache
 
+# performance mount options, a server selects a profile with mountProfile and
+# overrides single options with mountOptions in its extension, an option with
+# value true is a flag and an option with value false or null is dropped.
+# Options are merged by name, so profiles and mountOptions replace the options
+# the runtime sets itself, e.g. vers of cifs
+MOUNT_PROFILES = {
+    "nfs": {
+        "default": {},
+        # nconnect requires linux 5.3, nocto and actimeo trade consistency of
+        # files changed by other clients for less metadata round trips
+        "read-heavy": {
+            "nconnect": 8,
+            "rsize": 1048576,
+            "wsize": 1048576,
+            "actimeo": 600,
+            "nocto": True,
+        },
+    },
+    "cifs": {
+        "default": {},
+        "read-heavy": {
+            "cache": "loose",
+            "actimeo": 60,
+        },
+    },
+}
+
+# options which the kernel shows in mountinfo as they are given, a mounted
+# server is only taken as is if they match
+CHECKED_MOUNT_OPTIONS = ("vers", "dir_mode", "file_mode", "serverino")
+
+# blobfuse caches files under <tmpPath>/<spn>, by default the cache is limited
+# to a share of the disk space which is available when the server is mounted
+BLOBFUSE_TMP_ROOT = "/mnt/resource/blobfusetmp"
+BLOBFUSE_CACHE_SIZE_PERCENT = 50
+BLOBFUSE_MODES = ("file-cache", "streaming")
+
 
 class StorageHelper():
     def __init__(self, user_name, job_name):
@@ -51,14 +88,14 @@ class StorageHelper():
         return server_mount_dict
 
     @staticmethod
-    def validate_mount_point(mount_points, mount_infos) -> None:
+    def validate_mount_point(mount_points: set, mount_infos) -> None:
         for mount_info in mount_infos:
             # Check duplicated mount points
             if mount_info["mountPoint"] in mount_points:
                 raise RuntimeError(
                     "Mount point error! More than one mount point [{}]!".
                     format(mount_info["mountPoint"]))
-            mount_points.append(mount_info["mountPoint"])
+            mount_points.add(mount_info["mountPoint"])
 
     def get_setup_command(self,
                           server_config,
@@ -116,13 +153,15 @@ class StorageHelper():
                 ])
             ]
         if phrase in ("tmp_mount", "real_mount"):
-            server_data = server_config["data"]
-            rendered_path = self._render_path(
-                posixpath.join(server_data["rootPath"], relative_path))
             return [
-                "mount -t nfs4 {}:{} {}".format(
-                    posixpath.normpath(server_data["address"]), rendered_path,
-                    mount_point)
+                "{} || mount -t nfs4 {} {}{}".format(
+                    self.get_mount_check(server_config, mount_point,
+                                         relative_path),
+                    self._get_nfs_source(server_config, relative_path),
+                    mount_point,
+                    self._render_mount_options(
+                        self._get_mount_options(server_config, "nfs"),
+                        " -o "))
             ]
         if phrase == "post_mount":
             return [
@@ -142,17 +181,14 @@ class StorageHelper():
                 ])
             ]
         if phrase in ("tmp_mount", "real_mount"):
-            server_data = server_config["data"]
-            rendered_path = self._render_path(
-                posixpath.join(server_data["rootPath"], relative_path))
-            domain = ""
-            if server_data["domain"]:
-                domain = ",domain={}".format(server_data["domain"])
             return [
-                "mount -t cifs //{}{} {} -o vers=3.0,username={},password={}{}"
-                .format(server_data["address"], rendered_path, mount_point,
-                        server_data["userName"], server_data["password"],
-                        domain)
+                "{} || mount -t cifs {} {}{}".format(
+                    self.get_mount_check(server_config, mount_point,
+                                         relative_path),
+                    self._get_samba_source(server_config, relative_path),
+                    mount_point,
+                    self._render_mount_options(
+                        self._get_cifs_options(server_config), " -o "))
             ]
         if phrase == "post_mount":
             return [
@@ -185,21 +221,15 @@ class StorageHelper():
                 ]
             return ret
         if phrase in ("tmp_mount", "real_mount"):
-            rendered_path = self._render_path(
-                posixpath.join(server_data["fileShare"], relative_path))
-            if "proxy" in server_data:
-                return [(
-                    "mount -t cifs //localhost/{rendered_path} {mount_point} "
-                    "-o vers=3.0,username={accountName},password={key},dir_mode=0777,file_mode=0777,serverino"
-                ).format(**server_data,
-                         rendered_path=rendered_path,
-                         mount_point=mount_point)]
-            return [(
-                "mount -t cifs //{dataStore}/{rendered_path} {mount_point} "
-                "-o vers=3.0,username={accountName},password={key},dir_mode=0777,file_mode=0777,serverino"
-            ).format(**server_data,
-                     rendered_path=rendered_path,
-                     mount_point=mount_point)]
+            return [
+                "{} || mount -t cifs {} {}{}".format(
+                    self.get_mount_check(server_config, mount_point,
+                                         relative_path),
+                    self._get_azurefile_source(server_config, relative_path),
+                    mount_point,
+                    self._render_mount_options(
+                        self._get_cifs_options(server_config), " -o "))
+            ]
         if phrase == "post_mount":
             return [
                 "umount -l {}".format(mount_point),
@@ -212,23 +242,28 @@ class StorageHelper():
                                       phrase) -> list:
         server_data = server_config["data"]
         server_name = server_config["spn"]
-        tmp_path = "/mnt/resource/blobfusetmp/{}".format(server_name)
+        extension = server_data.get("extension") or {}
+        tmp_path = posixpath.join(
+            extension.get("tmpPath", BLOBFUSE_TMP_ROOT), server_name)
         cfg_file = "/{}.cfg".format(server_name)
         if phrase == "pre_mount":
             return [
-                "apt-get update",
-                "apt-get install --assume-yes wget curl lsb-release apt-transport-https",
-                "valid_release=('14.04' '15.10' '16.04' '16.10' '17.04' '17.10' '18.04' '18.10' '19.04')",
-                "release=`lsb_release -r | cut -f 2`",
-                "if [[ ! ${valid_release[@]} =~ ${release} ]];" +
-                " then echo \"Invalid OS version for Azureblob!\"; exit 1; fi",
-                "wget https://packages.microsoft.com/config/ubuntu/${release}/packages-microsoft-prod.deb",
-                "dpkg -i packages-microsoft-prod.deb",
-                "apt-get update",
-                "apt-get install --assume-yes blobfuse fuse",  # blob to mount and fuse to umount
+                # the microsoft repo is only added if the cache is missing
+                try_to_install_by_cache("azureblob", fallback_cmds=[
+                    "apt-get update",
+                    "apt-get install --assume-yes wget curl lsb-release apt-transport-https",
+                    "valid_release=('14.04' '15.10' '16.04' '16.10' '17.04' '17.10' '18.04' '18.10' '19.04')",
+                    "release=`lsb_release -r | cut -f 2`",
+                    "if [[ ! ${valid_release[@]} =~ ${release} ]];" +
+                    " then echo \"Invalid OS version for Azureblob!\"; exit 1; fi",
+                    "wget https://packages.microsoft.com/config/ubuntu/${release}/packages-microsoft-prod.deb",
+                    "dpkg -i packages-microsoft-prod.deb",
+                    "apt-get update",
+                    "apt-get install --assume-yes blobfuse fuse",  # blob to mount and fuse to umount
+                ]),
                 "mkdir --parents {}".format(tmp_path),
                 # Generate mount point
-                "echo \"accountName {}\" >> {}".format(
+                "echo \"accountName {}\" > {}".format(
                     server_data["accountName"], cfg_file),
                 "echo \"accountKey {}\" >> {}".format(server_data["key"],
                                                       cfg_file),
@@ -239,20 +274,175 @@ class StorageHelper():
             ]
         if phrase == "tmp_mount":
             return [
-                "blobfuse {} --tmp-path={} --config-file={} -o attr_timeout=240 -o entry_timeout=240 -o negative_timeout=120"
-                .format(mount_point, tmp_path, cfg_file)
+                "{} || blobfuse {} --tmp-path={} --config-file={} {}".format(
+                    self.get_mount_check(server_config, mount_point,
+                                         relative_path), mount_point,
+                    tmp_path, cfg_file,
+                    self._get_blobfuse_options(server_config, tmp_path))
             ]
         if phrase == "real_mount":
             rendered_path = self._render_path(
                 posixpath.join(pre_mounted_dir, relative_path))
             return [
-                "rm -r {}".format(mount_point),
-                "ln -s {} {}".format(rendered_path, mount_point)
+                "if ! {}; then rm -r {}; ln -s {} {}; fi".format(
+                    self._get_link_check(mount_point, rendered_path),
+                    mount_point, rendered_path, mount_point)
             ]
         if phrase == "post_mount":
             return []
         raise RuntimeError("Unsupported phrase {}".format(phrase))
 
+    def get_mount_check(self, server_config, mount_point,
+                        relative_path="") -> str:
+        """
+        command which succeeds if mount_point is already mounted from the
+        expected source with the expected options, is_mounted is defined by
+        STORAGE_PRE_COMMAND in storage_command_generator
+        """
+        mount_point = posixpath.normpath(mount_point)
+        server_type = server_config["type"]
+        if server_type == "nfs":
+            return "is_mounted {} nfs4 {}".format(
+                mount_point, self._get_nfs_source(server_config,
+                                                  relative_path))
+        if server_type in ("samba", "azurefile"):
+            if server_type == "samba":
+                source = self._get_samba_source(server_config, relative_path)
+            else:
+                source = self._get_azurefile_source(server_config,
+                                                    relative_path)
+            options = self._get_cifs_options(server_config)
+            checked = {
+                key: value
+                for key, value in options.items()
+                if key in CHECKED_MOUNT_OPTIONS
+            }
+            return "is_mounted {} cifs {} {}".format(
+                mount_point, source, self._render_mount_options(checked, ""))
+        if server_type == "azureblob":
+            return "is_mounted {} fuse blobfuse".format(mount_point)
+        raise RuntimeError("Not supproted server type {}".format(server_type))
+
+    def _get_cifs_options(self, server_config) -> dict:
+        server_data = server_config["data"]
+        if server_config["type"] == "samba":
+            defaults = {
+                "vers": "3.0",
+                "username": server_data["userName"],
+                "password": server_data["password"],
+                "domain": server_data["domain"] or None,
+            }
+        else:
+            defaults = {
+                "vers": "3.0",
+                "username": server_data["accountName"],
+                "password": server_data["key"],
+                "dir_mode": "0777",
+                "file_mode": "0777",
+                "serverino": True,
+            }
+        return self._get_mount_options(server_config, "cifs", defaults)
+
+    @staticmethod
+    def _get_mount_options(server_config, fs_type, defaults=None) -> dict:
+        """
+        mount options of server_config, defaults are replaced by the options
+        of the mount profile, which are replaced by mountOptions
+        """
+        extension = server_config["data"].get("extension") or {}
+        profile = extension.get("mountProfile", "default")
+        if profile not in MOUNT_PROFILES[fs_type]:
+            raise RuntimeError("Unknown mount profile {} of server {}".format(
+                profile, server_config["spn"]))
+        options = dict(defaults or {})
+        options.update(MOUNT_PROFILES[fs_type][profile])
+        options.update(extension.get("mountOptions") or {})
+        return options
+
+    @staticmethod
+    def _render_mount_options(options, prefix) -> str:
+        """
+        an empty string if there is no option, otherwise prefix followed by
+        the options
+        """
+        rendered = []
+        for key, value in options.items():
+            if value is True:
+                rendered.append(key)
+            elif value is not None and value is not False:
+                rendered.append("{}={}".format(key, value))
+        if not rendered:
+            return ""
+        return prefix + ",".join(rendered)
+
+    @staticmethod
+    def _get_blobfuse_options(server_config, tmp_path) -> str:
+        """
+        render blobfuse options of server_config. The file-cache mode keeps
+        whole files in tmp_path, the streaming mode reads blocks into a memory
+        cache and is read only, it suits large sequential reads
+        """
+        extension = server_config["data"].get("extension") or {}
+        options = [
+            "-o attr_timeout={}".format(extension.get("attrTimeout", 240)),
+            "-o entry_timeout={}".format(extension.get("entryTimeout", 240)),
+            "-o negative_timeout={}".format(
+                extension.get("negativeTimeout", 120)),
+        ]
+        mode = extension.get("mode", "file-cache")
+        if mode not in BLOBFUSE_MODES:
+            raise RuntimeError("Unknown blobfuse mode {} of server {}".format(
+                mode, server_config["spn"]))
+        if mode == "streaming":
+            options.append("--streaming=true")
+            for key, option in (("streamCacheMB", "--stream-cache-mb"),
+                                ("blockSizeMB", "--block-size-mb"),
+                                ("maxBlocksPerFile", "--max-blocks-per-file")):
+                if key in extension:
+                    options.append("{}={}".format(option, extension[key]))
+            return " ".join(options)
+        if "fileCacheTimeout" in extension:
+            options.append("--file-cache-timeout-in-seconds={}".format(
+                extension["fileCacheTimeout"]))
+        if "cacheSizeMB" in extension:
+            options.append("--cache-size-mb={}".format(
+                extension["cacheSizeMB"]))
+        else:
+            options.append(
+                "--cache-size-mb=$(($(df --output=avail -m {} | tail -n 1) * {} / 100))"
+                .format(
+                    tmp_path,
+                    extension.get("cacheSizePercent",
+                                  BLOBFUSE_CACHE_SIZE_PERCENT)))
+        return " ".join(options)
+
+    @staticmethod
+    def _get_link_check(link, target) -> str:
+        return "[[ $(readlink {}) == {} ]]".format(link, target)
+
+    def _get_nfs_source(self, server_config, relative_path) -> str:
+        server_data = server_config["data"]
+        return "{}:{}".format(
+            posixpath.normpath(server_data["address"]),
+            self._render_path(
+                posixpath.join(server_data["rootPath"], relative_path)))
+
+    def _get_samba_source(self, server_config, relative_path) -> str:
+        server_data = server_config["data"]
+        return "//{}{}".format(
+            server_data["address"],
+            self._render_path(
+                posixpath.join(server_data["rootPath"], relative_path)))
+
+    def _get_azurefile_source(self, server_config, relative_path) -> str:
+        server_data = server_config["data"]
+        host = "localhost" if "proxy" in server_data else server_data[
+            "dataStore"]
+        return "//{}/{}".format(
+            host,
+            self._render_path(
+                posixpath.join(server_data["fileShare"], relative_path)))
+
     def _render_path(self, ori_path) -> str:
         rendered_path = re.compile("%USER",
                                    re.IGNORECASE).sub(self.user_name, ori_path)
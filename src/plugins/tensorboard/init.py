@@ -20,10 +20,9 @@ import logging
 import os
 import sys
 
-from jinja2 import Template
-
 sys.path.append(
     os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from common.expression import render  #pylint: disable=wrong-import-position
 from plugins.plugin_utils import plugin_init, PluginHelper  #pylint: disable=wrong-import-position
 
 LOGGER = logging.getLogger(__name__)
@@ -36,22 +35,22 @@ def generate_tensorboard_commands(template_file, parameters):
     if len(parameters["logdir"]) == 0:
         raise RuntimeError("logdir could not be empty")
 
-    multi_path = False
     logdir = ",".join(
         ["{}:{}".format(k, v) for k, v in parameters["logdir"].items()])
-    logdir_v2 = list(parameters["logdir"].values())[0]
     # Backward compatibility with tensroboard v1
-    logdir_spec = logdir
     if len(parameters["logdir"]) > 1:
-        multi_path = True
+        logdir_v2_option = "--logdir_spec={}".format(logdir)
+    else:
+        logdir_v2_option = "--logdir={}".format(
+            list(parameters["logdir"].values())[0])
 
     with open(template_file) as f:
-        template = Template(f.read())
-    return template.render(logdir=logdir,
-                           port=parameters["port"],
-                           multi_path=multi_path,
-                           logdir_v2=logdir_v2,
-                           logdir_spec=logdir_spec)
+        template = f.read()
+    return render(template, {
+        "logdir": logdir,
+        "port": parameters["port"],
+        "logdir_v2_option": logdir_v2_option
+    })
 
 
 def main():
@@ -76,7 +75,11 @@ def main():
 
     tensorboard_exec_path = "{}/tensorboard.sh".format(current_dir)
     commands = [
-        "chmod u+x {}".format(tensorboard_exec_path), tensorboard_exec_path
+        "chmod u+x {}".format(tensorboard_exec_path), {
+            "command": tensorboard_exec_path,
+            "background": True,
+            "restart": "on-failure"
+        }
     ]
 
     PluginHelper(plugin_config).inject_commands(commands, pre_script)
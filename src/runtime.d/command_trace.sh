@@ -0,0 +1,60 @@
+#!/bin/bash
+
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Sourced by plugin scripts, PluginHelper.inject_commands wraps every command
+# with pai_trace_begin and pai_trace_end. Each command is written as one json
+# line to ${PAI_COMMAND_TRACE_FILE}, see go/pkg/cmdtrace. Nothing is written
+# if PAI_COMMAND_TRACE_FILE is not set.
+
+PAI_TRACE_ACTIVE=0
+
+function pai_trace_now()
+{
+  if [[ -n ${EPOCHREALTIME:-} ]]; then
+    PAI_TRACE_NOW=${EPOCHREALTIME/,/.}
+  else
+    PAI_TRACE_NOW=$(date +%s.%N)
+  fi
+}
+
+# usage: pai_trace_begin <phase> <plugin> <script> <index> <command as json string>
+function pai_trace_begin()
+{
+  PAI_TRACE_ENTRY="\"phase\":\"$1\",\"plugin\":\"$2\",\"script\":\"$3\",\"index\":$4"
+  PAI_TRACE_COMMAND=$5
+  PAI_TRACE_ACTIVE=1
+  pai_trace_now
+  PAI_TRACE_START=${PAI_TRACE_NOW}
+}
+
+# usage: pai_trace_end <exit code>
+function pai_trace_end()
+{
+  if [[ ${PAI_TRACE_ACTIVE} -eq 0 || -z ${PAI_COMMAND_TRACE_FILE:-} ]]; then
+    return 0
+  fi
+  PAI_TRACE_ACTIVE=0
+  pai_trace_now
+  printf '{%s,"start":%s,"end":%s,"exitCode":%s,"command":%s}\n' \
+    "${PAI_TRACE_ENTRY}" "${PAI_TRACE_START}" "${PAI_TRACE_NOW}" "$1" "${PAI_TRACE_COMMAND}" \
+    >> ${PAI_COMMAND_TRACE_FILE} || true
+}
+
+# a failed command stops the script when errexit is set
+trap 'pai_trace_end $?' EXIT
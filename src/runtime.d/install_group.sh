@@ -20,6 +20,11 @@
 PAI_WORK_DIR=/usr/local/pai
 CACHE_ROOT_DIR=${PAI_WORK_DIR}/package_cache
 
+# serialize dpkg with concurrent pre scripts
+if [ -f ${PAI_WORK_DIR}/runtime.d/package_lock.sh ]; then
+  source ${PAI_WORK_DIR}/runtime.d/package_lock.sh
+fi
+
 function is_ubuntu_package_installed(){
   for package in $1
   do
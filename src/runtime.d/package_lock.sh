@@ -0,0 +1,47 @@
+#!/bin/bash
+
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Plugin pre scripts run concurrently, this file is sourced by them through
+# BASH_ENV so calls to apt-get and dpkg are serialized by a file lock instead
+# of failing on the dpkg lock held by another pre script. Scripts which are
+# started by pre scripts and install packages source it explicitly.
+
+PACKAGE_LOCK_FILE=/usr/local/pai/runtime.d/package.lock
+
+# BASH_ENV must not be inherited by daemons or saved in the ssh environment
+unset BASH_ENV
+
+function run_with_package_lock()
+{
+  if command -v flock &> /dev/null; then
+    flock ${PACKAGE_LOCK_FILE} "$@"
+  else
+    command "$@"
+  fi
+}
+
+function apt-get()
+{
+  run_with_package_lock apt-get "$@"
+}
+
+function dpkg()
+{
+  run_with_package_lock dpkg "$@"
+}
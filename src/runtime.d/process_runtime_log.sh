@@ -22,6 +22,13 @@ set -o nounset
 set -o pipefail
 
 RUNTIME_LOG_FILE=$1
+LOG_STAMPER=$(dirname ${BASH_SOURCE[0]})/logstamper
+
+# Prefer the log stamper binary, which stamps lines in-process instead of
+# forking date and tee for every line
+if [[ -x ${LOG_STAMPER} ]]; then
+  exec ${LOG_STAMPER} ${RUNTIME_LOG_FILE}
+fi
 
 while read line; do
   echo "[$(date)] [openpai-runtime] ${line}" | tee -a ${RUNTIME_LOG_FILE} >&2
@@ -31,9 +31,15 @@ RUNTIME_SCRIPT_DIR=${RUNTIME_WORK_DIR}/runtime.d
 RUNTIME_LOG_DIR=${RUNTIME_WORK_DIR}/logs/${FC_POD_UID}
 PATTERN_FILE=${RUNTIME_SCRIPT_DIR}/runtime-exit-spec.yaml
 
-# Keep 256MB logs
+# Rotate logs every 256MB, rotated logs are compressed and at most 512MB of them are kept
 LOCAL_LOG_MAX_SIZE=$(( 256*1024*1024 )) # 256MB
-LOCAL_LOG_MAX_FILES=2
+LOCAL_LOG_MAX_RETAINED_SIZE=${PAI_LOG_MAX_RETAINED_SIZE:-$(( 512*1024*1024 ))} # 512MB
+
+# Limit user output to 4MB/s with 10s burst, output over the limit is dropped
+# unless mode is block, which blocks the user process until output is allowed
+LOG_RATE_LIMIT_BYTES=${PAI_LOG_RATE_LIMIT_BYTES:-$(( 4*1024*1024 ))} # 4MB
+LOG_RATE_LIMIT_LINES=${PAI_LOG_RATE_LIMIT_LINES:-0}
+LOG_RATE_LIMIT_MODE=${PAI_LOG_RATE_LIMIT_MODE:-drop}
 
 # please refer to rest-server/src/models/v2/job/k8s.js
 TERMINATION_MESSAGE_PATH=/tmp/pai-termination-log
@@ -45,14 +51,34 @@ USER_STDOUT_LOG_DIR=${RUNTIME_LOG_DIR}/user-stdout
 USER_STDERR_LOG_DIR=${RUNTIME_LOG_DIR}/user-stderr
 USER_ALL_LOG_DIR=${RUNTIME_LOG_DIR}/user-all
 
+# Sample cpu, memory and io of user processes, the metrics port is disabled by default
+RESOURCE_RING=${RUNTIME_LOG_DIR}/resource.ring
+RESOURCE_SAMPLE_INTERVAL=${PAI_RESOURCE_SAMPLE_INTERVAL:-5s}
+RESOURCE_METRICS_PORT=${PAI_RESOURCE_METRICS_PORT:-}
+
+# Background commands of plugins run alongside the user command, see go/pkg/precommand/supervisor.go
+BACKGROUND_COMMANDS=${RUNTIME_SCRIPT_DIR}/background_commands.jsonl
+BACKGROUND_LOG_DIR=${RUNTIME_LOG_DIR}/background
+SUPERVISOR_PID=""
+
 function log()
 {
   echo "$1" | ${PROCESS_RUNTIME_LOG} ${RUNTIME_LOG}
 }
 
+function stop_background_commands()
+{
+  if [[ -n ${SUPERVISOR_PID} ]]; then
+    kill -TERM ${SUPERVISOR_PID} 2> /dev/null || true
+    wait ${SUPERVISOR_PID} || true
+    SUPERVISOR_PID=""
+  fi
+}
+
 function exit_handler()
 {
   USER_EXIT_CODE=$?
+  stop_background_commands
   if [[ $USER_EXIT_CODE -eq 0 ]]; then
     exit 0
   fi
@@ -61,24 +87,9 @@ function exit_handler()
     touch ${RUNTIME_LOG}
   fi
 
-  # synchronize cached writes to disk
-  sync
-
-  # Deal with log rotate case. Merge current log with rotated log
-  # if current log size is too small
-  local USER_LOG_FILE=${USER_ALL_LOG_DIR}/current
-  touch ${USER_LOG_FILE} # Make sure the log file exist
-
-  local LOG_FILE_SIZE=$(wc -c ${USER_LOG_FILE} | awk '{print $1}')
-  local MIN_LOG_SIZE=$(( 16*1024 )) # 16KB
-  local ROTATED_LOG_FILE=$(find ${USER_ALL_LOG_DIR} -name @*.s -print -quit)
-
-  if [ -f ${ROTATED_LOG_FILE} ] && (( LOG_FILE_SIZE < ${MIN_LOG_SIZE} )); then
-    mkdir -p ${RUNTIME_WORK_DIR}/tmp
-    tail -c 16K ${ROTATED_LOG_FILE} > ${RUNTIME_WORK_DIR}/tmp/user-log
-    cat ${USER_LOG_FILE} >> ${RUNTIME_WORK_DIR}/tmp/user-log
-    USER_LOG_FILE=${RUNTIME_WORK_DIR}/tmp/user-log
-  fi
+  # exithandler syncs the logs it reads and reads the log tail across
+  # rotated segments of user-all directly
+  local USER_LOG_FILE=${USER_ALL_LOG_DIR}
 
   set +o errexit
   # genergate aggregated exit info
@@ -123,37 +134,70 @@ log "[INFO] Starting to exec precommands"
 
 # export for all plugins
 export RUNTIME_LOG_PIPE=${RUNTIME_WORK_DIR}/runtime.d/runtime_log_pipe
+# output of every plugin pre script is kept here
+export PRECOMMAND_LOG_DIR=${RUNTIME_LOG_DIR}/precommands
+# start, end and exit code of every plugin command, see command_trace.sh
+export PAI_COMMAND_TRACE_FILE=${RUNTIME_LOG_DIR}/command_trace.jsonl
 mkfifo ${RUNTIME_LOG_PIPE}
 ${RUNTIME_SCRIPT_DIR}/precommands.sh 2>&1 > ${RUNTIME_LOG_PIPE} &
 PRECOMMAND_PID=$!
 ${PROCESS_RUNTIME_LOG} ${RUNTIME_LOG} < ${RUNTIME_LOG_PIPE} &
 
 # Since precommands may run some processes in background, we do not wait log process finished
-wait ${PRECOMMAND_PID}
+PRECOMMAND_EXIT_CODE=0
+wait ${PRECOMMAND_PID} || PRECOMMAND_EXIT_CODE=$?
+
+${RUNTIME_SCRIPT_DIR}/cmdtrace -phase pre ${PAI_COMMAND_TRACE_FILE} | ${PROCESS_RUNTIME_LOG} ${RUNTIME_LOG} || true
+if [[ ${PRECOMMAND_EXIT_CODE} -ne 0 ]]; then
+  exit ${PRECOMMAND_EXIT_CODE}
+fi
 
 log "[INFO] Precommands finished"
 
-# Put verbose output to user.pai.all, stdout to user.pai.stdout, stderr to user.pai.stderr
+if [[ -f ${BACKGROUND_COMMANDS} ]]; then
+  log "[INFO] Starting background commands"
+  ${RUNTIME_SCRIPT_DIR}/supervisor -log-dir ${BACKGROUND_LOG_DIR} ${BACKGROUND_COMMANDS} \
+    > >(${PROCESS_RUNTIME_LOG} ${RUNTIME_LOG}) 2>&1 &
+  SUPERVISOR_PID=$!
+fi
+
+# Put verbose output to user-all, stdout to user-stdout, stderr to user-stderr
 # execute user commands
 # priority=100
 log "[INFO] USER COMMAND START"
-LOG_PIPE=${RUNTIME_WORK_DIR}/runtime.d/user_log_pipe
-mkfifo ${LOG_PIPE}
-${RUNTIME_SCRIPT_DIR}/user.sh \
-  2> >(tee >(${RUNTIME_SCRIPT_DIR}/multilog s${LOCAL_LOG_MAX_SIZE} n${LOCAL_LOG_MAX_FILES} ${USER_STDERR_LOG_DIR}) | tee -a ${LOG_PIPE} >&2) \
-  > >(tee >(${RUNTIME_SCRIPT_DIR}/multilog s${LOCAL_LOG_MAX_SIZE} n${LOCAL_LOG_MAX_FILES} ${USER_STDOUT_LOG_DIR}) | tee -a ${LOG_PIPE}) &
+USER_STDOUT_PIPE=${RUNTIME_WORK_DIR}/runtime.d/user_stdout_pipe
+USER_STDERR_PIPE=${RUNTIME_WORK_DIR}/runtime.d/user_stderr_pipe
+mkfifo ${USER_STDOUT_PIPE} ${USER_STDERR_PIPE}
+RATE_LIMIT_ARGS="-rate-limit-bytes ${LOG_RATE_LIMIT_BYTES} -rate-limit-lines ${LOG_RATE_LIMIT_LINES}"
+if [[ ${LOG_RATE_LIMIT_MODE} == "block" ]]; then
+  RATE_LIMIT_ARGS="${RATE_LIMIT_ARGS} -rate-limit-block"
+fi
+${RUNTIME_SCRIPT_DIR}/userlogger -stdout ${USER_STDOUT_PIPE} -stderr ${USER_STDERR_PIPE} \
+  -max-size ${LOCAL_LOG_MAX_SIZE} -max-files 0 -max-retained-size ${LOCAL_LOG_MAX_RETAINED_SIZE} -compress \
+  ${RATE_LIMIT_ARGS} \
+  ${USER_STDOUT_LOG_DIR} ${USER_STDERR_LOG_DIR} ${USER_ALL_LOG_DIR} &
+LOGGER_PID=$!
+
+${RUNTIME_SCRIPT_DIR}/user.sh > ${USER_STDOUT_PIPE} 2> ${USER_STDERR_PIPE} &
 USER_PID=$!
 
-${RUNTIME_SCRIPT_DIR}/multilog s${LOCAL_LOG_MAX_SIZE} n${LOCAL_LOG_MAX_FILES} ${USER_ALL_LOG_DIR} < ${LOG_PIPE} &
-LOGGER_PID=$!
+# resourcesampler exits after the user process exits
+RESOURCE_SAMPLER_ARGS="-pid ${USER_PID} -interval ${RESOURCE_SAMPLE_INTERVAL}"
+if [[ -n ${RESOURCE_METRICS_PORT} ]]; then
+  RESOURCE_SAMPLER_ARGS="${RESOURCE_SAMPLER_ARGS} -listen 127.0.0.1:${RESOURCE_METRICS_PORT}"
+fi
+${RUNTIME_SCRIPT_DIR}/resourcesampler ${RESOURCE_SAMPLER_ARGS} ${RESOURCE_RING} 2>&1 | \
+  ${PROCESS_RUNTIME_LOG} ${RUNTIME_LOG} &
 
 wait ${USER_PID}
+# userlogger syncs user logs to disk before it exits
 wait ${LOGGER_PID}
 
-# synchronize cached writes to disk
-sync
-
 log "[INFO] USER COMMAND END"
 
+# background commands are stopped before post commands
+stop_background_commands
+
 # execute postCommands generated by plugin
 ${RUNTIME_SCRIPT_DIR}/postcommands.sh 2>&1 | ${PROCESS_RUNTIME_LOG} ${RUNTIME_LOG}
+${RUNTIME_SCRIPT_DIR}/cmdtrace -phase post ${PAI_COMMAND_TRACE_FILE} | ${PROCESS_RUNTIME_LOG} ${RUNTIME_LOG} || true
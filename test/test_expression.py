@@ -0,0 +1,107 @@
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import sys
+import unittest
+
+# pylint: disable=wrong-import-position
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src/init.d"))
+from common.expression import LazyContext, compile_template, parse_path, render
+from common.utils import init_logger, render_string_with_secrets
+import initializer
+# pylint: enable=wrong-import-position
+
+init_logger()
+
+
+class TestExpression(unittest.TestCase):
+    def test_parse_path(self):
+        self.assertEqual(parse_path("secrets.data[0].name"),
+                         ("secrets", "data", 0, "name"))
+        self.assertEqual(parse_path("parameters.a[ 1 ][2]"),
+                         ("parameters", "a", 1, 2))
+        self.assertEqual(parse_path("secrets.days.0"), ("secrets", "days", "0"))
+
+    def test_compiled_template_is_reused(self):
+        template = "echo <% $parameters.x %> && echo done"
+        self.assertIs(compile_template(template), compile_template(template))
+
+    def test_render(self):
+        context = {"parameters": {"x": 1, "list": ["a", {"b": "c"}]}}
+        self.assertEqual(
+            render("<% $parameters.x %>,<%$parameters.list[1].b%>,<% $parameters.list.0 %>",
+                   context), "1,c,a")
+        self.assertEqual(render("no expression", context), "no expression")
+        with self.assertRaises(KeyError):
+            render("<% $parameters.y %>", context)
+        self.assertEqual(render("[<% $secrets.y %>]", context, missing=""),
+                         "[]")
+
+    def test_lazy_context(self):
+        calls = []
+
+        def _load():
+            calls.append(1)
+            return {"a": "b"}
+
+        context = LazyContext(parameters=_load, secrets=lambda: 1 / 0)
+        self.assertEqual(
+            render("<% $parameters.a %><% $parameters.a %>", context), "bb")
+        self.assertEqual(len(calls), 1)
+
+    def test_render_with_secrets_escape(self):
+        self.assertEqual(
+            render_string_with_secrets("<% $secrets.a %> <% $parameters.b %>",
+                                       {"a": "x&y"}), "x&amp;y ")
+
+    def test_replace_ref(self):
+        jobconfig = {
+            "parameters": {
+                "model": "resnet50"
+            },
+            "taskRoles": {
+                "worker": {
+                    "data": "cifar10"
+                }
+            },
+            "prerequisites": [{
+                "type": "data",
+                "name": "cifar10",
+                "uri": ["/data/cifar10"]
+            }]
+        }
+        param_str = str({
+            "model": "<% $parameters.model %>",
+            "data": "<% $data.uri[0] %>",
+            "key": "<% $secrets.key %>"
+        })
+        self.assertEqual(
+            initializer.replace_ref(param_str, jobconfig, {"key": "k"},
+                                    "worker"),
+            str({
+                "model": "resnet50",
+                "data": "/data/cifar10",
+                "key": "k"
+            }))
+
+
+if __name__ == '__main__':
+    unittest.main()
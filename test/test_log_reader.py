@@ -0,0 +1,89 @@
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import gzip
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+# pylint: disable=wrong-import-position
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+from common.log_reader import LogReader, list_segments, read_index
+# pylint: enable=wrong-import-position
+
+
+def _write_segment(path, lines, start_time, compress=False):
+    """Write lines as a segment with one index entry per line, line i is written at start_time + i."""
+    content = b""
+    index = b""
+    for i, line in enumerate(lines):
+        index += struct.pack("<qqq", int((start_time + i) * 1e9),
+                             len(content), i)
+        content += line
+    if compress:
+        with gzip.open(path + ".gz", "wb") as f:
+            f.write(content)
+    else:
+        with open(path, "wb") as f:
+            f.write(content)
+    with open(path + ".idx", "wb") as f:
+        f.write(index)
+
+
+class TestLogReader(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        _write_segment(os.path.join(self.log_dir, "@400000005f5e100a00000000.s"),
+                       [b"line%d\n" % i for i in range(0, 10)], 1000, compress=True)
+        _write_segment(os.path.join(self.log_dir, "@400000005f5e100b00000000.s"),
+                       [b"line%d\n" % i for i in range(10, 20)], 1010)
+        _write_segment(os.path.join(self.log_dir, "current"),
+                       [b"line%d\n" % i for i in range(20, 25)] + [b"partial"], 1020)
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir)
+
+    def test_list_segments(self):
+        segments = [os.path.basename(s) for s in list_segments(self.log_dir)]
+        self.assertEqual(segments, [
+            "@400000005f5e100a00000000.s.gz", "@400000005f5e100b00000000.s",
+            "current"
+        ])
+        self.assertEqual(len(read_index(os.path.join(self.log_dir, "current"))), 6)
+
+    def test_tail(self):
+        reader = LogReader(self.log_dir)
+        self.assertEqual(reader.tail(2), b"line24\npartial")
+        self.assertEqual(reader.tail(8),
+                         b"".join(b"line%d\n" % i for i in range(18, 25)) + b"partial")
+        self.assertEqual(reader.tail(100),
+                         b"".join(b"line%d\n" % i for i in range(0, 25)) + b"partial")
+
+    def test_read_time_range(self):
+        reader = LogReader(self.log_dir)
+        self.assertEqual(reader.read_time_range(1003, 1004), b"line3\nline4\n")
+        self.assertEqual(reader.read_time_range(1008, 1011),
+                         b"".join(b"line%d\n" % i for i in range(8, 12)))
+        self.assertEqual(reader.read_time_range(2000, 3000), b"partial")
+
+
+if __name__ == '__main__':
+    unittest.main()